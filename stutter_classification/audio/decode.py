@@ -0,0 +1,276 @@
+import functools
+import math
+import os
+import struct
+from typing import NamedTuple
+
+import numpy as np
+
+# every feature, for training and live detection, is computed at this rate.
+# SEP-28k clips are recorded at it, so they are never resampled
+CANONICAL_SAMPLE_RATE = 16000
+
+# resampling filter, the same design scipy.signal.resample_poly uses
+FILTER_WINDOW = ("kaiser", 5.0)
+FILTER_HALF_LENGTH = 10  # filter taps on each side, per input or output sample
+OUTPUT_BLOCK = 8192  # outputs computed at a time, bounds the gathered taps
+DECODE_BLOCK = 65536  # frames read at a time by read_audio_blocks
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# (format, bits per sample) -> sample dtype and the scale to [-1, 1)
+SAMPLE_FORMATS = {
+    (WAVE_FORMAT_PCM, 8): (np.dtype("u1"), 1 / 128),
+    (WAVE_FORMAT_PCM, 16): (np.dtype("<i2"), 1 / 32768),
+    (WAVE_FORMAT_PCM, 24): (np.dtype("u1"), 1 / 2**23),  # unpacked by hand
+    (WAVE_FORMAT_PCM, 32): (np.dtype("<i4"), 1 / 2**31),
+    (WAVE_FORMAT_IEEE_FLOAT, 32): (np.dtype("<f4"), 1.0),
+    (WAVE_FORMAT_IEEE_FLOAT, 64): (np.dtype("<f8"), 1.0),
+}
+
+
+class WavFormat(NamedTuple):
+    format_tag: int
+    channels: int
+    sample_rate: int
+    bits_per_sample: int
+    data_offset: int  # bytes from the start of the file to the first sample
+    data_size: int
+
+
+def decode_params() -> dict:
+    # anything that changes decoded audio, part of the extraction parameters
+    return {
+        "sample_rate": CANONICAL_SAMPLE_RATE,
+        "resampler": "polyphase",
+        "filter_window": list(FILTER_WINDOW),
+        "filter_half_length": FILTER_HALF_LENGTH,
+    }
+
+
+def read_wav_format(path) -> WavFormat | None:
+    # walks the RIFF chunks up to the data chunk, None if this is not a wav
+    # file with a format and data chunk
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            return None
+
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id = chunk[:4]
+            (chunk_size,) = struct.unpack("<I", chunk[4:])
+
+            if chunk_id == b"fmt ":
+                body = f.read(chunk_size + (chunk_size & 1))
+                if len(body) < 16:
+                    return None
+                format_tag, channels, sample_rate, _, _, bits = struct.unpack_from(
+                    "<HHIIHH", body
+                )
+                # the sub-format GUID starts with the actual format tag
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    (format_tag,) = struct.unpack_from("<H", body, 24)
+                fmt = (format_tag, channels, sample_rate, bits)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    return None
+                data_offset = f.tell()
+                # a truncated file holds less data than its header claims
+                data_size = min(chunk_size, file_size - data_offset)
+                return WavFormat(*fmt, data_offset, data_size)
+            else:
+                f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+
+def open_wav(path) -> tuple[WavFormat, np.ndarray]:
+    # the data chunk memory mapped as (frames, channels), nothing is read yet
+    wav = read_wav_format(path)
+    if wav is None:
+        raise ValueError(f"{path} is not a wav file")
+    sample_format = SAMPLE_FORMATS.get((wav.format_tag, wav.bits_per_sample))
+    if sample_format is None or wav.channels < 1:
+        raise ValueError(
+            f"{path} has unsupported sample format {wav.format_tag} "
+            f"with {wav.bits_per_sample} bits"
+        )
+
+    dtype, _ = sample_format
+    frame_size = wav.channels * wav.bits_per_sample // 8
+    n_frames = wav.data_size // frame_size
+    if n_frames == 0:
+        return wav, np.zeros((0, frame_size // dtype.itemsize), dtype=dtype)
+
+    data = np.memmap(
+        path,
+        dtype=dtype,
+        mode="r",
+        offset=wav.data_offset,
+        shape=(n_frames * frame_size // dtype.itemsize,),
+    )
+    return wav, data.reshape(n_frames, -1)
+
+
+def wav_samples(wav: WavFormat, frames: np.ndarray) -> np.ndarray:
+    # float32 mono samples of raw frames from open_wav, converted in one pass
+    dtype, scale = SAMPLE_FORMATS[(wav.format_tag, wav.bits_per_sample)]
+    if len(frames) == 0:
+        return np.zeros(0, dtype=np.float32)
+    if wav.bits_per_sample == 24:
+        # little-endian 3-byte samples, shifted up to sign-extend them
+        data = frames.reshape(-1, 3).astype(np.int32)
+        data = (data[:, 0] << 8 | data[:, 1] << 16 | data[:, 2] << 24) >> 8
+        frames = data.reshape(len(frames), wav.channels)
+
+    if wav.channels == 1:
+        audio = frames[:, 0].astype(np.float32)
+    else:
+        audio = frames.mean(axis=1, dtype=np.float32)
+    if dtype == np.uint8:
+        audio -= 128
+    if scale != 1.0:
+        audio *= scale
+    return audio
+
+
+def read_wav(path) -> tuple[np.ndarray, int]:
+    # float32 mono samples at the file's own rate. the data chunk is memory
+    # mapped and converted in one pass, no general purpose decoder is involved
+    wav, frames = open_wav(path)
+    return wav_samples(wav, frames), wav.sample_rate
+
+
+def load_audio(path, sample_rate=CANONICAL_SAMPLE_RATE) -> tuple[np.ndarray, int]:
+    # float32 mono audio resampled to sample_rate, or at the file's own rate
+    # if sample_rate is None. formats other than wav go through librosa
+    try:
+        audio, file_rate = read_wav(path)
+    except ValueError:
+        import librosa
+
+        audio, file_rate = librosa.load(path, sr=None, mono=True)
+
+    if sample_rate is None or sample_rate == file_rate:
+        return audio, file_rate
+    return resample(audio, file_rate, sample_rate), sample_rate
+
+
+@functools.lru_cache(maxsize=16)
+def polyphase_filter(up: int, down: int) -> tuple[np.ndarray, int]:
+    # low-pass filter split into `up` phases of equal length, row p holds the
+    # taps applied to consecutive inputs for outputs of phase p. designed once
+    # per rate pair, the design is the slow part for large up and down.
+    # scipy.signal is imported here, importing it takes longer than the
+    # rest of startup
+    from scipy.signal import firwin
+
+    half_length = FILTER_HALF_LENGTH * max(up, down)
+    taps = firwin(2 * half_length + 1, 1 / max(up, down), window=FILTER_WINDOW) * up
+
+    n_taps = -(-len(taps) // up)
+    bank = np.zeros(up * n_taps)
+    bank[: len(taps)] = taps
+    bank = bank.reshape(n_taps, up).T.astype(np.float32)
+    bank.flags.writeable = False
+    return bank, half_length
+
+
+class Resampler:
+    # rational polyphase resampler that can be fed a stream in blocks of any
+    # size, the output is the same as resampling all of the audio at once and
+    # matches scipy.signal.resample_poly
+
+    def __init__(self, orig_sample_rate: int, target_sample_rate: int):
+        divisor = math.gcd(orig_sample_rate, target_sample_rate)
+        self.up = target_sample_rate // divisor
+        self.down = orig_sample_rate // divisor
+        if self.up == self.down:
+            # same rate, blocks pass through unchanged
+            self.bank, self.half_length = np.ones((1, 1), dtype=np.float32), 0
+        else:
+            self.bank, self.half_length = polyphase_filter(self.up, self.down)
+        self.n_taps = self.bank.shape[1]
+        self.reset()
+
+    def reset(self):
+        # inputs before the stream starts are zeros
+        self.buffer = np.zeros(self.n_taps, dtype=np.float32)
+        self.buffer_start = -self.n_taps  # absolute index of buffer[0]
+        self.received = 0
+        self.next_output = 0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        # every output whose inputs have all arrived
+        if self.up == self.down:
+            return np.asarray(samples, dtype=np.float32)
+        self.buffer = np.concatenate((self.buffer, samples.astype(np.float32)))
+        self.received += len(samples)
+        end = (self.received * self.up - 1 - self.half_length) // self.down + 1
+        return self._outputs(end)
+
+    def flush(self) -> np.ndarray:
+        # the remaining outputs, with zeros after the last input
+        if self.up == self.down:
+            return np.zeros(0, dtype=np.float32)
+        end = -(-self.received * self.up // self.down)
+        self.buffer = np.concatenate((self.buffer, np.zeros(self.n_taps, np.float32)))
+        return self._outputs(end)
+
+    def _outputs(self, end: int) -> np.ndarray:
+        if end <= self.next_output:
+            return np.zeros(0, dtype=np.float32)
+
+        out = np.empty(end - self.next_output, dtype=np.float32)
+        lags = np.arange(self.n_taps)
+        for block in range(self.next_output, end, OUTPUT_BLOCK):
+            m = np.arange(block, min(block + OUTPUT_BLOCK, end))
+            position = m * self.down + self.half_length
+            # newest input contributing to each output, and the filter phase
+            newest = position // self.up - self.buffer_start
+            inputs = self.buffer[newest[:, None] - lags]
+            out[block - self.next_output : block - self.next_output + len(m)] = (
+                np.einsum("nk,nk->n", inputs, self.bank[position % self.up])
+            )
+        self.next_output = end
+
+        # drop inputs no later output needs
+        oldest = (end * self.down + self.half_length) // self.up - self.n_taps + 1
+        drop = max(0, oldest - self.buffer_start)
+        self.buffer = self.buffer[drop:]
+        self.buffer_start += drop
+        return out
+
+
+def resample(audio: np.ndarray, orig_sample_rate: int, target_sample_rate: int):
+    resampler = Resampler(orig_sample_rate, target_sample_rate)
+    return np.concatenate((resampler.process(audio), resampler.flush()))
+
+
+def read_audio_blocks(path, sample_rate=CANONICAL_SAMPLE_RATE, block_size=DECODE_BLOCK):
+    # the audio of load_audio in consecutive blocks, so long recordings are
+    # decoded and resampled with bounded memory. wav files are read a block of
+    # frames at a time, other formats are decoded whole by librosa
+    try:
+        wav, frames = open_wav(path)
+    except ValueError:
+        import librosa
+
+        audio, file_rate = librosa.load(path, sr=None, mono=True)
+        blocks = (audio[i : i + block_size] for i in range(0, len(audio), block_size))
+    else:
+        file_rate = wav.sample_rate
+        blocks = (
+            wav_samples(wav, frames[i : i + block_size])
+            for i in range(0, len(frames), block_size)
+        )
+
+    resampler = Resampler(file_rate, sample_rate)
+    for block in blocks:
+        yield resampler.process(block)
+    yield resampler.flush()
@@ -0,0 +1,179 @@
+import threading
+import time
+
+import numpy as np
+
+from stutter_classification.audio.decode import CANONICAL_SAMPLE_RATE, load_audio
+
+INPUT_WINDOW = 0.5  # seconds
+SAMPLE_RATE = CANONICAL_SAMPLE_RATE  # Hz, the rate windows are processed at
+# seconds between the starts of overlapping windows, a whole number of STFT
+# hops (512 samples) so consecutive windows share their interior frames
+INPUT_HOP = 8 * 512 / SAMPLE_RATE
+CAPTURE_SAMPLE_RATE = 44100  # Hz, the rate the microphone is opened at
+
+DEFAULT_BUFFER_SECONDS = 10.0
+DEFAULT_BLOCK_SIZE = 1024  # samples per source callback
+
+
+class RingBuffer:
+    # single-producer ring buffer of float32 samples, addressed by the absolute
+    # number of samples written since the stream started
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=np.float32)
+        self.written = 0
+        self.condition = threading.Condition()
+
+    def write(self, samples: np.ndarray):
+        # only the newest `capacity` samples of an oversized block are kept
+        n_total = len(samples)
+        samples = samples[-self.capacity :]
+        n = len(samples)
+        start = (self.written + n_total - n) % self.capacity
+        end = start + n
+
+        if end <= self.capacity:
+            self.buffer[start:end] = samples
+        else:
+            split = self.capacity - start
+            self.buffer[start:] = samples[:split]
+            self.buffer[: end - self.capacity] = samples[split:]
+
+        with self.condition:
+            self.written += n_total
+            self.condition.notify_all()
+
+    def wait_for(self, position: int, timeout: float = None) -> bool:
+        # block until the sample at `position - 1` has been written
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: self.written >= position, timeout=timeout
+            )
+
+    def oldest(self) -> int:
+        return max(0, self.written - self.capacity)
+
+    def read_into(self, out: np.ndarray, end: int) -> np.ndarray:
+        # copy the len(out) samples ending at absolute position `end` into out
+        n = len(out)
+        if end > self.written or end - n < self.oldest():
+            raise ValueError("requested samples are not in the buffer")
+
+        start = (end - n) % self.capacity
+        stop = start + n
+        if stop <= self.capacity:
+            out[:] = self.buffer[start:stop]
+        else:
+            split = self.capacity - start
+            out[:split] = self.buffer[start:]
+            out[split:] = self.buffer[: stop - self.capacity]
+        return out
+
+
+class SlidingWindowReader:
+    # consumer side of the ring buffer, yields overlapping windows every hop
+
+    def __init__(self, ring: RingBuffer, window_size: int, hop_size: int):
+        if window_size + hop_size > ring.capacity:
+            raise ValueError("window and hop do not fit in the ring buffer")
+
+        self.ring = ring
+        self.window_size = window_size
+        self.hop_size = hop_size
+        self.next_end = window_size
+        self.window = np.zeros(window_size, dtype=np.float32)
+        self.dropped_windows = 0
+
+    def next_window(self, timeout: float = None) -> tuple[int, np.ndarray] | None:
+        # returns (start sample, window) or None if no window is ready yet,
+        # the returned array is reused by the next call
+        if not self.ring.wait_for(self.next_end, timeout=timeout):
+            return None
+
+        # if the consumer fell behind, skip to the newest complete window
+        if self.next_end - self.window_size < self.ring.oldest():
+            behind = self.ring.written - self.next_end
+            skipped = behind // self.hop_size
+            self.dropped_windows += skipped
+            self.next_end += skipped * self.hop_size
+
+        end = self.next_end
+        self.ring.read_into(self.window, end)
+        self.next_end += self.hop_size
+        return end - self.window_size, self.window
+
+
+class MicrophoneSource:
+    def __init__(self, sample_rate: int, block_size: int = DEFAULT_BLOCK_SIZE):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.stream = None
+
+    def start(self, callback):
+        import sounddevice as sd
+
+        def stream_callback(indata, frames, time_info, status):
+            if status:
+                print(f"Audio input status: {status}")
+            callback(indata[:, 0])
+
+        self.stream = sd.InputStream(
+            samplerate=self.sample_rate,
+            blocksize=self.block_size,
+            channels=1,
+            dtype="float32",
+            callback=stream_callback,
+        )
+        self.stream.start()
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+
+class WavFileSource:
+    # stand-in for the microphone that plays a file into the callback in blocks
+
+    def __init__(
+        self,
+        path,
+        sample_rate: int,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        realtime: bool = True,
+    ):
+        self.audio, _ = load_audio(path, sample_rate)
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.realtime = realtime
+        self.finished = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self, callback):
+        self.finished.clear()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._play, args=(callback,))
+        self.thread.start()
+
+    def _play(self, callback):
+        block_duration = self.block_size / self.sample_rate
+        started = time.perf_counter()
+        for i, start in enumerate(range(0, len(self.audio), self.block_size)):
+            if self.stopped.is_set():
+                break
+            if self.realtime:
+                delay = started + i * block_duration - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            callback(self.audio[start : start + self.block_size])
+        self.finished.set()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
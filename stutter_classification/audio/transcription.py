@@ -0,0 +1,282 @@
+import importlib.util
+import json
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import NamedTuple
+
+import numpy as np
+
+from stutter_classification.audio.decode import resample
+from stutter_classification.audio.stream import SlidingWindowReader
+from stutter_classification.audio.vad import VoiceActivityDetector
+
+BLOCK_SECONDS = 0.1  # audio is segmented in blocks of this length
+
+# phrase segmentation, speech blocks come from the voice activity detector
+PRE_ROLL_SECONDS = 0.3  # audio kept from before speech starts
+PAUSE_SECONDS = 0.8  # silence that ends a phrase
+MIN_PHRASE_SECONDS = 0.3  # shorter bursts of speech are not transcribed
+MAX_PHRASE_SECONDS = 15.0  # longer phrases are cut and transcribed in parts
+
+BLOCK_TIMEOUT = 0.1  # seconds, how often the segmenter checks for stop
+VOSK_SAMPLE_RATE = 16000
+
+
+class Transcript(NamedTuple):
+    # times are seconds since the stream started, the same clock as the
+    # start samples of classified windows
+    start: float
+    end: float
+    text: str
+
+
+class Phrase(NamedTuple):
+    start: int  # absolute sample positions in the stream
+    end: int
+    audio: np.ndarray
+
+
+class TranscriptionBackend(ABC):
+    name: str
+
+    @abstractmethod
+    def transcribe(self, audio: np.ndarray, sample_rate: int) -> str | None:
+        # text of a float32 mono phrase, or None if nothing was recognized
+        pass
+
+
+class SpeechRecognitionBackend(TranscriptionBackend):
+    # engines provided by the speech_recognition package, fed with audio from
+    # the shared capture rather than their own microphone
+
+    def __init__(self):
+        import speech_recognition as sr
+
+        self.sr = sr
+        self.recognizer = sr.Recognizer()
+
+    def transcribe(self, audio: np.ndarray, sample_rate: int) -> str | None:
+        pcm = (np.clip(audio, -1, 1) * 32767).astype(np.int16)
+        audio_data = self.sr.AudioData(pcm.tobytes(), sample_rate, 2)
+        try:
+            return self.recognize(audio_data)
+        except self.sr.UnknownValueError:
+            return None
+
+    @abstractmethod
+    def recognize(self, audio_data) -> str:
+        pass
+
+
+class GoogleBackend(SpeechRecognitionBackend):
+    name = "Google"
+
+    def recognize(self, audio_data) -> str:
+        return self.recognizer.recognize_google(audio_data)
+
+
+class SphinxBackend(SpeechRecognitionBackend):
+    # offline, requires pocketsphinx
+    name = "Sphinx (offline)"
+
+    def recognize(self, audio_data) -> str:
+        return self.recognizer.recognize_sphinx(audio_data)
+
+
+class VoskBackend(TranscriptionBackend):
+    # offline, requires vosk. without a model path the small English model
+    # is downloaded once to vosk's cache directory
+    name = "Vosk (offline)"
+
+    def __init__(self, model_path=None):
+        try:
+            import vosk
+        except ImportError:
+            raise ImportError("the Vosk backend requires vosk to be installed")
+
+        vosk.SetLogLevel(-1)
+        self.vosk = vosk
+        if model_path is None:
+            self.model = vosk.Model(lang="en-us")
+        else:
+            self.model = vosk.Model(str(model_path))
+
+    def transcribe(self, audio: np.ndarray, sample_rate: int) -> str | None:
+        # through the same polyphase resampler as every other path
+        if sample_rate != VOSK_SAMPLE_RATE:
+            audio = resample(audio, sample_rate, VOSK_SAMPLE_RATE)
+        pcm = (np.clip(audio, -1, 1) * 32767).astype(np.int16)
+
+        recognizer = self.vosk.KaldiRecognizer(self.model, VOSK_SAMPLE_RATE)
+        recognizer.AcceptWaveform(pcm.tobytes())
+        text = json.loads(recognizer.FinalResult()).get("text", "")
+        return text or None
+
+
+TRANSCRIPTION_BACKENDS = {
+    backend.name: backend for backend in (GoogleBackend, VoskBackend, SphinxBackend)
+}
+
+# module each backend needs, used to pick a default that is installed
+BACKEND_REQUIREMENTS = {
+    VoskBackend.name: "vosk",
+    SphinxBackend.name: "pocketsphinx",
+    GoogleBackend.name: "speech_recognition",
+}
+
+
+def default_backend_name() -> str:
+    # prefer an installed offline engine, the network round trip otherwise
+    for name in (VoskBackend.name, SphinxBackend.name):
+        if importlib.util.find_spec(BACKEND_REQUIREMENTS[name]) is not None:
+            return name
+    return GoogleBackend.name
+
+
+class PhraseSegmenter:
+    # splits a stream of blocks into phrases of speech separated by pauses
+
+    def __init__(self, sample_rate: int, block_size: int):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        # pauses are counted here, so the detector has no hangover of its own
+        self.vad = VoiceActivityDetector(sample_rate)
+        self.pre_roll_blocks = self.blocks(PRE_ROLL_SECONDS)
+        self.pause_blocks = self.blocks(PAUSE_SECONDS)
+        self.min_phrase_blocks = self.blocks(MIN_PHRASE_SECONDS)
+        self.max_phrase_blocks = self.blocks(MAX_PHRASE_SECONDS)
+        self.reset()
+
+    def blocks(self, seconds: float) -> int:
+        return max(1, round(seconds * self.sample_rate / self.block_size))
+
+    def reset(self):
+        self.vad.reset()
+        self.pre_roll = deque(maxlen=self.pre_roll_blocks)
+        self.phrase = []
+        self.phrase_start = None
+        self.speech_blocks = 0
+        self.silent_blocks = 0
+
+    def add(self, start: int, block: np.ndarray) -> Phrase | None:
+        # start is the absolute sample of the block, returns a finished phrase
+        block = block.copy()
+        speech = self.vad.is_speech(block)
+
+        if self.phrase_start is None:
+            if not speech:
+                self.pre_roll.append((start, block))
+                return None
+            # speech started, keep the audio just before it
+            self.phrase = list(self.pre_roll)
+            self.pre_roll.clear()
+            self.phrase_start = start
+
+        self.phrase.append((start, block))
+        if speech:
+            self.speech_blocks += 1
+            self.silent_blocks = 0
+        else:
+            self.silent_blocks += 1
+
+        if (
+            self.silent_blocks >= self.pause_blocks
+            or len(self.phrase) >= self.max_phrase_blocks
+        ):
+            return self.finish()
+        return None
+
+    def finish(self) -> Phrase | None:
+        # ends the current phrase, too little speech is dropped
+        phrase, speech_blocks = self.phrase, self.speech_blocks
+        self.phrase = []
+        self.phrase_start = None
+        self.speech_blocks = 0
+        self.silent_blocks = 0
+
+        if speech_blocks < self.min_phrase_blocks:
+            return None
+        start = phrase[0][0]
+        end = phrase[-1][0] + self.block_size
+        return Phrase(start, end, np.concatenate([block for _, block in phrase]))
+
+
+class Transcriber:
+    # reads the capture ring buffer alongside the classifier, cuts it into
+    # phrases and transcribes them on a worker thread so a slow backend never
+    # holds up segmentation
+
+    def __init__(self, backend: TranscriptionBackend, on_transcript, metrics=None):
+        self.backend = backend
+        self.on_transcript = on_transcript
+        self.metrics = metrics
+        self.phrases = queue.Queue()
+        self.running = False
+        self.threads = []
+
+    def start(self, ring, sample_rate: int):
+        self.sample_rate = sample_rate
+        block_size = int(BLOCK_SECONDS * sample_rate)
+
+        # blocks are consecutive, non-overlapping windows of the ring buffer
+        self.reader = SlidingWindowReader(ring, block_size, block_size)
+        self.segmenter = PhraseSegmenter(sample_rate, block_size)
+
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self._segment, daemon=True),
+            threading.Thread(target=self._transcribe, daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _segment(self):
+        while self.running:
+            block = self.reader.next_window(timeout=BLOCK_TIMEOUT)
+            if block is None:
+                continue
+            phrase = self.segmenter.add(*block)
+            if phrase is not None:
+                self.phrases.put(phrase)
+
+        # transcribe whatever was being said when recording stopped
+        phrase = self.segmenter.finish()
+        if phrase is not None:
+            self.phrases.put(phrase)
+        self.phrases.put(None)
+
+    def _transcribe(self):
+        while True:
+            phrase = self.phrases.get()
+            if phrase is None:
+                return
+
+            started = time.perf_counter()
+            try:
+                text = self.backend.transcribe(phrase.audio, self.sample_rate)
+            except Exception as e:
+                print(f"{self.backend.name} transcription failed: {e}")
+                continue
+            if self.metrics is not None:
+                self.metrics.record("transcribe", time.perf_counter() - started)
+                self.metrics.increment("phrases")
+
+            if text:
+                self.on_transcript(
+                    Transcript(
+                        phrase.start / self.sample_rate,
+                        phrase.end / self.sample_rate,
+                        text,
+                    )
+                )
+
+    def stop(self, wait=True):
+        # pending phrases are still transcribed before the worker exits
+        self.running = False
+        if wait:
+            for thread in self.threads:
+                thread.join()
+        self.threads = []
@@ -0,0 +1,72 @@
+import numpy as np
+
+# energy thresholds, modelled on speech_recognition's dynamic energy threshold
+CALIBRATION_SECONDS = 1.0  # initial audio used to estimate the noise floor
+ENERGY_RATIO = 3.0  # speech is this many times louder than the noise floor
+MIN_ENERGY = 1e-3  # rms below this is always silence
+NOISE_ADAPTATION = 0.05  # noise floor rise rate during silence, falls instantly
+
+# broadband noise (hiss, fans, wind) crosses zero far more often than voiced
+# speech, fricatives alone sit in between and are carried by the hangover
+MAX_ZERO_CROSSING_RATE = 0.4
+
+DEFAULT_HANGOVER_SECONDS = 0.5  # audio after speech still treated as speech
+
+
+class VoiceActivityDetector:
+    # cheap energy and zero-crossing based speech detection for blocks or
+    # windows of a continuous stream, a few microseconds per call
+
+    def __init__(self, sample_rate: int, hangover_seconds: float = 0.0):
+        self.sample_rate = sample_rate
+        self.hangover_seconds = hangover_seconds
+        self.reset()
+
+    def reset(self):
+        self.noise_floor = None
+        self.calibration = []
+        self.calibration_seconds = 0.0
+        self.hangover = 0.0
+
+    def threshold(self) -> float:
+        # until the noise floor is calibrated only the absolute minimum applies
+        if self.noise_floor is None:
+            return MIN_ENERGY
+        return max(MIN_ENERGY, self.noise_floor * ENERGY_RATIO)
+
+    def is_speech(self, audio: np.ndarray, advance: int = None) -> bool:
+        # audio follows the previous call's audio, advance is the number of new
+        # samples when consecutive windows overlap
+        if len(audio) == 0:
+            return False
+        duration = (len(audio) if advance is None else advance) / self.sample_rate
+        rms = float(np.sqrt(np.dot(audio, audio) / len(audio)))
+
+        speech = rms > self.threshold()
+        if speech:
+            signs = np.signbit(audio)
+            zero_crossing_rate = np.count_nonzero(signs[1:] != signs[:-1]) / len(audio)
+            speech = zero_crossing_rate < MAX_ZERO_CROSSING_RATE
+
+        # the first audio also estimates the noise floor, it is still
+        # classified so speech right at the start is not missed
+        if self.noise_floor is None:
+            self.calibration.append(rms)
+            self.calibration_seconds += duration
+            if self.calibration_seconds >= CALIBRATION_SECONDS:
+                self.noise_floor = float(np.median(self.calibration))
+        elif not speech:
+            if rms < self.noise_floor:
+                self.noise_floor = rms
+            else:
+                self.noise_floor += NOISE_ADAPTATION * (rms - self.noise_floor)
+
+        if speech:
+            self.hangover = self.hangover_seconds
+            return True
+
+        # keep short pauses inside speech from flickering the result
+        if self.hangover > 0:
+            self.hangover -= duration
+            return True
+        return False
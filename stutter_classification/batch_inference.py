@@ -0,0 +1,358 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from tqdm import tqdm
+
+from stutter_classification.audio.decode import DECODE_BLOCK, read_audio_blocks
+from stutter_classification.audio.stream import (
+    INPUT_WINDOW,
+    SAMPLE_RATE,
+    RingBuffer,
+    SlidingWindowReader,
+)
+from stutter_classification.data.feature_extraction import StreamingFeatures
+from stutter_classification.models.options import (
+    DEFAULT_FEATURE_SET,
+    DEFAULT_N_MFCC,
+    FEATURE_SET_OPTIONS,
+    MODEL_TYPE_OPTIONS,
+    TYPE_LABELS,
+    UNDERLYING_MODEL_OPTIONS,
+    make_model,
+)
+from stutter_classification.models.smoothing import (
+    DEFAULT_SMOOTHING,
+    EVENT_END,
+    SMOOTHING_OPTIONS,
+    StutterEventTracker,
+)
+
+AUDIO_EXTENSIONS = {".wav", ".flac", ".mp3", ".ogg", ".m4a"}
+
+DEFAULT_BATCH_SIZE = 4096  # windows per predict call
+OUTPUT_COLUMNS = ["file", "start", "end", "prediction"]
+EVENT_COLUMNS = ["file", "label", "start", "end", "peak"]
+
+
+def find_audio_files(inputs, file_list=None):
+    # inputs are files or directories, directories are searched recursively
+    paths = []
+    if file_list:
+        with open(file_list) as f:
+            inputs = list(inputs) + [line.strip() for line in f if line.strip()]
+
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            paths.extend(
+                sorted(
+                    p
+                    for p in path.rglob("*")
+                    if p.is_file() and p.suffix.lower() in AUDIO_EXTENSIONS
+                )
+            )
+        else:
+            paths.append(path)
+    return paths
+
+
+def extract_file_windows(path, pipeline, window, hop):
+    # runs in a worker process, decodes one file in blocks and extracts every
+    # window with the model's feature pipeline as the blocks arrive, so memory
+    # does not grow with the length of the recording
+    window_size = int(window * SAMPLE_RATE)
+    hop_size = int(hop * SAMPLE_RATE)
+    ring = RingBuffer(window_size + hop_size + DECODE_BLOCK)
+    reader = SlidingWindowReader(ring, window_size, hop_size)
+    stream = StreamingFeatures(pipeline, SAMPLE_RATE)
+
+    starts, features = [], []
+    try:
+        for block in read_audio_blocks(path, SAMPLE_RATE):
+            # written in pieces no larger than the ring keeps past a window
+            for i in range(0, len(block), DECODE_BLOCK):
+                ring.write(block[i : i + DECODE_BLOCK])
+                while (next_window := reader.next_window(timeout=0)) is not None:
+                    start, audio = next_window
+                    starts.append(start)
+                    features.append(stream.update_window(start, audio))
+    except Exception as e:
+        empty = np.zeros((0, pipeline.n_features), dtype=np.float32)
+        return str(path), np.zeros(0), empty, 0.0, str(e) or type(e).__name__
+
+    features = np.array(features, dtype=np.float32).reshape(-1, pipeline.n_features)
+    duration = ring.written / SAMPLE_RATE
+    return str(path), np.array(starts) / SAMPLE_RATE, features, duration, None
+
+
+class CsvResultWriter:
+    def __init__(self, path):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(OUTPUT_COLUMNS)
+
+    def write(self, files, starts, ends, predictions):
+        self.writer.writerows(zip(files, starts, ends, predictions))
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetResultWriter:
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("writing parquet files requires pyarrow to be installed")
+
+        self.pa = pa
+        self.writer = None
+        self.path = path
+        self.pq = pq
+
+    def write(self, files, starts, ends, predictions):
+        table = self.pa.table(
+            {
+                "file": files,
+                "start": starts,
+                "end": ends,
+                "prediction": predictions,
+            }
+        )
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+RESULT_WRITERS = {"csv": CsvResultWriter, "parquet": ParquetResultWriter}
+
+
+class EventWriter:
+    # merges the windows of each file into stutter events with the tracker
+    # the live recorder uses, an event is written once it has ended
+
+    def __init__(self, path, labels, smoothing=DEFAULT_SMOOTHING):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(EVENT_COLUMNS)
+        self.tracker = StutterEventTracker(labels, smoothing)
+        self.path = None
+        self.n_events = 0
+
+    def add(self, path, starts, ends, probabilities):
+        # windows of one file, a new file ends the events of the previous one
+        if path != self.path:
+            self.finish_file()
+            self.path = path
+        self.write(self.tracker.update(starts, ends, probabilities))
+
+    def finish_file(self):
+        if self.path is not None:
+            self.write(self.tracker.flush())
+
+    def write(self, events):
+        rows = [
+            (self.path, event.label, event.start, event.end, event.peak)
+            for event in events
+            if event.kind == EVENT_END
+        ]
+        self.writer.writerows(rows)
+        self.n_events += len(rows)
+
+    def close(self):
+        self.finish_file()
+        self.file.close()
+
+
+class BatchClassifier:
+    # buffers windows from many files and classifies them in large batches
+
+    def __init__(
+        self, model, writer, window, batch_size=DEFAULT_BATCH_SIZE, events=None
+    ):
+        self.model = model
+        self.writer = writer
+        self.events = events
+        self.window = window
+        self.batch_size = batch_size
+        self.buffer = np.zeros((batch_size, model.n_features), dtype=np.float32)
+        self.starts = np.zeros(batch_size)
+        self.files = []
+        self.size = 0
+        self.n_windows = 0
+
+    def add(self, path, starts, features):
+        # a file with more windows than fit continues in the next batch
+        offset = 0
+        while offset < len(features):
+            n = min(len(features) - offset, self.batch_size - self.size)
+            self.buffer[self.size : self.size + n] = features[offset : offset + n]
+            self.starts[self.size : self.size + n] = starts[offset : offset + n]
+            self.files.extend([path] * n)
+            self.size += n
+            offset += n
+
+            if self.size == self.batch_size:
+                self.flush()
+
+    def flush(self):
+        if self.size == 0:
+            return
+        predictions = self.model.predict_batch(self.buffer[: self.size])
+        predictions = [self.model.prediction_label(p) for p in predictions]
+        starts = self.starts[: self.size]
+        self.writer.write(self.files, starts, starts + self.window, predictions)
+
+        if self.events is not None:
+            # the batch is split where the file changes
+            probabilities = self.model.event_probabilities(self.buffer[: self.size])
+            bounds = [0]
+            bounds += [
+                i for i in range(1, self.size) if self.files[i] != self.files[i - 1]
+            ]
+            bounds.append(self.size)
+            for a, b in zip(bounds[:-1], bounds[1:]):
+                self.events.add(
+                    self.files[a],
+                    starts[a:b],
+                    starts[a:b] + self.window,
+                    probabilities[a:b],
+                )
+
+        self.n_windows += self.size
+        self.files = []
+        self.size = 0
+
+
+def run(args):
+    paths = find_audio_files(args.inputs, args.file_list)
+    if not paths:
+        print("No audio files found")
+        return 1
+
+    model = make_model(
+        UNDERLYING_MODEL_OPTIONS[args.underlying_model],
+        MODEL_TYPE_OPTIONS[args.model_type],
+        args.label,
+        args.n_mfccs,
+        feature_groups=FEATURE_SET_OPTIONS[args.features],
+    )
+    test_score = model.load_or_train()
+    print(f"Model loaded, cross-validated score {test_score * 100:.2f}")
+
+    writer = RESULT_WRITERS[args.format](args.output)
+    events = None
+    if args.events:
+        events = EventWriter(args.events, model.event_labels(), args.smoothing)
+    classifier = BatchClassifier(
+        model, writer, args.window, batch_size=args.batch_size, events=events
+    )
+    n_workers = args.workers or os.cpu_count() or 1
+    audio_seconds = 0.0
+    n_failed = 0
+    started = time.perf_counter()
+
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            # only a bounded number of files are in flight at any time
+            max_in_flight = n_workers * 2
+            in_flight = []
+            path_iter = iter(paths)
+
+            with tqdm(total=len(paths), unit="file") as bar:
+                while True:
+                    while len(in_flight) < max_in_flight:
+                        path = next(path_iter, None)
+                        if path is None:
+                            break
+                        in_flight.append(
+                            executor.submit(
+                                extract_file_windows,
+                                path,
+                                model.pipeline,
+                                args.window,
+                                args.hop or args.window,
+                            )
+                        )
+                    if not in_flight:
+                        break
+
+                    # results are written in input order
+                    result = in_flight.pop(0).result()
+                    path, starts, features, duration, error = result
+                    if error:
+                        n_failed += 1
+                        tqdm.write(f"Skipping {path}: {error}")
+                    classifier.add(path, starts, features)
+                    audio_seconds += duration
+                    bar.update(1)
+                    bar.set_postfix(windows=classifier.n_windows + classifier.size)
+
+        classifier.flush()
+    finally:
+        writer.close()
+        if events is not None:
+            events.close()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Classified {classifier.n_windows} windows from {len(paths)} files "
+        f"in {elapsed:.1f}s ({classifier.n_windows / elapsed:.1f} windows/s, "
+        f"{audio_seconds / elapsed:.1f}x real time)"
+    )
+    if events is not None:
+        print(f"Wrote {events.n_events} stutter events to {args.events}")
+    if n_failed:
+        print(f"{n_failed} files could not be decoded")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Classify stutter windows in recorded audio files."
+    )
+    parser.add_argument("inputs", nargs="*", help="audio files or directories")
+    parser.add_argument("--file-list", help="text file with one audio path per line")
+    parser.add_argument("-o", "--output", required=True, help="output file")
+    parser.add_argument("--format", choices=RESULT_WRITERS, default="csv")
+    parser.add_argument(
+        "--model-type",
+        choices=MODEL_TYPE_OPTIONS,
+        default=list(MODEL_TYPE_OPTIONS)[0],
+    )
+    parser.add_argument(
+        "--underlying-model",
+        choices=UNDERLYING_MODEL_OPTIONS,
+        default=list(UNDERLYING_MODEL_OPTIONS)[0],
+    )
+    parser.add_argument("--label", choices=TYPE_LABELS, default=TYPE_LABELS[0])
+    parser.add_argument("--n-mfccs", type=int, default=DEFAULT_N_MFCC)
+    parser.add_argument(
+        "--features", choices=FEATURE_SET_OPTIONS, default=DEFAULT_FEATURE_SET
+    )
+    parser.add_argument("--window", type=float, default=INPUT_WINDOW, help="seconds")
+    parser.add_argument("--hop", type=float, help="seconds, defaults to the window")
+    parser.add_argument("--workers", type=int, help="feature extraction processes")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        "--events", help="also write smoothed stutter events to this csv file"
+    )
+    parser.add_argument(
+        "--smoothing", choices=SMOOTHING_OPTIONS, default=DEFAULT_SMOOTHING
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
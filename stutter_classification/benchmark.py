@@ -0,0 +1,664 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+import joblib
+import librosa
+import numpy as np
+import pandas as pd
+import sklearn
+import soundfile
+
+import stutter_classification.data.sep28k_data as sep28k_data
+import stutter_classification.models.base.stutter_model as stutter_model
+from stutter_classification.audio.decode import Resampler, load_audio
+from stutter_classification.audio.stream import (
+    CAPTURE_SAMPLE_RATE,
+    DEFAULT_BLOCK_SIZE,
+    INPUT_HOP,
+    INPUT_WINDOW,
+    SAMPLE_RATE,
+)
+from stutter_classification.data.feature_extraction import extract_mfccs
+from stutter_classification.export.compact import COMPACT_SUFFIX, CompactModel
+from stutter_classification.models import SingleFeatureModel
+from stutter_classification.models.options import (
+    DEFAULT_N_MFCC,
+    MODEL_TYPE_OPTIONS,
+    TYPE_LABELS,
+    UNDERLYING_MODEL_OPTIONS,
+    make_model,
+)
+
+BENCHMARK_DIR = sep28k_data.DATA_DIR / "benchmarks"
+BASELINE_PATH = BENCHMARK_DIR / "baseline.json"
+RESULTS_PATH = BENCHMARK_DIR / "latest.json"
+
+# SEP-28k clips are 3 second, 16 kHz mono files
+CLIP_SECONDS = 3.0
+CLIP_SAMPLE_RATE = 16000
+
+DEFAULT_N_CLIPS = 300
+DEFAULT_SEED = 0
+DEFAULT_TOLERANCE = 0.2  # relative change that counts as a regression
+MEMORY_NOISE_MB = 1.0  # smaller peak memory differences are never regressions
+DEFAULT_ESTIMATORS = ["DecisionTreeClassifier", "RandomForestClassifier", "GaussianNB"]
+
+STREAM_SECONDS = 30.0  # live audio fed through process_audio
+BUILD_REPEATS = 3
+UPDATE_FRACTION = 0.01  # clips changed before each incremental update
+INCREMENTAL_BATCH_SIZE = 64  # small, so the synthetic corpus spans many batches
+EXPORT_WINDOWS = 500  # single-window predictions timed per model
+
+# fast stages repeat until both limits are reached, so timings are not noise
+MIN_REPEATS = 5
+MIN_REPEAT_SECONDS = 1.0
+
+STARTUP_REPEATS = 5
+PACKAGE_ROOT = Path(__file__).resolve().parent.parent
+GUI_DIR = PACKAGE_ROOT / "stutter_classification" / "gui"
+
+# run in fresh interpreters, each prints the seconds it took to get going
+IMPORT_STARTUP_SCRIPT = """
+import time
+started = time.perf_counter()
+import stutter_classification.models
+from stutter_classification.models.options import MODEL_TYPE_OPTIONS
+print(time.perf_counter() - started)
+"""
+GUI_STARTUP_SCRIPT = """
+import os, sys, time
+started = time.perf_counter()
+from PyQt6.QtWidgets import QApplication
+app = QApplication(sys.argv)
+from app import SpeechApp
+window = SpeechApp()
+window.show()
+app.processEvents()
+print(time.perf_counter() - started, flush=True)
+os._exit(0)
+"""
+
+# SEP-28k label table layout, the first three columns name the clip
+LABEL_COLUMNS = [
+    "Show",
+    "EpId",
+    "ClipId",
+    "Start",
+    "Stop",
+    "Unsure",
+    "PoorAudioQuality",
+    "Prolongation",
+    "Block",
+    "SoundRep",
+    "WordRep",
+    "DifficultToUnderstand",
+    "Interjection",
+    "NoStutteredWords",
+    "NaturalPause",
+    "Music",
+    "NoSpeech",
+]
+SHOWS = ["HeStutters", "MyStutteringLife", "StutterTalk", "WomenWhoStutter"]
+
+STAGES = [
+    "startup",
+    "extract_mfccs",
+    "decode",
+    "build",
+    "load",
+    "train",
+    "export",
+    "process_audio",
+]
+
+
+def synthetic_speech(rng, seconds, sample_rate) -> np.ndarray:
+    # voiced harmonics with a wandering pitch, syllable-rate envelope, short
+    # pauses and background noise, close enough to speech for the MFCC path
+    n = int(seconds * sample_rate)
+    t = np.arange(n) / sample_rate
+
+    f0 = rng.uniform(90, 220) * (1 + 0.1 * np.sin(2 * np.pi * rng.uniform(0.5, 2) * t))
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+
+    envelope = np.clip(np.sin(2 * np.pi * rng.uniform(3, 6) * t), 0, None)
+    for start in rng.uniform(0, seconds, size=int(seconds)):
+        pause = (t >= start) & (t < start + rng.uniform(0.05, 0.3))
+        envelope[pause] = 0
+
+    audio = 0.2 * voiced * envelope + 0.01 * rng.standard_normal(n)
+    return audio.astype(np.float32)
+
+
+def write_synthetic_corpus(directory, n_clips, seed=DEFAULT_SEED):
+    # labels and clips laid out like the real corpus, clips/<show>/<episode>/
+    rng = np.random.default_rng(seed)
+    directory = Path(directory)
+
+    rows = []
+    for i in range(n_clips):
+        show = SHOWS[i % len(SHOWS)]
+        episode = i // 100
+        labels = {column: 0 for column in LABEL_COLUMNS[5:]}
+        for column in TYPE_LABELS + ["NoStutteredWords"]:
+            labels[column] = int(rng.choice(4, p=[0.55, 0.25, 0.12, 0.08]))
+        rows.append({"Show": show, "EpId": episode, "ClipId": i, **labels})
+
+        clip_dir = directory / "clips" / show / str(episode)
+        os.makedirs(clip_dir, exist_ok=True)
+        audio = synthetic_speech(rng, CLIP_SECONDS, CLIP_SAMPLE_RATE)
+        soundfile.write(
+            clip_dir / f"{show}_{episode}_{i}.wav",
+            audio,
+            CLIP_SAMPLE_RATE,
+            subtype="PCM_16",
+        )
+
+    labels = pd.DataFrame(rows)
+    labels["Start"] = labels.ClipId * int(CLIP_SECONDS * CLIP_SAMPLE_RATE)
+    labels["Stop"] = labels.Start + int(CLIP_SECONDS * CLIP_SAMPLE_RATE)
+    labels[LABEL_COLUMNS].to_csv(directory / "SEP-28k_labels.csv", index=False)
+
+
+@contextmanager
+def synthetic_corpus(directory):
+    # point the dataset module at the synthetic corpus, restoring it afterwards
+    directory = Path(directory)
+    paths = {
+        "LABELS_PATH": directory / "SEP-28k_labels.csv",
+        "CLIPS_DIR": directory / "clips",
+        "CHECKPOINTS_DIR": directory / "checkpoints",
+        "FEATURE_STORE_DIR": directory / "store",
+    }
+    saved = {name: getattr(sep28k_data, name) for name in paths}
+
+    for name, path in paths.items():
+        setattr(sep28k_data, name, path)
+    reset_caches()
+    try:
+        yield
+    finally:
+        for name, path in saved.items():
+            setattr(sep28k_data, name, path)
+        reset_caches()
+
+
+def reset_caches():
+    sep28k_data._sep28k_features = None
+    sep28k_data._sep28k_dataset = None
+    stutter_model._xy_cache.clear()
+
+
+def measure(name, unit, run, memory=True) -> dict:
+    # run() returns the number of items it processed and one latency per call.
+    # peak memory is traced in a separate first run, which also warms up
+    # librosa's filter caches so tracing and warm-up do not skew timings
+    peak_memory = None
+    if memory:
+        tracemalloc.start()
+        try:
+            run()
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    n_items, latencies = run()
+    latencies = np.asarray(latencies)
+    seconds = float(latencies.sum())
+
+    result = {
+        "stage": name,
+        "unit": unit,
+        "items": n_items,
+        "seconds": seconds,
+        "throughput": n_items / seconds,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "peak_memory_mb": peak_memory / 2**20 if peak_memory is not None else None,
+    }
+    print(
+        f"{name}: {result['throughput']:.1f} {unit}/s, "
+        f"p50 {result['p50_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms"
+    )
+    return result
+
+
+def timed(fn, *args, **kwargs) -> float:
+    started = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - started
+
+
+def repeat_timed(fn, setup=None) -> list[float]:
+    latencies = []
+    while len(latencies) < MIN_REPEATS or sum(latencies) < MIN_REPEAT_SECONDS:
+        if setup is not None:
+            setup()
+        latencies.append(timed(fn))
+    return latencies
+
+
+def bench_extract_mfccs(clips) -> dict:
+    def run():
+        return len(clips), [
+            timed(extract_mfccs, clip, CLIP_SAMPLE_RATE, DEFAULT_N_MFCC)
+            for clip in clips
+        ]
+
+    return measure("extract_mfccs", "clips", run)
+
+
+def bench_extract_features(clips) -> dict:
+    # every feature group the store holds, from one STFT per clip
+    def run():
+        return len(clips), [
+            timed(sep28k_data.STORE_PIPELINE.extract, clip, CLIP_SAMPLE_RATE)
+            for clip in clips
+        ]
+
+    return measure("FeaturePipeline.extract (all groups)", "clips", run)
+
+
+def bench_decode(paths) -> dict:
+    def run():
+        return len(paths), [timed(load_audio, path) for path in paths]
+
+    return measure("load_audio", "clips", run)
+
+
+def bench_resample_capture(audio) -> dict:
+    # microphone blocks resampled to the processing rate, as in the recorder
+    blocks = range(0, len(audio), DEFAULT_BLOCK_SIZE)
+
+    def run():
+        resampler = Resampler(CAPTURE_SAMPLE_RATE, SAMPLE_RATE)
+        return len(audio), [
+            timed(resampler.process, audio[start : start + DEFAULT_BLOCK_SIZE])
+            for start in blocks
+        ]
+
+    return measure("Resampler.process (capture)", "samples", run)
+
+
+def bench_build(n_clips, n_workers) -> dict:
+    # cold build of the feature store from the clips on disk
+    def run():
+        latencies = []
+        for _ in range(BUILD_REPEATS):
+            shutil.rmtree(sep28k_data.FEATURE_STORE_DIR, ignore_errors=True)
+            reset_caches()
+            latencies.append(timed(sep28k_data.get_sep28k_mfcc_df, n_workers=n_workers))
+        return n_clips * BUILD_REPEATS, latencies
+
+    # with several workers only this process's allocations are traced
+    return measure("get_sep28k_mfcc_df (build)", "clips", run)
+
+
+def bench_update(n_workers) -> dict:
+    # rebuild after a few clips changed, only those are extracted again
+    clips = sorted(Path(sep28k_data.CLIPS_DIR).rglob("*.wav"))
+    changed = clips[:: max(1, round(1 / UPDATE_FRACTION))]
+
+    def run():
+        latencies = []
+        for _ in range(BUILD_REPEATS):
+            for clip in changed:
+                os.utime(clip)
+            reset_caches()
+            latencies.append(timed(sep28k_data.get_sep28k_mfcc_df, n_workers=n_workers))
+        return len(changed) * BUILD_REPEATS, latencies
+
+    return measure("get_sep28k_mfcc_df (update)", "clips", run)
+
+
+def bench_load() -> dict:
+    # warm load of an existing feature store, as every model does on startup
+    def run():
+        latencies = repeat_timed(sep28k_data.get_sep28k_mfcc_df, setup=reset_caches)
+        return len(latencies), latencies
+
+    return measure("get_sep28k_mfcc_df (load)", "calls", run)
+
+
+def bench_train(estimator, model_type) -> dict:
+    model = make_model(
+        UNDERLYING_MODEL_OPTIONS[estimator],
+        MODEL_TYPE_OPTIONS[model_type],
+        TYPE_LABELS[0],
+        DEFAULT_N_MFCC,
+    )
+    n_samples = len(model.get_dataset().X_train)
+
+    def run():
+        latencies = repeat_timed(model.train)
+        return n_samples * len(latencies), latencies
+
+    return measure(f"StutterModel.train [{estimator}]", "samples", run)
+
+
+def bench_train_incremental(estimator, model_type) -> dict:
+    # partial_fit over batches streamed from the store, its peak memory should
+    # not grow with the number of clips
+    model = make_model(
+        UNDERLYING_MODEL_OPTIONS[estimator],
+        MODEL_TYPE_OPTIONS[model_type],
+        TYPE_LABELS[0],
+        DEFAULT_N_MFCC,
+    )
+    dataset = model.stream_dataset(batch_size=INCREMENTAL_BATCH_SIZE, shuffle=True)
+
+    def run():
+        latencies = repeat_timed(lambda: model.train_incremental(dataset))
+        return len(dataset) * len(latencies), latencies
+
+    return measure(f"StutterModel.train_incremental [{estimator}]", "samples", run)
+
+
+def bench_export(estimator, model_type, directory) -> list[dict]:
+    # the sklearn model against its compact export: loading the artifact, one
+    # window and a batch of windows. the load's peak memory is the heap the
+    # model occupies, a memory-mapped compact model is file-backed instead
+    model = make_model(
+        UNDERLYING_MODEL_OPTIONS[estimator],
+        MODEL_TYPE_OPTIONS[model_type],
+        TYPE_LABELS[0],
+        DEFAULT_N_MFCC,
+    )
+    model.train()
+    compact = model.export()
+    X = model.get_dataset().X_test
+    windows = X[: min(len(X), EXPORT_WINDOWS)]
+
+    sklearn_path = Path(directory) / "model.joblib"
+    joblib.dump(model.model, sklearn_path)
+    compact_path = compact.save(Path(directory) / f"model{COMPACT_SUFFIX}")
+
+    results = []
+    for name, predictor, path, load in (
+        ("sklearn", model, sklearn_path, joblib.load),
+        ("compact", compact, compact_path, CompactModel.load),
+    ):
+
+        def run_load():
+            latencies = repeat_timed(lambda: load(path))
+            return len(latencies), latencies
+
+        def run_window():
+            return len(windows), [timed(predictor.predict_array, w) for w in windows]
+
+        def run_batch():
+            latencies = repeat_timed(lambda: predictor.predict_batch(X))
+            return len(X) * len(latencies), latencies
+
+        stages = [
+            measure(f"load [{estimator}] ({name})", "loads", run_load),
+            measure(f"predict_array [{estimator}] ({name})", "windows", run_window),
+            measure(f"predict_batch [{estimator}] ({name})", "windows", run_batch),
+        ]
+        stages[0]["artifact_mb"] = path.stat().st_size / 2**20
+        print(f"{name} artifact: {stages[0]['artifact_mb'] * 2**10:.1f} KiB")
+        results += stages
+    return results
+
+
+def bench_process_audio(audio) -> dict:
+    try:
+        from stutter_classification.gui.recorder import Recorder
+    except ImportError as e:
+        print(f"Skipping process_audio, the recorder could not be imported: {e}")
+        return None
+
+    model = SingleFeatureModel(
+        UNDERLYING_MODEL_OPTIONS["DecisionTreeClassifier"],
+        TYPE_LABELS[0],
+        n_mfccs=DEFAULT_N_MFCC,
+    )
+    model.train()
+
+    # the source is never started, windows are fed in directly
+    recorder = Recorder()
+    recorder.swap_model(model, 0.0)
+
+    window = int(INPUT_WINDOW * SAMPLE_RATE)
+    starts = range(0, len(audio) - window + 1, int(INPUT_HOP * SAMPLE_RATE))
+
+    def run():
+        latencies = [
+            timed(recorder.process_audio, audio[start : start + window], start)
+            for start in starts
+        ]
+        recorder.finish_events()
+        return len(starts), latencies
+
+    return measure("Recorder.process_audio", "windows", run)
+
+
+def bench_startup(name, script) -> dict:
+    # cold start in a new interpreter, from the first import until ready
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join([str(PACKAGE_ROOT), str(GUI_DIR)]),
+        "QT_QPA_PLATFORM": "offscreen",
+    }
+
+    def run():
+        latencies = []
+        for _ in range(STARTUP_REPEATS):
+            output = subprocess.run(
+                [sys.executable, "-c", script],
+                env=env,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            latencies.append(float(output.strip().splitlines()[-1]))
+        return STARTUP_REPEATS, latencies
+
+    # memory of another process cannot be traced
+    return measure(name, "starts", run, memory=False)
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "numpy": np.__version__,
+        "librosa": librosa.__version__,
+        "sklearn": sklearn.__version__,
+    }
+
+
+def run_benchmarks(args) -> dict:
+    rng = np.random.default_rng(args.seed)
+    results = []
+
+    if "startup" in args.stages:
+        results.append(bench_startup("startup (import models)", IMPORT_STARTUP_SCRIPT))
+        if importlib.util.find_spec("PyQt6") is not None:
+            results.append(bench_startup("startup (SpeechApp)", GUI_STARTUP_SCRIPT))
+        else:
+            print("Skipping SpeechApp startup, PyQt6 is not installed")
+
+    with tempfile.TemporaryDirectory() as directory:
+        if "extract_mfccs" in args.stages:
+            clips = [
+                synthetic_speech(rng, CLIP_SECONDS, CLIP_SAMPLE_RATE)
+                for _ in range(args.clips)
+            ]
+            results.append(bench_extract_mfccs(clips))
+            results.append(bench_extract_features(clips))
+
+        write_synthetic_corpus(directory, args.clips, seed=args.seed)
+        if "decode" in args.stages:
+            results.append(bench_decode(sorted(Path(directory).rglob("*.wav"))))
+            audio = synthetic_speech(rng, STREAM_SECONDS, CAPTURE_SAMPLE_RATE)
+            results.append(bench_resample_capture(audio))
+
+        with synthetic_corpus(directory):
+            if "build" in args.stages:
+                results.append(bench_build(args.clips, args.workers))
+                results.append(bench_update(args.workers))
+
+            # every later stage needs the feature store
+            sep28k_data.get_sep28k_features(n_workers=args.workers)
+            if "load" in args.stages:
+                results.append(bench_load())
+
+            if "train" in args.stages:
+                for estimator in args.estimators:
+                    for model_type in args.model_types:
+                        results.append(bench_train(estimator, model_type))
+                        estimator_type = UNDERLYING_MODEL_OPTIONS[estimator].resolve()
+                        if hasattr(estimator_type, "partial_fit"):
+                            results.append(
+                                bench_train_incremental(estimator, model_type)
+                            )
+
+            if "export" in args.stages:
+                for estimator in args.estimators:
+                    for model_type in args.model_types:
+                        results += bench_export(estimator, model_type, directory)
+
+            if "process_audio" in args.stages:
+                audio = synthetic_speech(rng, STREAM_SECONDS, SAMPLE_RATE)
+                result = bench_process_audio(audio)
+                if result is not None:
+                    results.append(result)
+
+    return {
+        "environment": environment(),
+        "settings": {"clips": args.clips, "seed": args.seed, "workers": args.workers},
+        "stages": results,
+    }
+
+
+def compare(results, baseline, tolerance) -> pd.DataFrame:
+    # relative change of each metric, positive is worse for every metric. the
+    # median is compared rather than the tail, which is mostly scheduler noise
+    baseline_stages = {stage["stage"]: stage for stage in baseline["stages"]}
+    rows = []
+    for stage in results["stages"]:
+        base = baseline_stages.get(stage["stage"])
+        if base is None:
+            continue
+
+        changes = {
+            "throughput": base["throughput"] / stage["throughput"] - 1,
+            "p50_ms": stage["p50_ms"] / base["p50_ms"] - 1,
+        }
+        if stage["peak_memory_mb"] and base["peak_memory_mb"]:
+            growth = stage["peak_memory_mb"] - base["peak_memory_mb"]
+            changes["peak_memory_mb"] = (
+                growth / base["peak_memory_mb"] if growth > MEMORY_NOISE_MB else 0.0
+            )
+
+        for metric, change in changes.items():
+            rows.append(
+                {
+                    "stage": stage["stage"],
+                    "metric": metric,
+                    "baseline": base[metric],
+                    "current": stage[metric],
+                    "change": change,
+                    "regression": change > tolerance,
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+def save_results(results, path):
+    os.makedirs(Path(path).parent, exist_ok=True)
+    tmp_path = Path(path).with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark extraction, training and inference on synthetic audio."
+    )
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--clips", type=int, default=DEFAULT_N_CLIPS)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="feature store build processes, 1 gives the most stable numbers",
+    )
+    parser.add_argument(
+        "--estimators",
+        nargs="+",
+        choices=UNDERLYING_MODEL_OPTIONS,
+        default=DEFAULT_ESTIMATORS,
+    )
+    parser.add_argument(
+        "--model-types",
+        nargs="+",
+        choices=MODEL_TYPE_OPTIONS,
+        default=list(MODEL_TYPE_OPTIONS)[:1],
+    )
+    parser.add_argument("-o", "--output", default=str(RESULTS_PATH))
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store these results as the baseline instead of comparing",
+    )
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmarks(args)
+    save_results(results, args.output)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        save_results(results, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against, run with --save-baseline first")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["environment"] != results["environment"]:
+        print(f"Baseline environment differs: {baseline['environment']}")
+
+    comparison = compare(results, baseline, args.tolerance)
+    if comparison.empty:
+        print("No stages in common with the baseline")
+        return 0
+
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(comparison.to_string(index=False))
+
+    regressions = comparison[comparison.regression]
+    if not regressions.empty:
+        print(f"{len(regressions)} metrics regressed by more than {args.tolerance:.0%}")
+        return 1
+    print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
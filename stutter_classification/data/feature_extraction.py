@@ -1,6 +1,10 @@
+import functools
+
 import librosa
 import numpy as np
-import pandas as pd
+import scipy.fft
+
+from stutter_classification.audio.decode import load_audio
 
 
 def extract_mfccs(audio, sample_rate, n_mfccs=13):
@@ -10,14 +14,257 @@ def extract_mfccs(audio, sample_rate, n_mfccs=13):
     return mfccs
 
 
-def extract_mfccs_from_file(file_path, n_mfccs=13):
-    audio, sample_rate = librosa.load(file_path, res_type="kaiser_fast", sr=None)
-    return extract_mfccs(audio, sample_rate, n_mfccs=n_mfccs)
+# per-clip features derived from one shared STFT, in storage order. groups
+# marked per_mfcc have one column per MFCC coefficient, so a model using fewer
+# coefficients selects a prefix of each of them
+FEATURE_GROUPS = {
+    "mfcc_mean": {"per_mfcc": True},
+    "mfcc_std": {"per_mfcc": True},
+    "mfcc_delta_std": {"per_mfcc": True},
+    "mfcc_delta2_std": {"per_mfcc": True},
+    "zcr": {"per_mfcc": False, "size": 2},  # mean, std
+    "spectral_flux": {"per_mfcc": False, "size": 3},  # mean, std, max
+    "pitch": {"per_mfcc": False, "size": 3},  # mean, std, voiced fraction
+}
+DEFAULT_FEATURE_GROUPS = ("mfcc_mean",)
+
+PITCH_FMIN = 60.0  # Hz, search range of the autocorrelation pitch estimate
+PITCH_FMAX = 400.0
+VOICING_THRESHOLD = 0.3  # normalized autocorrelation peak of a voiced frame
+DELTA_WIDTH = 9
+
+
+def feature_layout(n_mfccs, groups=tuple(FEATURE_GROUPS)) -> dict[str, tuple[int, int]]:
+    # column range of every group when the groups are concatenated
+    layout = {}
+    offset = 0
+    for group in groups:
+        spec = FEATURE_GROUPS[group]
+        size = n_mfccs if spec["per_mfcc"] else spec["size"]
+        layout[group] = (offset, offset + size)
+        offset += size
+    return layout
+
+
+def feature_columns(layout, n_mfccs, groups=DEFAULT_FEATURE_GROUPS) -> np.ndarray:
+    # column indices of the selected groups within a stored feature matrix
+    columns = []
+    for group in groups:
+        start, stop = layout[group]
+        if FEATURE_GROUPS[group]["per_mfcc"]:
+            stop = start + n_mfccs
+        columns.append(np.arange(start, stop))
+    return np.concatenate(columns)
+
+
+def column_slice(columns: np.ndarray) -> np.ndarray | slice:
+    # contiguous columns as a slice, so indexing a memory map stays a view
+    if np.array_equal(columns, np.arange(columns[0], columns[0] + len(columns))):
+        return slice(int(columns[0]), int(columns[0]) + len(columns))
+    return columns
+
+
+@functools.lru_cache(maxsize=8)
+def mel_filters(sample_rate, n_fft, n_mels):
+    return librosa.filters.mel(sr=sample_rate, n_fft=n_fft, n_mels=n_mels).astype(
+        np.float32
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def stft_window(n_fft):
+    return librosa.filters.get_window("hann", n_fft).astype(np.float32)
+
+
+class FeaturePipeline:
+    # frames and transforms a clip once, then derives every feature group from
+    # the shared frames, power spectrum and MFCC matrix. the MFCCs follow the
+    # same steps as librosa.feature.mfcc, so mfcc_mean matches extract_mfccs
+
+    def __init__(
+        self,
+        n_mfccs=13,
+        groups=tuple(FEATURE_GROUPS),
+        n_fft=2048,
+        hop_length=512,
+        n_mels=128,
+        top_db=80.0,
+        amin=1e-10,
+    ):
+        self.n_mfccs = n_mfccs
+        self.groups = tuple(groups)
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_mels = n_mels
+        self.top_db = top_db
+        self.amin = amin
+        self.layout = feature_layout(n_mfccs, self.groups)
+        self.n_features = max(stop for _, stop in self.layout.values())
+        self.uses_mfcc = any(FEATURE_GROUPS[group]["per_mfcc"] for group in self.groups)
+
+    def params(self) -> dict:
+        return {
+            "groups": list(self.groups),
+            "n_mfccs": self.n_mfccs,
+            "n_fft": self.n_fft,
+            "hop_length": self.hop_length,
+            "n_mels": self.n_mels,
+            "pitch_range": [PITCH_FMIN, PITCH_FMAX],
+        }
+
+    def frames(self, audio) -> np.ndarray:
+        # centered, zero padded frames like librosa.stft
+        pad = self.n_fft // 2
+        audio = np.pad(np.asarray(audio, dtype=np.float32), pad)
+        if len(audio) < self.n_fft:
+            audio = np.pad(audio, (0, self.n_fft - len(audio)))
+        return np.lib.stride_tricks.sliding_window_view(audio, self.n_fft)[
+            :: self.hop_length
+        ]
+
+    def extract(self, audio, sample_rate) -> np.ndarray:
+        frames = self.frames(audio)
+        power = self.power(frames)
+        mel = self.mel(power, sample_rate) if self.uses_mfcc else None
+        return self.features(frames, power, mel, sample_rate)
+
+    def features(self, frames, power, mel, sample_rate) -> np.ndarray:
+        # every group from the frames of one clip and their spectra, mel is
+        # only needed by the MFCC groups
+        features = np.zeros(self.n_features, dtype=np.float32)
+        mfcc = None
+        for group in self.groups:
+            start, stop = self.layout[group]
+            if FEATURE_GROUPS[group]["per_mfcc"] and mfcc is None:
+                mfcc = self.mfcc(mel)
+
+            if group == "mfcc_mean":
+                features[start:stop] = mfcc.mean(axis=1)
+            elif group == "mfcc_std":
+                features[start:stop] = mfcc.std(axis=1)
+            elif group == "mfcc_delta_std":
+                features[start:stop] = self.delta(mfcc, 1).std(axis=1)
+            elif group == "mfcc_delta2_std":
+                features[start:stop] = self.delta(mfcc, 2).std(axis=1)
+            elif group == "zcr":
+                features[start:stop] = stats(zero_crossing_rate(frames), "mean", "std")
+            elif group == "spectral_flux":
+                flux = spectral_flux(np.sqrt(power))
+                features[start:stop] = stats(flux, "mean", "std", "max")
+            elif group == "pitch":
+                features[start:stop] = pitch_stats(power, sample_rate, self.n_fft)
+        return features
+
+    def extract_file(self, file_path) -> np.ndarray:
+        # decoded at the canonical rate, the rate live windows are captured at
+        audio, sample_rate = load_audio(file_path)
+        return self.extract(audio, sample_rate)
+
+    def power(self, frames) -> np.ndarray:
+        spectrum = scipy.fft.rfft(frames * stft_window(self.n_fft), axis=1)
+        return spectrum.real**2 + spectrum.imag**2
+
+    def mel(self, power, sample_rate) -> np.ndarray:
+        return power @ mel_filters(sample_rate, self.n_fft, self.n_mels).T
+
+    def mfcc(self, mel) -> np.ndarray:
+        # (n_mfccs, frames), the layout librosa.feature.mfcc returns. the dB
+        # floor is relative to the loudest frame, so it is applied per clip
+        mel_db = 10.0 * np.log10(np.maximum(self.amin, mel))
+        mel_db = np.maximum(mel_db, mel_db.max() - self.top_db)
+        return scipy.fft.dct(mel_db, axis=1, type=2, norm="ortho")[:, : self.n_mfccs].T
+
+    def delta(self, mfcc, order) -> np.ndarray:
+        # the delta filter needs at least its width in frames
+        if mfcc.shape[1] < DELTA_WIDTH:
+            return np.zeros_like(mfcc)
+        return librosa.feature.delta(mfcc, width=DELTA_WIDTH, order=order)
+
+
+class StreamingFeatures:
+    # pipeline.extract of each window of a stream, reusing work between
+    # overlapping windows. windows are framed like extract, and frames lying
+    # wholly inside a window depend only on the stream, so their power and mel
+    # spectra are kept and reused by the next window when the hop between
+    # windows is a multiple of hop_length. edge frames, zero padded by the
+    # window, and the per-window dB floor are computed for every window
+
+    def __init__(self, pipeline, sample_rate):
+        self.pipeline = pipeline
+        self.sample_rate = sample_rate
+        self.reset()
+
+    def reset(self):
+        self.previous = None  # (start, size, power, mel) of the last window
+
+    def interior(self, window_size) -> tuple[int, int]:
+        # frame range lying wholly inside a window of window_size samples
+        pipeline = self.pipeline
+        pad = pipeline.n_fft // 2
+        first = -(-pad // pipeline.hop_length)
+        stop = (pad + window_size - pipeline.n_fft) // pipeline.hop_length + 1
+        return first, stop
+
+    def update_window(self, start, window) -> np.ndarray:
+        # features of the window starting at absolute sample `start`
+        pipeline = self.pipeline
+        frames = pipeline.frames(window)
+        power = np.empty((len(frames), pipeline.n_fft // 2 + 1), dtype=np.float32)
+        mel = None
+        if pipeline.uses_mfcc:
+            mel = np.empty((len(frames), pipeline.n_mels), dtype=np.float32)
+
+        missing = np.ones(len(frames), dtype=bool)
+        if self.previous is not None:
+            previous_start, previous_size, previous_power, previous_mel = self.previous
+            shift, remainder = divmod(start - previous_start, pipeline.hop_length)
+            if remainder == 0 and shift > 0 and previous_size == len(window):
+                # interior frame i of this window is frame i + shift of the
+                # last one, an empty range once the windows stop overlapping
+                first, stop = self.interior(len(window))
+                reused = slice(first, max(first, stop - shift))
+                power[reused] = previous_power[first + shift : stop]
+                if mel is not None:
+                    mel[reused] = previous_mel[first + shift : stop]
+                missing[reused] = False
+
+        power[missing] = pipeline.power(frames[missing])
+        if mel is not None:
+            mel[missing] = pipeline.mel(power[missing], self.sample_rate)
+        self.previous = (start, len(window), power, mel)
+        return pipeline.features(frames, power, mel, self.sample_rate)
+
+
+def stats(values, *names) -> list[float]:
+    if len(values) == 0:
+        return [0.0] * len(names)
+    return [float(getattr(np, name)(values)) for name in names]
+
+
+def zero_crossing_rate(frames) -> np.ndarray:
+    signs = np.signbit(frames)
+    return np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frames.shape[1]
+
+
+def spectral_flux(magnitude) -> np.ndarray:
+    # l2 norm of the spectral increase between consecutive frames
+    increase = np.maximum(np.diff(magnitude, axis=0), 0)
+    return np.sqrt(np.sum(increase**2, axis=1))
+
+
+def pitch_stats(power, sample_rate, n_fft) -> list[float]:
+    # autocorrelation of every frame is the inverse FFT of its power spectrum,
+    # the strongest peak in the pitch range gives f0 for voiced frames
+    autocorrelation = scipy.fft.irfft(power, n=n_fft, axis=1)
+    energy = autocorrelation[:, :1]
+    min_lag = int(sample_rate / PITCH_FMAX)
+    max_lag = min(int(sample_rate / PITCH_FMIN), n_fft // 2)
 
+    normalized = autocorrelation[:, min_lag:max_lag] / np.maximum(energy, 1e-12)
+    peak = normalized.argmax(axis=1)
+    voiced = normalized[np.arange(len(peak)), peak] > VOICING_THRESHOLD
+    if not voiced.any():
+        return [0.0, 0.0, 0.0]
 
-def extract_single_mfcc_feature(audio, sample_rate, n_mfccs=13):
-    mfccs = extract_mfccs(audio, sample_rate, n_mfccs=n_mfccs)
-    features = mfccs.reshape(1, -1)
-    # format as a dataframe with column labels from 0 to n_mfcc-1
-    features_df = pd.DataFrame(features, columns=[str(i) for i in range(n_mfccs)])
-    return features_df
+    f0 = sample_rate / (peak[voiced] + min_lag)
+    return [float(f0.mean()), float(f0.std()), float(voiced.mean())]
@@ -0,0 +1,138 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+STORE_VERSION = 2
+
+FEATURES_FILE = "features.npy"
+LABELS_FILE = "labels.pkl"
+MANIFEST_FILE = "manifest.pkl"
+META_FILE = "meta.json"
+
+KEY_COLUMN = "Name"
+
+
+class FeatureStore:
+    # float32 feature matrix, memory-mapped on load, plus a compact label table
+    # whose rows line up with the feature rows and are keyed by clip name
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    @property
+    def features_path(self) -> Path:
+        return self.path / FEATURES_FILE
+
+    @property
+    def labels_path(self) -> Path:
+        return self.path / LABELS_FILE
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.path / MANIFEST_FILE
+
+    @property
+    def meta_path(self) -> Path:
+        return self.path / META_FILE
+
+    def read_meta(self) -> dict | None:
+        if not os.path.exists(self.meta_path):
+            return None
+        with open(self.meta_path) as f:
+            return json.load(f)
+
+    def is_valid(self, params: dict) -> bool:
+        # a store built with different extraction parameters is stale
+        meta = self.read_meta()
+        if meta is None:
+            return False
+        return meta["version"] == STORE_VERSION and meta["params"] == params
+
+    def read_manifest(self) -> pd.DataFrame | None:
+        # the clips the store was built from, with their signatures
+        if not os.path.exists(self.manifest_path):
+            return None
+        return pd.read_pickle(self.manifest_path)
+
+    def write(self, labels: pd.DataFrame, features: np.ndarray, params: dict):
+        out = self.open_features(*features.shape)
+        out[:] = features
+        self.commit(labels, out, params)
+
+    def open_features(self, n_rows: int, n_features: int) -> np.memmap:
+        # the matrix is filled in place on disk, so a build never holds more
+        # than the rows it is currently writing
+        os.makedirs(self.path, exist_ok=True)
+
+        # meta is written last and marks the store as complete
+        if os.path.exists(self.meta_path):
+            os.remove(self.meta_path)
+
+        return np.lib.format.open_memmap(
+            self.features_path, mode="w+", dtype=np.float32, shape=(n_rows, n_features)
+        )
+
+    def commit(
+        self,
+        labels: pd.DataFrame,
+        features: np.memmap,
+        params: dict,
+        fingerprint: dict = None,
+        manifest: pd.DataFrame = None,
+    ):
+        if len(labels) != len(features):
+            raise ValueError("labels and features must have the same number of rows")
+
+        features.flush()
+        compact_labels(labels).to_pickle(self.labels_path)
+        if manifest is not None:
+            manifest.to_pickle(self.manifest_path)
+        elif os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+
+        meta = {
+            "version": STORE_VERSION,
+            "params": params,
+            "fingerprint": fingerprint,
+            "n_rows": len(labels),
+            "n_features": int(features.shape[1]),
+        }
+        with open(self.meta_path, "w") as f:
+            json.dump(meta, f, indent=2)
+
+    def replace(self, other: "FeatureStore"):
+        # moves a complete store built elsewhere into this one. meta is
+        # removed first and moved last, so an interrupted replace leaves an
+        # incomplete store that is rebuilt
+        os.makedirs(self.path, exist_ok=True)
+        if os.path.exists(self.meta_path):
+            os.remove(self.meta_path)
+        for name in (FEATURES_FILE, LABELS_FILE, MANIFEST_FILE, META_FILE):
+            if os.path.exists(other.path / name):
+                os.replace(other.path / name, self.path / name)
+            elif os.path.exists(self.path / name):
+                os.remove(self.path / name)
+        shutil.rmtree(other.path, ignore_errors=True)
+
+    def load(self) -> tuple[pd.DataFrame, np.ndarray]:
+        labels = pd.read_pickle(self.labels_path)
+        features = np.load(self.features_path, mmap_mode="r")
+        return labels, features
+
+
+def compact_labels(labels: pd.DataFrame) -> pd.DataFrame:
+    labels = labels.reset_index(drop=True).copy()
+    for column in labels.columns:
+        if column == KEY_COLUMN:
+            continue
+        if pd.api.types.is_integer_dtype(labels[column]):
+            labels[column] = pd.to_numeric(labels[column], downcast="integer")
+        elif pd.api.types.is_float_dtype(labels[column]):
+            labels[column] = pd.to_numeric(labels[column], downcast="float")
+        elif labels[column].nunique() < len(labels) // 2:
+            labels[column] = labels[column].astype("category")
+    return labels
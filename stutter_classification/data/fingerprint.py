@@ -0,0 +1,42 @@
+import hashlib
+import json
+from importlib import metadata
+
+import pandas as pd
+
+# libraries whose version can change extracted features
+FEATURE_LIBRARIES = ("numpy", "scipy", "librosa")
+
+
+def library_versions(names=FEATURE_LIBRARIES) -> dict:
+    return {name: metadata.version(name) for name in names}
+
+
+def hash_json(value) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+def hash_frame(frame: pd.DataFrame) -> str:
+    # content hash of a table, its column names, row order and values
+    digest = hashlib.sha1(json.dumps(list(map(str, frame.columns))).encode())
+    rows = pd.util.hash_pandas_object(frame, index=False)
+    digest.update(rows.to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def dataset_fingerprint(
+    labels: pd.DataFrame, clips: pd.DataFrame, params: dict
+) -> dict:
+    # what a feature store was built from: the label rows, the size and
+    # modification time of every clip and the extraction parameters, which
+    # include library versions. hashed separately, so a change to labels
+    # alone never needs features to be extracted again
+    return {
+        "labels": hash_frame(labels),
+        "clips": hash_frame(clips),
+        "params": hash_json(params),
+    }
+
+
+def fingerprint_digest(fingerprint: dict) -> str:
+    return hash_json(fingerprint)[:16]
@@ -0,0 +1,108 @@
+import os
+import struct
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# a wav file holding only its 44-byte header has no audio
+EMPTY_CLIP_SIZE = 44
+
+# enough bytes to find the fmt and data chunks of any wav header we produce
+HEADER_READ_SIZE = 512
+
+# a clip with the same size and modification time is taken to be unchanged
+SIGNATURE_COLUMNS = ["Size", "MTime"]
+HEADER_COLUMNS = ["SampleRate", "Channels", "BitsPerSample", "Duration"]
+
+MANIFEST_COLUMNS = [
+    "Name",
+    "Path",
+    "Size",
+    "MTime",
+    "SampleRate",
+    "Channels",
+    "BitsPerSample",
+    "Duration",
+]
+
+
+def scan_clips(directory, previous: pd.DataFrame = None) -> pd.DataFrame:
+    # walk the directory once, reading only the header of each clip. clips
+    # unchanged since a previous scan keep their header fields, so a rescan
+    # only stats the files
+    known = {}
+    if previous is not None and "MTime" in previous:
+        columns = ["Path", *SIGNATURE_COLUMNS, *HEADER_COLUMNS]
+        known = {
+            tuple(row[:3]): tuple(row[3:])
+            for row in previous[columns].itertuples(index=False)
+        }
+
+    rows = []
+    for path, size, mtime in _walk_files(directory):
+        header = known.get((path, size, mtime))
+        if header is None:
+            sample_rate, channels, bits_per_sample, data_size = read_wav_header(path)
+            bytes_per_second = sample_rate * channels * bits_per_sample // 8
+            duration = data_size / bytes_per_second if bytes_per_second else 0.0
+            header = (sample_rate, channels, bits_per_sample, duration)
+        rows.append((Path(path).stem, path, size, mtime, *header))
+
+    manifest = pd.DataFrame(rows, columns=MANIFEST_COLUMNS)
+    return manifest.drop_duplicates(subset="Name", ignore_index=True)
+
+
+def _walk_files(directory):
+    stack = [os.fspath(directory)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    yield entry.path, stat.st_size, stat.st_mtime_ns
+
+
+def read_wav_header(path) -> tuple[int, int, int, int]:
+    # returns (sample_rate, channels, bits_per_sample, data_size), zeros if unreadable
+    with open(path, "rb") as f:
+        header = f.read(HEADER_READ_SIZE)
+
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return 0, 0, 0, 0
+
+    sample_rate = channels = bits_per_sample = data_size = 0
+    offset = 12
+    while offset + 8 <= len(header):
+        chunk_id = header[offset : offset + 4]
+        (chunk_size,) = struct.unpack_from("<I", header, offset + 4)
+        if chunk_id == b"fmt " and offset + 24 <= len(header):
+            _, channels, sample_rate, _, _, bits_per_sample = struct.unpack_from(
+                "<HHIIHH", header, offset + 8
+            )
+        elif chunk_id == b"data":
+            data_size = chunk_size
+            break
+        offset += 8 + chunk_size + (chunk_size & 1)
+
+    return sample_rate, channels, bits_per_sample, data_size
+
+
+def clip_names(labels: pd.DataFrame, name_columns) -> pd.Series:
+    # vectorized "_".join of the name columns, same as joining each row's values
+    parts = [labels[column].astype("string") for column in name_columns]
+    names = parts[0].str.cat(parts[1:], sep="_")
+
+    # rows with missing parts skip them, as the row-wise join did
+    missing = names.isna()
+    if missing.any():
+        names[missing] = labels.loc[missing, name_columns].apply(
+            lambda x: "_".join(x.dropna().astype(str)), axis=1
+        )
+    return names.astype(object)
+
+
+def empty_clip_mask(manifest: pd.DataFrame) -> np.ndarray:
+    return (manifest["Size"] <= EMPTY_CLIP_SIZE).to_numpy()
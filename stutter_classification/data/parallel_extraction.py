@@ -0,0 +1,119 @@
+import os
+import shutil
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+from tqdm import tqdm
+
+DEFAULT_CHUNK_SIZE = 64
+CHECKPOINT_GLOB = "chunk-*.npz"
+
+
+def extract_features_parallel(
+    file_paths,
+    extract_fn,
+    out: np.ndarray,
+    n_workers: int = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    checkpoint_dir: Path = None,
+    out_rows=None,
+) -> np.ndarray:
+    # row out_rows[i] of out, row i by default, receives the features of
+    # file_paths[i]. out is usually a memory map, so finished chunks go
+    # straight to disk and memory stays bounded by the chunks in flight,
+    # however many files there are
+    file_paths = [Path(file_path) for file_path in file_paths]
+    if out_rows is None:
+        out_rows = range(len(file_paths))
+    rows = {
+        file_path.stem: (i, out_row)
+        for i, (file_path, out_row) in enumerate(zip(file_paths, out_rows))
+    }
+    done = np.zeros(len(file_paths), dtype=bool)
+
+    def write(names, chunk_features):
+        for name, features in zip(names, chunk_features):
+            row = rows.get(name)
+            if row is not None:
+                i, out_row = row
+                out[out_row] = features
+                done[i] = True
+
+    if checkpoint_dir:
+        for names, chunk_features in iter_checkpoints(checkpoint_dir):
+            write(names, chunk_features)
+
+    pending = [
+        file_path for file_path, row_done in zip(file_paths, done) if not row_done
+    ]
+    chunks = [pending[i : i + chunk_size] for i in range(0, len(pending), chunk_size)]
+
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+
+    with tqdm(total=len(file_paths), initial=len(file_paths) - len(pending)) as bar:
+
+        def collect(names, chunk_features):
+            if checkpoint_dir:
+                save_checkpoint(checkpoint_dir, names, chunk_features)
+            write(names, chunk_features)
+            bar.update(len(names))
+
+        if n_workers <= 1 or len(chunks) <= 1:
+            # serial path, run in this process
+            for chunk in chunks:
+                collect(*_extract_chunk(extract_fn, chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                # only a few chunks per worker are submitted at once, so
+                # finished results never pile up waiting to be collected
+                chunk_iter = iter(chunks)
+                in_flight = set()
+                while True:
+                    while len(in_flight) < n_workers * 2:
+                        chunk = next(chunk_iter, None)
+                        if chunk is None:
+                            break
+                        in_flight.add(
+                            executor.submit(_extract_chunk, extract_fn, chunk)
+                        )
+                    if not in_flight:
+                        break
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        collect(*future.result())
+
+    return out
+
+
+def _extract_chunk(extract_fn, file_paths):
+    names = [file_path.stem for file_path in file_paths]
+    chunk_features = [extract_fn(file_path) for file_path in file_paths]
+    return names, chunk_features
+
+
+def save_checkpoint(checkpoint_dir: Path, names, chunk_features):
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    checkpoint_path = Path(checkpoint_dir) / f"chunk-{uuid.uuid4().hex}.npz"
+
+    # write to a temporary file first so a killed run never leaves a partial chunk
+    tmp_path = checkpoint_path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(f, names=np.array(names), features=np.stack(chunk_features))
+    os.replace(tmp_path, checkpoint_path)
+
+
+def iter_checkpoints(checkpoint_dir: Path):
+    # one chunk at a time, a resumed run never loads every checkpoint at once
+    if not os.path.isdir(checkpoint_dir):
+        return
+
+    for checkpoint_path in sorted(Path(checkpoint_dir).glob(CHECKPOINT_GLOB)):
+        with np.load(checkpoint_path) as checkpoint:
+            yield checkpoint["names"].tolist(), checkpoint["features"]
+
+
+def clear_checkpoints(checkpoint_dir: Path):
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
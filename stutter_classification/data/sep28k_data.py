@@ -1,10 +1,35 @@
 import os
 from pathlib import Path
-import pandas as pd
-from tqdm import tqdm
+from typing import NamedTuple
 
-from stutter_classification.data.feature_extraction import extract_mfccs_from_file
+import numpy as np
+import pandas as pd
 
+from stutter_classification.audio.decode import decode_params
+from stutter_classification.data.feature_extraction import (
+    DEFAULT_FEATURE_GROUPS,
+    FEATURE_GROUPS,
+    FeaturePipeline,
+    column_slice,
+    feature_columns,
+)
+from stutter_classification.data.feature_store import FeatureStore
+from stutter_classification.data.fingerprint import (
+    dataset_fingerprint,
+    fingerprint_digest,
+    library_versions,
+)
+from stutter_classification.data.manifest import (
+    SIGNATURE_COLUMNS,
+    clip_names,
+    empty_clip_mask,
+    scan_clips,
+)
+from stutter_classification.data.parallel_extraction import (
+    DEFAULT_CHUNK_SIZE,
+    clear_checkpoints,
+    extract_features_parallel,
+)
 
 FILE_DIR = Path(__file__).resolve().parent
 DATA_DIR = FILE_DIR.parent.parent / "data"
@@ -13,76 +38,272 @@ MFCC_PREFIX = "sep28k-mfcc"
 
 LABELS_PATH = DATA_DIR / "SEP-28k_labels.csv"
 CLIPS_DIR = DATA_DIR / "clips/"
+CHECKPOINTS_DIR = DATA_DIR / "checkpoints"
+
+# manifest columns kept alongside the labels
+MANIFEST_JOIN_COLUMNS = ["Name", "Path", "SampleRate", "Duration"]
+
+
+# every n_mfccs is a prefix of the full DCT, so only this many are ever extracted
+MAX_N_MFCCS = 40
+
+# every feature group is stored, models select the groups they use
+STORE_PIPELINE = FeaturePipeline(MAX_N_MFCCS, tuple(FEATURE_GROUPS))
+
+FEATURE_STORE_DIR = DATA_DIR / f"{MFCC_PREFIX}-store"
+# a rebuilt store is written next to the current one, with this suffix
+BUILD_SUFFIX = "-build"
+# rows copied at once from the current store into a rebuilt one
+COPY_BLOCK_ROWS = 4096
+
+# loaded feature store, kept in memory once loaded
+_sep28k_features = None
+# clips and labels on disk, scanned once per process
+_sep28k_dataset = None
+
+
+class Sep28kDataset(NamedTuple):
+    scan: pd.DataFrame | None  # every clip found on disk
+    clips: pd.DataFrame | None  # labels joined with the clips, one per store row
+    fingerprint: dict | None
+
+
+def get_extraction_params():
+    # anything that changes the extracted features must be recorded here
+    return {
+        "features": STORE_PIPELINE.params(),
+        "decode": decode_params(),
+        "libraries": library_versions(),
+    }
+
+
+def get_sep28k_features(
+    n_mfccs=13,
+    feature_groups=DEFAULT_FEATURE_GROUPS,
+    n_workers=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+):
+    # returns the label table and a read-only view of the selected feature
+    # groups, the MFCC mean alone stays memory-mapped
+    labels, features, columns = get_sep28k_store(
+        n_mfccs, feature_groups, n_workers=n_workers, chunk_size=chunk_size
+    )
+    return labels, features[:, columns]
+
+
+def get_sep28k_store(
+    n_mfccs=13,
+    feature_groups=DEFAULT_FEATURE_GROUPS,
+    n_workers=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+):
+    # returns the label table, the whole memory-mapped feature matrix and the
+    # columns of the selected groups, a slice when they are contiguous. for
+    # readers that only ever touch a batch of rows at a time
+    if not 1 <= n_mfccs <= MAX_N_MFCCS:
+        raise ValueError(f"n_mfccs must be between 1 and {MAX_N_MFCCS}")
+    unknown = set(feature_groups) - set(FEATURE_GROUPS)
+    if unknown or not feature_groups:
+        raise ValueError(f"feature groups must be some of {list(FEATURE_GROUPS)}")
+
+    labels, features = _load_sep28k_features(n_workers=n_workers, chunk_size=chunk_size)
+    columns = feature_columns(STORE_PIPELINE.layout, n_mfccs, feature_groups)
+    return labels, features, column_slice(columns)
+
+
+def get_sep28k_mfcc_df(n_mfccs=13, n_workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    labels, features = get_sep28k_features(
+        n_mfccs=n_mfccs, n_workers=n_workers, chunk_size=chunk_size
+    )
+    features_df = pd.DataFrame(features, columns=[str(i) for i in range(n_mfccs)])
+    return pd.concat([labels, features_df], axis=1)
+
+
+def get_dataset_fingerprint() -> str | None:
+    # digest of the labels, clips and extraction parameters the current
+    # feature store was built from, None without a store. read from the store
+    # meta so loading a model never scans the corpus, a corpus changed since
+    # the store was built is noticed when the store is next loaded and rebuilt
+    meta = FeatureStore(FEATURE_STORE_DIR).read_meta()
+    fingerprint = meta.get("fingerprint") if meta is not None else None
+    return fingerprint_digest(fingerprint) if fingerprint is not None else None
 
 
-def get_sep28k_mfcc_df(n_mfccs=13):
-    mfcc_path = DATA_DIR / f"{MFCC_PREFIX}-{n_mfccs}.csv"
+def get_sep28k_dataset() -> Sep28kDataset:
+    # rescanned once per process, clips unchanged since the store was built
+    # are only stat'ed
+    global _sep28k_dataset
+    if _sep28k_dataset is not None:
+        return _sep28k_dataset
 
-    if os.path.exists(mfcc_path):
-        return pd.read_csv(mfcc_path)
+    params = get_extraction_params()
+    store = FeatureStore(FEATURE_STORE_DIR)
+    if not os.path.exists(LABELS_PATH):
+        # no corpus here, a store copied from elsewhere is used as it was built
+        meta = store.read_meta() if store.is_valid(params) else None
+        fingerprint = meta["fingerprint"] if meta is not None else None
+        _sep28k_dataset = Sep28kDataset(None, None, fingerprint)
+        return _sep28k_dataset
 
-    mfcc_df = _get_sep28k_mfcc_df(n_mfccs=n_mfccs)
-    mfcc_df.to_csv(mfcc_path, index=False)
+    scan = scan_clips(CLIPS_DIR, previous=store.read_manifest())
+    clips = _select_sep28k_clips(get_sep28k_manifest(scan))
+    fingerprint = dataset_fingerprint(
+        clips.drop(columns=["Path", *SIGNATURE_COLUMNS]),
+        clips[["Name", *SIGNATURE_COLUMNS]],
+        params,
+    )
+    _sep28k_dataset = Sep28kDataset(scan, clips, fingerprint)
+    return _sep28k_dataset
+
+
+def _load_sep28k_features(n_workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    global _sep28k_features
+    if _sep28k_features is not None:
+        return _sep28k_features
+
+    params = get_extraction_params()
+    store = FeatureStore(FEATURE_STORE_DIR)
+    dataset = get_sep28k_dataset()
+
+    if not store.is_valid(params) or (
+        dataset.clips is not None
+        and store.read_meta()["fingerprint"] != dataset.fingerprint
+    ):
+        _build_sep28k_store(
+            store,
+            params,
+            dataset,
+            STORE_PIPELINE,
+            n_workers=n_workers,
+            chunk_size=chunk_size,
+        )
+
+    _sep28k_features = store.load()
+    return _sep28k_features
 
-    return mfcc_df
 
+def _build_sep28k_store(
+    store,
+    params,
+    dataset,
+    pipeline,
+    n_workers=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+):
+    # features of clips unchanged since the current store was built are
+    # copied from it, only added and changed clips are extracted. the new
+    # store is built next to the current one and moved into place when done
+    if dataset.clips is None:
+        raise FileNotFoundError(f"{LABELS_PATH} is needed to build the feature store")
+    clips = dataset.clips
+
+    rows, n_removed = _reusable_rows(store, params, clips)
+    reused = rows >= 0
+    pending = np.flatnonzero(~reused)
+    meta = store.read_meta()
+    if meta is not None and not store.is_valid(params):
+        print("Feature store was built with different parameters, rebuilding")
+    elif meta is not None:
+        print(
+            f"Feature store is out of date, {reused.sum()} clips unchanged, "
+            f"{len(pending)} added or changed, {n_removed} removed"
+        )
+
+    # checkpoints are only reusable for the same clips and parameters
+    checkpoint_dir = (
+        CHECKPOINTS_DIR / f"{MFCC_PREFIX}-{fingerprint_digest(dataset.fingerprint)}"
+    )
+    build = FeatureStore(store.path.with_name(store.path.name + BUILD_SUFFIX))
+
+    # rows are written straight into the store in label order, n_workers=1
+    # runs serially
+    features = build.open_features(len(clips), pipeline.n_features)
+    if reused.any():
+        _, previous = store.load()
+        _copy_rows(previous, rows[reused], features, np.flatnonzero(reused))
+        del previous
+    if len(pending):
+        extract_features_parallel(
+            clips.Path.iloc[pending],
+            pipeline.extract_file,
+            features,
+            n_workers=n_workers,
+            chunk_size=chunk_size,
+            checkpoint_dir=checkpoint_dir,
+            out_rows=pending,
+        )
+
+    build.commit(
+        clips.drop(columns=["Path", *SIGNATURE_COLUMNS]),
+        features,
+        params,
+        fingerprint=dataset.fingerprint,
+        manifest=dataset.scan,
+    )
+    del features
+    store.replace(build)
 
-def _get_sep28k_mfcc_df(n_mfccs=13):
-    sep28k_df, ignore_list = _get_sep28k_df()
+    # extraction is complete, checkpoints are no longer needed
+    clear_checkpoints(checkpoint_dir)
 
-    # MFCC feature extraction
-    features = {}
 
-    for file_path in tqdm(file_paths_list(CLIPS_DIR)):
-        filetitle = file_path.stem
-        filename = file_path.name
-        if "FluencyBank" not in filename and ignore_list.count(filename) == 0:
-            mfccs = extract_mfccs_from_file(file_path, n_mfccs=n_mfccs)
-            features[filetitle] = mfccs
+def _copy_rows(source, source_rows, out, out_rows):
+    # out[out_rows] = source[source_rows] a block at a time, so memory stays
+    # bounded however many rows are copied between memory maps
+    for start in range(0, len(out_rows), COPY_BLOCK_ROWS):
+        block = slice(start, start + COPY_BLOCK_ROWS)
+        out[out_rows[block]] = source[source_rows[block]]
 
-    # making dataset from features
-    df_features = pd.DataFrame.from_dict(features)
-    df_features = df_features.transpose()
-    df_features = df_features.reset_index()
-    df_features = df_features.sort_values(by="index")
 
-    # applying inner join on the dataframes
-    df_features.rename(columns={"index": "Name"}, inplace=True)
-    df_final = pd.merge(sep28k_df, df_features, how="inner", on="Name")
+def _reusable_rows(store, params, clips) -> tuple[np.ndarray, int]:
+    # row of every clip in the current store, -1 where the clip is new or its
+    # size or modification time changed, plus the number of clips removed
+    manifest = store.read_manifest()
+    if not store.is_valid(params) or manifest is None:
+        return np.full(len(clips), -1), 0
+
+    labels, _ = store.load()
+    stored_rows = dict(zip(labels.Name, range(len(labels))))
+    rows = clips.Name.map(stored_rows).fillna(-1).to_numpy(dtype=np.int64)
+
+    stored = manifest.set_index("Name")[SIGNATURE_COLUMNS].reindex(clips.Name)
+    unchanged = (stored.to_numpy() == clips[SIGNATURE_COLUMNS].to_numpy()).all(axis=1)
+    n_removed = len(set(labels.Name) - set(clips.Name))
+    return np.where(unchanged, rows, -1), n_removed
+
+
+def get_sep28k_manifest(scan=None):
+    if scan is None:
+        scan = scan_clips(CLIPS_DIR)
+    return scan[~scan.Name.str.contains("FluencyBank")]
+
+
+def _select_sep28k_clips(manifest):
+    # the labelled clips used for training, one row per store row
+    sep28k_df = _get_sep28k_df(manifest)
+
+    # inner join of the labels with the clips on disk
+    columns = MANIFEST_JOIN_COLUMNS + SIGNATURE_COLUMNS
+    clips = manifest.loc[~empty_clip_mask(manifest), columns]
+    df_final = pd.merge(sep28k_df, clips, how="inner", on="Name")
 
     # removing values
     df_final = df_final[df_final.PoorAudioQuality == 0]
     df_final = df_final[df_final.DifficultToUnderstand == 0]
     df_final = df_final[df_final.Music == 0]
     df_final = df_final[df_final.NoSpeech == 0]
-
-    return df_final
+    return df_final.reset_index(drop=True)
 
 
-def _get_sep28k_df():
+def _get_sep28k_df(manifest):
     # load labels
     df = pd.read_csv(LABELS_PATH)
 
     # add name column
-    df["Name"] = df[df.columns[0:3]].apply(
-        lambda x: "_".join(x.dropna().astype(str)), axis=1
-    )
-
-    # put empty filenames in a list and ignore while feature extracting/training
-    ignore_list = []
-    for file_path in file_paths_list(CLIPS_DIR):
-        filename = file_path.name
-        if "FluencyBank" not in filename:
-            if os.stat(file_path).st_size == 44:
-                ignore_list.append(filename)
-                filename = filename[:-4]
-                df = df[df.Name != filename]
-
-    return df, ignore_list
+    df["Name"] = clip_names(df, df.columns[0:3])
 
+    # ignore empty clips while feature extracting/training
+    empty_names = set(manifest.Name[empty_clip_mask(manifest)])
+    df = df[~df.Name.isin(empty_names)]
 
-def file_paths_list(directory):
-    file_paths = [
-        Path(root) / file for root, _, files in os.walk(directory) for file in files
-    ]
-    return file_paths
+    return df
@@ -0,0 +1,83 @@
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+DEFAULT_BATCH_SIZE = 4096  # rows read from the feature store per batch
+
+
+class StreamingDataset:
+    # fixed-size batches of features and targets read from a (memory-mapped)
+    # feature matrix. only the selected rows and columns of one batch are ever
+    # copied into memory, so memory use does not grow with the corpus
+
+    def __init__(
+        self,
+        features: np.ndarray,
+        rows: np.ndarray,
+        targets: np.ndarray,
+        columns: np.ndarray | slice = slice(None),
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        shuffle: bool = False,
+        random_state: int = None,
+    ):
+        if len(rows) != len(targets):
+            raise ValueError("rows and targets must have the same length")
+
+        self.features = features
+        self.rows = np.asarray(rows)
+        self.targets = np.asarray(targets)
+        self.columns = columns
+        self.n_features = len(np.arange(features.shape[1])[columns])
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(random_state)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def n_batches(self) -> int:
+        return -(-len(self.rows) // self.batch_size)
+
+    def __iter__(self):
+        # yields (X, y), X is a contiguous float32 array of at most batch_size
+        # rows. shuffling permutes the order of the batches and the rows in
+        # each of them, every batch is still read from one region of the store
+        order = np.arange(len(self.rows))
+        starts = np.arange(0, len(order), self.batch_size)
+        if self.shuffle:
+            self.rng.shuffle(starts)
+
+        for start in starts:
+            batch = order[start : start + self.batch_size]
+            if self.shuffle:
+                batch = self.rng.permutation(batch)
+            yield self.read(batch)
+
+    def read(self, positions: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # rows are read in store order, then put back in the requested order
+        rows = self.rows[positions]
+        sort = np.argsort(rows, kind="stable")
+        X = np.empty((len(rows), self.n_features), dtype=np.float32)
+        X[sort] = self.features[rows[sort]][:, self.columns]
+        return X, self.targets[positions]
+
+    def subset(self, positions: np.ndarray, **kwargs) -> "StreamingDataset":
+        params = {
+            "columns": self.columns,
+            "batch_size": self.batch_size,
+            "shuffle": self.shuffle,
+            **kwargs,
+        }
+        return StreamingDataset(
+            self.features, self.rows[positions], self.targets[positions], **params
+        )
+
+    def split(self, test_size: float, random_state: int = None):
+        # the same split train_test_split makes of the in-memory arrays
+        train, test = train_test_split(
+            np.arange(len(self.rows)), test_size=test_size, random_state=random_state
+        )
+        return (
+            self.subset(train, random_state=random_state),
+            self.subset(test, shuffle=False),
+        )
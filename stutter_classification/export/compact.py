@@ -0,0 +1,354 @@
+import json
+import math
+import struct
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import numpy as np
+
+# only numpy is imported here, a device running exported models needs nothing
+# else. every predictor repeats sklearn's arithmetic in the same order, so its
+# predictions are the same as the estimator it was exported from
+
+COMPACT_FORMAT_VERSION = 1
+COMPACT_MAGIC = b"STUTTERCM"
+COMPACT_SUFFIX = ".compact"
+ARRAY_ALIGNMENT = 64  # bytes, every array starts at a multiple of this
+
+SVC_CHUNK_BYTES = 2**24  # bounds the kernel evaluation's intermediates
+
+
+def aligned(offset: int) -> int:
+    return -(-offset // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+
+
+class CompactEstimator(ABC):
+    # arrays are saved as arrays, params as json
+    KIND: str
+    ARRAYS: tuple[str, ...] = ()
+    PARAMS: tuple[str, ...] = ()
+
+    def __init__(self, **kwargs):
+        for name in self.ARRAYS + self.PARAMS:
+            setattr(self, name, kwargs[name])
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    def params(self) -> dict:
+        return {
+            "kind": self.KIND,
+            **{name: getattr(self, name) for name in self.PARAMS},
+        }
+
+    @abstractmethod
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        pass
+
+
+class TreeEnsemble(CompactEstimator):
+    # every tree's nodes in flat arrays, leaves point back to themselves so all
+    # trees are walked together for `depth` steps. thresholds are float32,
+    # rounded down so `x <= threshold` agrees with sklearn's float64 compare
+    # for every float32 feature value
+    KIND = "trees"
+    ARRAYS = ("classes", "roots", "feature", "threshold", "children", "values")
+    PARAMS = ("depth", "combine", "learning_rate", "init")
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        # (n, trees) leaf of every tree for every row
+        nodes = np.repeat(self.roots[None, :], len(X), axis=0)
+        rows = np.arange(len(X))[:, None]
+        for _ in range(self.depth):
+            right = X[rows, self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.children[nodes, right.view(np.uint8)]
+        return nodes
+
+    def predict(self, X):
+        values = self.values[self.apply(X)].astype(np.float64)
+        if self.combine == "mean":
+            # forests sum the trees in order and divide, a single tree is the
+            # same with one tree
+            proba = np.add.accumulate(values, axis=1)[:, -1] / len(self.roots)
+            return self.classes[np.argmax(proba, axis=1)]
+
+        # gradient boosting, stages of one tree per column added to the prior
+        n_columns = len(self.init)
+        steps = self.learning_rate * values.reshape(len(X), -1, n_columns)
+        init = np.broadcast_to(np.asarray(self.init), (len(X), 1, n_columns))
+        raw = np.add.accumulate(np.concatenate((init, steps), axis=1), axis=1)[:, -1]
+        if n_columns == 1:
+            return self.classes[(raw[:, 0] >= 0).astype(int)]
+        return self.classes[np.argmax(raw, axis=1)]
+
+
+class GaussianNBPredictor(CompactEstimator):
+    KIND = "gaussian_nb"
+    ARRAYS = ("classes", "theta", "var", "class_prior")
+
+    def predict(self, X):
+        joint_log_likelihood = []
+        for i in range(len(self.classes)):
+            jointi = np.log(self.class_prior[i])
+            n_ij = -0.5 * np.sum(np.log(2.0 * np.pi * self.var[i, :]))
+            n_ij = n_ij - 0.5 * np.sum(
+                ((X - self.theta[i, :]) ** 2) / (self.var[i, :]), axis=1
+            )
+            joint_log_likelihood.append(jointi + n_ij)
+        return self.classes[np.argmax(np.stack(joint_log_likelihood).T, axis=1)]
+
+
+def relu(x):
+    np.maximum(x, 0, out=x)
+
+
+def tanh(x):
+    np.tanh(x, out=x)
+
+
+def logistic(x):
+    # sklearn uses scipy's expit, which can differ in the last bit
+    np.exp(-x, out=x)
+    x += 1
+    np.reciprocal(x, out=x)
+
+
+HIDDEN_ACTIVATIONS = {
+    "identity": lambda x: None,
+    "relu": relu,
+    "tanh": tanh,
+    "logistic": logistic,
+}
+
+
+class MLPPredictor(CompactEstimator):
+    # binary networks are decided by comparing the output unit against the
+    # smallest value whose logistic is above 0.5, found when exporting
+    KIND = "mlp"
+    ARRAYS = ("classes", "coefs", "intercepts")
+    PARAMS = ("activation", "output", "threshold")
+
+    def __init__(self, **kwargs):
+        # layers are saved as numbered arrays
+        if "coefs" not in kwargs:
+            n_layers = sum(name.startswith("coef_") for name in kwargs)
+            kwargs["coefs"] = [kwargs.pop(f"coef_{i}") for i in range(n_layers)]
+            kwargs["intercepts"] = [
+                kwargs.pop(f"intercept_{i}") for i in range(n_layers)
+            ]
+        super().__init__(**kwargs)
+
+    def arrays(self):
+        arrays = {"classes": self.classes}
+        for i, (coef, intercept) in enumerate(zip(self.coefs, self.intercepts)):
+            arrays[f"coef_{i}"] = coef
+            arrays[f"intercept_{i}"] = intercept
+        return arrays
+
+    def predict(self, X):
+        activation = X
+        hidden_activation = HIDDEN_ACTIVATIONS[self.activation]
+        for i, (coef, intercept) in enumerate(zip(self.coefs, self.intercepts)):
+            activation = activation @ coef
+            activation += intercept
+            if i != len(self.coefs) - 1:
+                hidden_activation(activation)
+
+        if self.output == "logistic":
+            return self.classes[(activation[:, 0] >= self.threshold).astype(int)]
+        tmp = activation - activation.max(axis=1)[:, np.newaxis]
+        np.exp(tmp, out=activation)
+        activation /= activation.sum(axis=1)[:, np.newaxis]
+        return self.classes[np.argmax(activation, axis=1)]
+
+
+class SVCPredictor(CompactEstimator):
+    # libsvm's one-vs-one vote. kernels and sums are accumulated in libsvm's
+    # order, only exp and pow can round differently
+    KIND = "svc"
+    ARRAYS = ("classes", "support_vectors", "n_support", "dual_coef", "intercept")
+    PARAMS = ("kernel", "gamma", "coef0", "degree")
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # one row of coefficients per class pair over every support vector,
+        # zero for the other classes, which leaves libsvm's sums unchanged
+        n_classes = len(self.classes)
+        starts = np.concatenate(([0], np.cumsum(self.n_support)))
+        pairs = [(i, j) for i in range(n_classes) for j in range(i + 1, n_classes)]
+        self.pair_coef = np.zeros((len(pairs), len(self.support_vectors)))
+        # a positive decision is a vote for i, otherwise for j
+        self.positive_votes = np.zeros((len(pairs), n_classes), dtype=np.int64)
+        self.negative_votes = np.zeros((len(pairs), n_classes), dtype=np.int64)
+        for pair, (i, j) in enumerate(pairs):
+            si = slice(starts[i], starts[i + 1])
+            sj = slice(starts[j], starts[j + 1])
+            self.pair_coef[pair, si] = self.dual_coef[j - 1, si]
+            self.pair_coef[pair, sj] = self.dual_coef[i, sj]
+            self.positive_votes[pair, i] = 1
+            self.negative_votes[pair, j] = 1
+
+        # rows per chunk, so no intermediate exceeds SVC_CHUNK_BYTES
+        width = len(self.support_vectors) * max(
+            len(pairs), self.support_vectors.shape[1]
+        )
+        self.chunk_rows = max(1, SVC_CHUNK_BYTES // (8 * width))
+
+    def kernel_values(self, X: np.ndarray) -> np.ndarray:
+        X = X.astype(np.float64)[:, None, :]
+        if self.kernel == "rbf":
+            d = X - self.support_vectors
+            return np.exp(-self.gamma * np.add.accumulate(d * d, axis=2)[:, :, -1])
+
+        dot = np.add.accumulate(X * self.support_vectors, axis=2)[:, :, -1]
+        if self.kernel == "linear":
+            return dot
+        if self.kernel == "poly":
+            return (self.gamma * dot + self.coef0) ** self.degree
+        return np.tanh(self.gamma * dot + self.coef0)
+
+    def predict(self, X):
+        votes = np.zeros((len(X), len(self.classes)), dtype=np.int64)
+        for offset in range(0, len(X), self.chunk_rows):
+            kernel = self.kernel_values(X[offset : offset + self.chunk_rows])
+            terms = kernel[:, None, :] * self.pair_coef
+            decision = np.add.accumulate(terms, axis=2)[:, :, -1] + self.intercept
+            positive = (decision > 0).astype(np.int64)
+            votes[offset : offset + self.chunk_rows] = (
+                positive @ self.positive_votes + (1 - positive) @ self.negative_votes
+            )
+        return self.classes[np.argmax(votes, axis=1)]
+
+
+PREDICTOR_TYPES = {
+    predictor.KIND: predictor
+    for predictor in (TreeEnsemble, GaussianNBPredictor, MLPPredictor, SVCPredictor)
+}
+
+
+class CompactModel:
+    # an exported StutterModel, one predictor per output. takes the same
+    # feature vectors as the model, from a FeaturePipeline with the stored
+    # n_mfccs and feature groups
+
+    def __init__(self, meta: dict, estimators: list[CompactEstimator]):
+        self.meta = meta
+        self.estimators = estimators
+        self.n_mfccs = meta["n_mfccs"]
+        self.feature_groups = tuple(meta["feature_groups"])
+        self.n_features = meta["n_features"]
+        # a single label model names the label it detects
+        if meta.get("target_column") is not None:
+            self.target_column = meta["target_column"]
+
+        self.feature_buffer = np.zeros((1, self.n_features), dtype=np.float32)
+
+    def predict_batch(self, features: np.ndarray) -> np.ndarray:
+        features = np.ascontiguousarray(features, dtype=np.float32)
+        if features.ndim != 2 or features.shape[1] != self.n_features:
+            raise ValueError(f"expected features of shape (n, {self.n_features})")
+        if not np.isfinite(features).all():
+            raise ValueError("features contain NaN or infinity")
+
+        predictions = [estimator.predict(features) for estimator in self.estimators]
+        if self.meta["labels"] is not None:
+            return np.column_stack(predictions)
+        return predictions[0]
+
+    def predict_array(self, features: np.ndarray) -> np.ndarray:
+        # one window of features
+        self.feature_buffer[0] = features
+        return self.predict_batch(self.feature_buffer)
+
+    def prediction_label(self, prediction) -> str:
+        if self.meta["labels"] is None:
+            return str(prediction)
+        present = [
+            label for label, flag in zip(self.meta["labels"], prediction) if flag
+        ]
+        return "+".join(present) if present else self.meta["empty_label"]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            array.nbytes
+            for estimator in self.estimators
+            for array in estimator.arrays().values()
+        )
+
+    def save(self, path) -> Path:
+        # a json header followed by every array, aligned so they can be
+        # memory-mapped in place
+        index, offset = [], 0
+        arrays = []
+        for i, estimator in enumerate(self.estimators):
+            for name, array in estimator.arrays().items():
+                array = np.ascontiguousarray(array)
+                offset = aligned(offset)
+                index.append(
+                    {
+                        "name": f"{i}/{name}",
+                        "dtype": array.dtype.str,
+                        "shape": array.shape,
+                        "offset": offset,
+                    }
+                )
+                arrays.append(array)
+                offset += array.nbytes
+
+        meta = {
+            **self.meta,
+            "estimators": [estimator.params() for estimator in self.estimators],
+        }
+        header = json.dumps({"meta": meta, "arrays": index}).encode()
+        data_start = aligned(len(COMPACT_MAGIC) + 8 + len(header))
+
+        path = Path(path)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(COMPACT_MAGIC + struct.pack("<Q", len(header)) + header)
+            for entry, array in zip(index, arrays):
+                f.seek(data_start + entry["offset"])
+                f.write(array.tobytes())
+        tmp_path.replace(path)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap: bool = True) -> "CompactModel":
+        # arrays are read-only views of the file, pages are only read when a
+        # prediction touches them and are shared between processes
+        with open(path, "rb") as f:
+            if f.read(len(COMPACT_MAGIC)) != COMPACT_MAGIC:
+                raise ValueError(f"{path} is not a compact model")
+            (header_size,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_size))
+        data_start = aligned(len(COMPACT_MAGIC) + 8 + header_size)
+
+        meta = header["meta"]
+        if meta.get("format_version") != COMPACT_FORMAT_VERSION:
+            raise ValueError(f"{path} has an unsupported format version")
+
+        if mmap:
+            data = np.memmap(path, dtype=np.uint8, mode="r")
+        else:
+            data = np.fromfile(path, dtype=np.uint8)
+        arrays = {}
+        for entry in header["arrays"]:
+            dtype = np.dtype(entry["dtype"])
+            start = data_start + entry["offset"]
+            size = dtype.itemsize * math.prod(entry["shape"])
+            array = data[start : start + size].view(dtype).reshape(entry["shape"])
+            arrays[entry["name"]] = np.asarray(array)
+
+        estimators = []
+        for i, params in enumerate(meta.pop("estimators")):
+            params = dict(params)
+            predictor = PREDICTOR_TYPES[params.pop("kind")]
+            prefix = f"{i}/"
+            estimator_arrays = {
+                name[len(prefix) :]: array
+                for name, array in arrays.items()
+                if name.startswith(prefix)
+            }
+            estimators.append(predictor(**params, **estimator_arrays))
+        return cls(meta, estimators)
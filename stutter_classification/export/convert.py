@@ -0,0 +1,294 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy.special import expit
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.multioutput import MultiOutputClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.neural_network import MLPClassifier
+from sklearn.svm import SVC
+from sklearn.tree import DecisionTreeClassifier
+
+from stutter_classification.data.sep28k_data import DATA_DIR
+from stutter_classification.export.compact import (
+    COMPACT_FORMAT_VERSION,
+    COMPACT_SUFFIX,
+    CompactModel,
+    GaussianNBPredictor,
+    MLPPredictor,
+    SVCPredictor,
+    TreeEnsemble,
+)
+from stutter_classification.models.options import (
+    DEFAULT_FEATURE_SET,
+    DEFAULT_N_MFCC,
+    FEATURE_SET_OPTIONS,
+    MODEL_TYPE_OPTIONS,
+    TYPE_LABELS,
+    UNDERLYING_MODEL_OPTIONS,
+    make_model,
+)
+
+COMPACT_MODELS_DIR = DATA_DIR / "compact"
+
+
+def float32_floor(values: np.ndarray) -> np.ndarray:
+    # the largest float32 at or below each value, for a float32 x
+    # `x <= floor` is then the same as `x <= value`
+    rounded = values.astype(np.float32)
+    too_high = rounded.astype(np.float64) > values
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+
+def lossless_float32(values: np.ndarray) -> np.ndarray:
+    # float32 when no value changes, otherwise kept as it is
+    rounded = values.astype(np.float32)
+    if np.array_equal(rounded.astype(values.dtype), values):
+        return rounded
+    return values
+
+
+def index_array(values, n: int) -> np.ndarray:
+    # the smallest unsigned type that holds every index below n
+    return np.asarray(values).astype(np.min_scalar_type(max(n - 1, 0)))
+
+
+def class_array(classes: np.ndarray) -> np.ndarray:
+    # label strings are stored as fixed width strings, so loading needs no pickle
+    if classes.dtype == object:
+        return classes.astype(str)
+    return classes
+
+
+def export_trees(trees, classes, combine, learning_rate=None, init=None):
+    # every sklearn tree appended to one set of node arrays
+    roots, features, thresholds, children, values = [], [], [], [], []
+    n_nodes = 0
+    for tree in trees:
+        tree = tree.tree_
+        nodes = np.arange(tree.node_count)
+        is_leaf = tree.children_left < 0
+        roots.append(n_nodes)
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(tree.threshold)
+        children.append(
+            np.column_stack(
+                (
+                    np.where(is_leaf, nodes, tree.children_left),
+                    np.where(is_leaf, nodes, tree.children_right),
+                )
+            )
+            + n_nodes
+        )
+        values.append(tree.value[:, 0, :])
+        n_nodes += tree.node_count
+
+    return TreeEnsemble(
+        classes=class_array(classes),
+        roots=index_array(roots, n_nodes),
+        feature=index_array(np.concatenate(features), trees[0].n_features_in_),
+        threshold=float32_floor(np.concatenate(thresholds)),
+        children=index_array(np.concatenate(children), n_nodes),
+        values=lossless_float32(np.concatenate(values)),
+        depth=max(tree.tree_.max_depth for tree in trees),
+        combine=combine,
+        learning_rate=learning_rate,
+        init=init,
+    )
+
+
+def export_gradient_boosting(estimator: GradientBoostingClassifier):
+    if (
+        estimator.init_ != "zero"
+        and type(estimator.init_).__name__ != "DummyClassifier"
+    ):
+        raise ValueError("only the default init estimator can be exported")
+    # the prior does not depend on the features
+    init = estimator._raw_predict_init(
+        np.zeros((1, estimator.n_features_in_), dtype=np.float32)
+    )[0]
+    return export_trees(
+        list(estimator.estimators_.ravel()),
+        estimator.classes_,
+        "boosting",
+        learning_rate=float(estimator.learning_rate),
+        init=[float(value) for value in init],
+    )
+
+
+def logistic_threshold(dtype) -> float:
+    # smallest output with expit above 0.5, found by bisecting the bit
+    # patterns of the positive floats, which sort like integers
+    int_type = np.int32 if dtype == np.float32 else np.int64
+    low = np.array(0, dtype=dtype).view(int_type)
+    high = np.array(1, dtype=dtype).view(int_type)
+    while high - low > 1:
+        middle = (low + high) // 2
+        if expit(np.array(middle, dtype=int_type).view(dtype)) > 0.5:
+            high = middle
+        else:
+            low = middle
+    return float(np.array(high, dtype=int_type).view(dtype))
+
+
+def export_mlp(estimator: MLPClassifier):
+    output = estimator.out_activation_
+    if output not in ("logistic", "softmax"):
+        raise ValueError(f"output activation {output} cannot be exported")
+    return MLPPredictor(
+        classes=class_array(estimator.classes_),
+        coefs=list(estimator.coefs_),
+        intercepts=list(estimator.intercepts_),
+        activation=estimator.activation,
+        output=output,
+        threshold=(
+            logistic_threshold(estimator.coefs_[-1].dtype)
+            if output == "logistic"
+            else None
+        ),
+    )
+
+
+def export_svc(estimator: SVC):
+    if estimator.kernel not in ("linear", "poly", "rbf", "sigmoid"):
+        raise ValueError(f"kernel {estimator.kernel!r} cannot be exported")
+    if estimator.break_ties and len(estimator.classes_) > 2:
+        raise ValueError("break_ties cannot be exported")
+    return SVCPredictor(
+        classes=class_array(estimator.classes_),
+        support_vectors=estimator.support_vectors_,
+        n_support=estimator._n_support.astype(np.int64),
+        dual_coef=estimator._dual_coef_,
+        intercept=estimator._intercept_,
+        kernel=estimator.kernel,
+        gamma=float(estimator._gamma),
+        coef0=float(estimator.coef0),
+        degree=int(estimator.degree),
+    )
+
+
+def export_estimator(estimator):
+    if isinstance(estimator, DecisionTreeClassifier):
+        return export_trees([estimator], estimator.classes_, "mean")
+    if isinstance(estimator, RandomForestClassifier):
+        return export_trees(estimator.estimators_, estimator.classes_, "mean")
+    if isinstance(estimator, GradientBoostingClassifier):
+        return export_gradient_boosting(estimator)
+    if isinstance(estimator, GaussianNB):
+        return GaussianNBPredictor(
+            classes=class_array(estimator.classes_),
+            theta=estimator.theta_,
+            var=estimator.var_,
+            class_prior=estimator.class_prior_,
+        )
+    if isinstance(estimator, MLPClassifier):
+        return export_mlp(estimator)
+    if isinstance(estimator, SVC):
+        return export_svc(estimator)
+    raise ValueError(f"{type(estimator).__name__} cannot be exported")
+
+
+def export_model(model) -> CompactModel:
+    # a fitted StutterModel as arrays, with what is needed to label predictions
+    from stutter_classification.models.multi_label import NO_STUTTER_LABEL
+
+    if isinstance(model.model, MultiOutputClassifier):
+        estimators = model.model.estimators_
+        labels = list(model.labels)
+    else:
+        estimators = [model.model]
+        labels = None
+
+    meta = {
+        "format_version": COMPACT_FORMAT_VERSION,
+        "model_type": type(model).__name__,
+        "artifact": model.artifact_path().name,
+        "n_mfccs": model.n_mfccs,
+        "feature_groups": list(model.feature_groups),
+        "n_features": model.n_features,
+        "target_column": getattr(model, "target_column", None),
+        "labels": labels,
+        "empty_label": NO_STUTTER_LABEL,
+        "extraction": model.dataset_params()["extraction"],
+    }
+    return CompactModel(meta, [export_estimator(e) for e in estimators])
+
+
+def check_export(model, compact: CompactModel, X: np.ndarray) -> int:
+    # number of rows predicted differently, 0 for an exact export
+    expected = np.asarray(model.predict_batch(X))
+    actual = compact.predict_batch(X)
+    if expected.ndim == 1:
+        return int(np.sum(expected != actual))
+    return int(np.sum((expected != actual).any(axis=1)))
+
+
+def compact_path(model, directory: Path = COMPACT_MODELS_DIR) -> Path:
+    return Path(directory) / f"{model.artifact_path().stem}{COMPACT_SUFFIX}"
+
+
+def run(args):
+    model = make_model(
+        UNDERLYING_MODEL_OPTIONS[args.underlying_model],
+        MODEL_TYPE_OPTIONS[args.model_type],
+        args.label,
+        args.n_mfccs,
+        feature_groups=FEATURE_SET_OPTIONS[args.features],
+    )
+    test_score = model.load_or_train()
+    print(f"Model loaded, cross-validated score {test_score * 100:.2f}")
+
+    started = time.perf_counter()
+    compact = export_model(model)
+    print(f"Exported in {time.perf_counter() - started:.2f}s")
+
+    # checked on every sample the model was trained on
+    X, _ = model.get_xy()
+    mismatches = check_export(model, compact, X)
+    print(f"{mismatches} of {len(X)} predictions differ from sklearn")
+    if mismatches and not args.force:
+        print("Not saved, use --force to save it anyway")
+        return 1
+
+    path = Path(args.output) if args.output else compact_path(model)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    compact.save(path)
+    print(
+        f"Saved {path} ({path.stat().st_size / 2**10:.1f} KiB, "
+        f"original {model.artifact_path().stat().st_size / 2**10:.1f} KiB)"
+    )
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Export a trained model to a compact NumPy-only format."
+    )
+    parser.add_argument(
+        "--model-type",
+        choices=MODEL_TYPE_OPTIONS,
+        default=list(MODEL_TYPE_OPTIONS)[0],
+    )
+    parser.add_argument(
+        "--underlying-model",
+        choices=UNDERLYING_MODEL_OPTIONS,
+        default=list(UNDERLYING_MODEL_OPTIONS)[0],
+    )
+    parser.add_argument("--label", choices=TYPE_LABELS, default=TYPE_LABELS[0])
+    parser.add_argument("--n-mfccs", type=int, default=DEFAULT_N_MFCC)
+    parser.add_argument(
+        "--features", choices=FEATURE_SET_OPTIONS, default=DEFAULT_FEATURE_SET
+    )
+    parser.add_argument("-o", "--output", help=f"defaults to {COMPACT_MODELS_DIR}/")
+    parser.add_argument(
+        "--force", action="store_true", help="save even if predictions differ"
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
@@ -1,9 +1,11 @@
 import sys
-from functools import partial
+import time
 
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtGui import QFontDatabase
 from PyQt6.QtWidgets import (
     QApplication,
+    QCheckBox,
     QMainWindow,
     QPushButton,
     QVBoxLayout,
@@ -15,20 +17,27 @@ from PyQt6.QtWidgets import (
 )
 from qt_material import apply_stylesheet
 
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
-from sklearn.svm import SVC
-from sklearn.naive_bayes import GaussianNB
-from sklearn.neural_network import MLPClassifier
-
-from stutter_classification.models.base.stutter_model import StutterModel, TYPE_LABELS
-from stutter_classification.models import SingleFeatureModel, AllFeaturesModel
+from stutter_classification.models.options import (
+    DEFAULT_FEATURE_SET,
+    DEFAULT_N_MFCC,
+    FEATURE_SET_OPTIONS,
+    MAX_N_MFCC,
+    MIN_N_MFCC,
+    MODEL_TYPE_OPTIONS,
+    SINGLE_LABEL_MODEL,
+    TYPE_LABELS,
+    UNDERLYING_MODEL_OPTIONS,
+)
+from stutter_classification.audio.transcription import TRANSCRIPTION_BACKENDS
+from stutter_classification.models.smoothing import EVENT_START
+from stutter_classification.telemetry.metrics import format_snapshot
 
 from recorder import Recorder
+from model_loader import ModelLoader
 from utils import make_labeled_combo_box, make_label, make_styled_label
 
 APP_TITLE = "Stutter Detector"
-WINDOW_GEOMETRY = (300, 300, 425, 725)
+WINDOW_GEOMETRY = (300, 300, 425, 775)
 
 BUTTON_START_LABEL = "Start Recording"
 BUTTON_STOP_LABEL = "Stop Recording"
@@ -40,29 +49,19 @@ TRANSCRIPTION_BOX_SIZE = (350, 300)
 
 SEPARATION_SPACER_HEIGHT = 10
 
-MODEL_TYPE_OPTIONS = {
-    "Single Label Model": SingleFeatureModel,
-    "All Labels Model": AllFeaturesModel,
-}
-UNDERLYING_MODEL_OPTIONS = {
-    "DecisionTreeClassifier": partial(DecisionTreeClassifier, criterion="gini"),
-    "RandomForestClassifier": RandomForestClassifier,
-    "GradientBoostingClassifier": GradientBoostingClassifier,
-    "SVC": SVC,
-    "GaussianNB": GaussianNB,
-    "Neural Network": MLPClassifier,
-}
-
-MIN_N_MFCC = 5
-MAX_N_MFCC = 21
-DEFAULT_N_MFCC = 13
-
 N_MFCC_LABEL = "Number of Feature Extraction (MFCC) Vectors: "
 UNDERLYING_MODEL_LABEL = "Underlying Model: "
 MODEL_TYPE_LABEL = "Model Type: "
 FEATURE_TYPE_LABEL = "Label Name: "
+FEATURE_SET_LABEL = "Features: "
+TRANSCRIPTION_LABEL = "Transcription: "
 
-MODEL_SCORE_LABEL_PREFIX = "Model Test Score: "
+MODEL_SCORE_LABEL_PREFIX = "Model CV Score: "
+MODEL_LOADING_LABEL = "Loading model..."
+MODEL_FAILED_LABEL = "Model could not be loaded"
+
+STATS_CHECKBOX_LABEL = "Show Live Stats"
+STATS_REFRESH_MS = 500
 
 
 class SpeechApp(QMainWindow):
@@ -72,6 +71,7 @@ class SpeechApp(QMainWindow):
     underlying_model_type = list(UNDERLYING_MODEL_OPTIONS.values())[0]
     model_type = list(MODEL_TYPE_OPTIONS.values())[0]
     feature_type = TYPE_LABELS[0]
+    feature_groups = FEATURE_SET_OPTIONS[DEFAULT_FEATURE_SET]
 
     def __init__(self):
         super().__init__()
@@ -79,7 +79,17 @@ class SpeechApp(QMainWindow):
         self.recorder = Recorder()
         self.recorder.update_transcription_signal.connect(self.update_transcription)
         self.recorder.update_test_score.connect(self.update_score_label)
-        self.recorder.update_prediction.connect(self.update_prediction)
+        self.recorder.stutter_event.connect(self.stutter_event)
+
+        # stutter labels with an event in progress, the detection label is
+        # shown while any is
+        self.active_stutters = set()
+
+        # models are loaded or trained off the UI thread, the recorder keeps
+        # using its current model until the new one is ready
+        self.model_loader = ModelLoader()
+        self.model_loader.model_ready.connect(self.model_ready)
+        self.model_loader.loading_failed.connect(self.model_failed)
 
         self.initUI()
         self.update_model()
@@ -166,12 +176,49 @@ class SpeechApp(QMainWindow):
         layout.addWidget(self.feature_type_label)
         layout.addWidget(self.feature_type_combo)
 
+        # Feature set labeled combo box, every set is read from the same store
+        self.feature_set_label, self.feature_set_combo = make_labeled_combo_box(
+            FEATURE_SET_LABEL, list(FEATURE_SET_OPTIONS.keys()), self
+        )
+        self.feature_set_combo.currentTextChanged.connect(self.feature_set_changed)
+        layout.addWidget(self.feature_set_label)
+        layout.addWidget(self.feature_set_combo)
+
+        # Transcription backend labeled combo box, offline engines need no network
+        self.transcription_label, self.transcription_combo = make_labeled_combo_box(
+            TRANSCRIPTION_LABEL, list(TRANSCRIPTION_BACKENDS.keys()), self
+        )
+        self.transcription_combo.setCurrentText(
+            self.recorder.transcription_backend_name
+        )
+        self.transcription_combo.currentTextChanged.connect(
+            self.recorder.set_transcription_backend
+        )
+        layout.addWidget(self.transcription_label)
+        layout.addWidget(self.transcription_combo)
+
         # Score labels
         self.score_label = make_styled_label(
             f"{MODEL_SCORE_LABEL_PREFIX}0.0", self, font_size=13
         )
         layout.addWidget(self.score_label)
 
+        # Live stats panel, refreshed from the recorder's metrics while shown
+        self.stats_checkbox = QCheckBox(STATS_CHECKBOX_LABEL, self)
+        self.stats_checkbox.toggled.connect(self.toggle_stats)
+        layout.addWidget(self.stats_checkbox)
+
+        self.stats_label = make_label("", self)
+        self.stats_label.setFont(
+            QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont)
+        )
+        self.stats_label.setVisible(False)
+        layout.addWidget(self.stats_label)
+
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setInterval(STATS_REFRESH_MS)
+        self.stats_timer.timeout.connect(self.update_stats)
+
         self.main_widget.setLayout(layout)
 
         # Window settings
@@ -203,7 +250,7 @@ class SpeechApp(QMainWindow):
     def model_type_changed(self, model_type_str):
         self.model_type = MODEL_TYPE_OPTIONS[model_type_str]
 
-        if self.model_type == SingleFeatureModel:
+        if model_type_str == SINGLE_LABEL_MODEL:
             self.feature_type_label.setVisible(True)
             self.feature_type_combo.setVisible(True)
         else:
@@ -216,30 +263,57 @@ class SpeechApp(QMainWindow):
         self.feature_type = feature_type_str
         self.update_model()
 
+    def feature_set_changed(self, feature_set_str):
+        self.feature_groups = FEATURE_SET_OPTIONS[feature_set_str]
+        self.update_model()
+
     def update_model(self):
         self.n_mfcc_label.setText(f"{N_MFCC_LABEL}{self.n_mfccs}")
-        self.recorder.set_model(
-            self.underlying_model_type, self.model_type, self.feature_type, self.n_mfccs
+        self.score_label.setText(MODEL_LOADING_LABEL)
+        self.model_loader.request(
+            self.underlying_model_type,
+            self.model_type,
+            self.feature_type,
+            self.n_mfccs,
+            self.feature_groups,
         )
 
+    def model_ready(self, model, score, generation):
+        # the configuration may have changed again while the signal was queued
+        if self.model_loader.is_stale(generation):
+            return
+        self.recorder.swap_model(model, score)
+
+    def model_failed(self, error):
+        self.score_label.setText(MODEL_FAILED_LABEL)
+
     def update_score_label(self, score):
         self.score_label.setText(f"{MODEL_SCORE_LABEL_PREFIX}{score * 100:.2f}")
 
-    def update_prediction(self, prediction):
-        if prediction == "1":
-            self.stutter_detected()
-        elif prediction == "0":
-            self.stutter_not_detected()
-        elif prediction != "NoStutteredWords" and prediction != "NaturalPause":
-            self.stutter_detected()
+    def toggle_stats(self, checked):
+        self.stats_label.setVisible(checked)
+        if checked:
+            self.update_stats()
+            self.stats_timer.start()
         else:
-            self.stutter_not_detected()
+            self.stats_timer.stop()
+        self.main_widget.adjustSize()
 
-    def stutter_detected(self):
-        self.stutter_detection_label.setVisible(True)
+    def update_stats(self):
+        self.stats_label.setText(format_snapshot(self.recorder.metrics.snapshot()))
+        self.stats_label.adjustSize()
 
-    def stutter_not_detected(self):
-        self.stutter_detection_label.setVisible(False)
+    def stutter_event(self, event):
+        # time from the record thread emitting to this slot running
+        emitted_at = self.recorder.event_emitted_at
+        if emitted_at is not None:
+            self.recorder.metrics.record("delivery", time.perf_counter() - emitted_at)
+
+        if event.kind == EVENT_START:
+            self.active_stutters.add(event.label)
+        else:
+            self.active_stutters.discard(event.label)
+        self.stutter_detection_label.setVisible(bool(self.active_stutters))
 
 
 if __name__ == "__main__":
@@ -249,5 +323,6 @@ if __name__ == "__main__":
 
     # ensure recording is stopped when closing the app
     app.aboutToQuit.connect(ex.recorder.stop_recording)
+    app.aboutToQuit.connect(ex.model_loader.stop)
     ex.show()
     sys.exit(app.exec())
@@ -0,0 +1,104 @@
+import threading
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from stutter_classification.models.options import make_model
+
+DEBOUNCE_MS = 300
+
+
+class ModelLoader(QObject):
+    # loads or trains models on a background thread, only the newest requested
+    # configuration is ever delivered
+    model_ready = pyqtSignal(object, float, int)
+    loading_started = pyqtSignal()
+    loading_failed = pyqtSignal(str)
+
+    def __init__(self, debounce_ms=DEBOUNCE_MS):
+        super().__init__()
+
+        # each request bumps the generation, older generations are stale
+        self.generation = 0
+        self.requested_config = None
+        self.queued = None
+        self.running = True
+        self.condition = threading.Condition()
+
+        # wait for controls to settle before starting any work
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(debounce_ms)
+        self.debounce_timer.timeout.connect(self._submit)
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def request(
+        self,
+        underlying_model,
+        model_type,
+        feature_name=None,
+        n_mfccs=13,
+        feature_groups=None,
+    ):
+        with self.condition:
+            self.generation += 1
+            self.requested_config = dict(
+                underlying_model=underlying_model,
+                model_type=model_type,
+                feature_name=feature_name,
+                n_mfccs=n_mfccs,
+                feature_groups=feature_groups,
+            )
+        self.debounce_timer.start()
+
+    def _submit(self):
+        with self.condition:
+            self.queued = (self.generation, self.requested_config)
+            self.condition.notify()
+
+    def is_stale(self, generation):
+        return generation != self.generation or not self.running
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.queued or not self.running)
+                if not self.running:
+                    return
+                generation, config = self.queued
+                self.queued = None
+
+            if self.is_stale(generation):
+                continue
+
+            self.loading_started.emit()
+            try:
+                model = make_model(**config)
+                # a newer request stops training as the next fold finishes or
+                # before the final fit, which runs to the end once started
+                test_score = model.load_or_train(
+                    cancelled=lambda: self.is_stale(generation)
+                )
+            except Exception as e:
+                if self.is_stale(generation):
+                    # cancelled, or failed after a newer request arrived
+                    print("Cancelled stale model")
+                    continue
+                print(f"Model could not be loaded: {e}")
+                self.loading_failed.emit(str(e))
+                continue
+
+            # a newer configuration arrived while this one was being trained,
+            # the artifact is saved but the model is not swapped in
+            if self.is_stale(generation):
+                print("Dropped stale model")
+                continue
+
+            self.model_ready.emit(model, test_score, generation)
+
+    def stop(self):
+        self.debounce_timer.stop()
+        with self.condition:
+            self.running = False
+            self.condition.notify()
@@ -1,41 +1,121 @@
-import sounddevice as sd
-import speech_recognition as sr
+import time
+from collections import deque
 from threading import Thread
-from functools import partial
-from sklearn.tree import DecisionTreeClassifier
 
+import numpy as np
 from PyQt6.QtCore import QObject, pyqtSignal
 
-from stutter_classification.models.single_feature import SingleFeatureModel
-from stutter_classification.data.feature_extraction import extract_single_mfcc_feature
+from stutter_classification.models.options import make_model
+from stutter_classification.models.smoothing import (
+    DEFAULT_SMOOTHING,
+    EVENT_END,
+    StutterEventTracker,
+)
+from stutter_classification.audio.decode import Resampler
+from stutter_classification.audio.stream import (
+    CAPTURE_SAMPLE_RATE,
+    DEFAULT_BUFFER_SECONDS,
+    INPUT_HOP,
+    INPUT_WINDOW,
+    SAMPLE_RATE,
+    MicrophoneSource,
+    RingBuffer,
+    SlidingWindowReader,
+)
+from stutter_classification.audio.transcription import (
+    TRANSCRIPTION_BACKENDS,
+    Transcriber,
+    default_backend_name,
+)
+from stutter_classification.audio.vad import VoiceActivityDetector
+from stutter_classification.telemetry.metrics import Metrics
 
-INPUT_WINDOW = 0.5  # seconds
-SAMPLE_RATE = 44100  # Hz
+WINDOW_TIMEOUT = 0.1  # seconds, how often the record loop checks for stop
+
+# recent stutter events, matched against transcripts as they arrive
+DETECTION_HISTORY_SECONDS = 60
+
+# windows without speech are not classified, the model never saw silence in
+# training (NoSpeech clips are dropped) so its predictions there are noise.
+# they count as no stutter, so events end during silence
+VAD_HANGOVER_SECONDS = 0.5
 
 
 class Recorder(QObject):
     update_transcription_signal = pyqtSignal(str)
     update_test_score = pyqtSignal(float)
-    update_prediction = pyqtSignal(str)
+    # a StutterEvent when a stutter starts and when it ends, never per window
+    stutter_event = pyqtSignal(object)
 
-    def __init__(self):
+    def __init__(
+        self,
+        hop=INPUT_HOP,
+        source=None,
+        metrics=None,
+        transcription=None,
+        smoothing=DEFAULT_SMOOTHING,
+    ):
         super().__init__()
         self.recording = False
+        self.hop = hop
 
-        sklearn_model = partial(DecisionTreeClassifier, criterion="gini")
-        self.set_model(sklearn_model, SingleFeatureModel, "Prolongation")
+        # window probabilities are smoothed and merged into stutter events,
+        # the tracker is rebuilt whenever the model changes
+        self.smoothing = smoothing
+        self.events = None
+        self.events_model = None
 
-    def set_model(self, underlying_model, model_type, feature_name=None, n_mfccs=13):
-        model_init = partial(model_type, underlying_model, n_mfccs=n_mfccs)
+        # phrases are cut from the same capture as the classifier windows and
+        # transcribed by the chosen backend, created when recording starts
+        self.transcription_backend_name = transcription or default_backend_name()
+        self.transcription_backend = None
+        self.transcriber = None
+        self.detections = deque(maxlen=int(DETECTION_HISTORY_SECONDS / hop))
 
-        if model_type == SingleFeatureModel and feature_name:
-            self.model = model_init(feature_name)
-        else:
-            self.model = model_init()
+        # skips feature extraction and prediction for windows without speech
+        self.vad = VoiceActivityDetector(SAMPLE_RATE, VAD_HANGOVER_SECONDS)
+
+        # per-stage timings and counters of the detection loop, sent to the
+        # metrics sink if one is configured
+        self.metrics = metrics or Metrics()
+        self.event_emitted_at = None
+
+        # audio source feeding the ring buffer, the microphone unless given.
+        # captured audio is resampled to the rate the models were trained at
+        self.source = source or MicrophoneSource(CAPTURE_SAMPLE_RATE)
+
+        # set through set_model or swap_model, windows are skipped until then
+        self.model = None
+        # windows of the stream share frames, rebuilt when the model changes
+        self.features = None
+
+    def set_model(
+        self,
+        underlying_model,
+        model_type,
+        feature_name=None,
+        n_mfccs=13,
+        feature_groups=None,
+    ):
+        # synchronous, the GUI uses a ModelLoader and swap_model instead
+        model = make_model(
+            underlying_model,
+            model_type,
+            feature_name,
+            n_mfccs,
+            feature_groups=feature_groups,
+        )
+
+        # loads a saved artifact for this configuration, or trains and saves one
+        test_score = model.load_or_train()
+        self.swap_model(model, test_score)
 
-        self.model.train()
-        print("Model updated and trained")
-        self.update_test_score.emit(self.model.score())
+    def swap_model(self, model, test_score):
+        # a single assignment, the record thread keeps using the old model for
+        # the window it is processing and picks up the new one after that
+        self.model = model
+        print("Model updated")
+        self.update_test_score.emit(test_score)
 
     def start_recording(self):
         if self.recording:
@@ -50,12 +130,9 @@ class Recorder(QObject):
             return
         self.recording = False
 
-        # kill recording thread
+        # kill recording thread, transcription stops with it
         self.kill_thread()
 
-        # end transciption
-        self.stop_transcription(wait_for_stop=False)
-
         print("Recording stopped...")
 
     def kill_thread(self):
@@ -66,51 +143,176 @@ class Recorder(QObject):
         self.thread = Thread(target=self._record)
         self.thread.start()
 
-        # run transcription in background
-        self.recorder = sr.Recognizer()
-        self.microphone = sr.Microphone()
-        with self.microphone as source:
-            self.recorder.adjust_for_ambient_noise(source)
+    def set_transcription_backend(self, name):
+        # takes effect from the next recording
+        if name != self.transcription_backend_name:
+            self.transcription_backend_name = name
+            self.transcription_backend = None
+
+    def start_transcription(self, ring):
+        # runs on the record thread, creating a backend can load a large model
+        if self.transcription_backend is None:
+            backend_type = TRANSCRIPTION_BACKENDS[self.transcription_backend_name]
+            try:
+                self.transcription_backend = backend_type()
+            except Exception as e:
+                print(f"Transcription is unavailable: {e}")
+                return
 
-        self.stop_transcription = self.recorder.listen_in_background(
-            self.microphone,
-            self.transcribe_audio,
+        self.detections.clear()
+        self.transcriber = Transcriber(
+            self.transcription_backend, self.transcribe_audio, self.metrics
         )
+        self.transcriber.start(ring, SAMPLE_RATE)
 
     def _record(self):
         # main record thread, will be run on separate thread
-        while self.recording:
-            recording = sd.rec(
-                int(INPUT_WINDOW * SAMPLE_RATE),
-                samplerate=SAMPLE_RATE,
-                channels=1,
-                dtype="float32",
-            )
-            sd.wait()
-            audio = recording.flatten()
-            self.process_audio(audio)
+        # the source writes into the ring buffer from its own callback thread,
+        # so no audio is lost while a window is being processed
+        ring = RingBuffer(int(DEFAULT_BUFFER_SECONDS * SAMPLE_RATE))
+        self.window_reader = SlidingWindowReader(
+            ring, int(INPUT_WINDOW * SAMPLE_RATE), int(self.hop * SAMPLE_RATE)
+        )
+        self.metrics.reset()
+        self.vad.reset()
+        self.events = self.events_model = None
+        self.features = None
+        self.start_transcription(ring)
 
-    def transcribe_audio(self, recognizer, audio):
+        resampler = Resampler(self.source.sample_rate, SAMPLE_RATE)
+        self.source.start(lambda block: ring.write(resampler.process(block)))
+
+        window_size = self.window_reader.window_size
+        hop_size = self.window_reader.hop_size
+        dropped_windows = 0
         try:
-            transcription = recognizer.recognize_google(audio)
-            print(f"Transcription with Google successfully made.")
-            self.write_to_transcript(transcription)
-        except sr.UnknownValueError:
-            print("Google Speech Recognition could not understand audio")
-        except sr.RequestError as e:
-            print(
-                "Could not request results from Google Speech Recognition service; {0}".format(
-                    e
-                )
-            )
+            while self.recording:
+                window = self.window_reader.next_window(timeout=WINDOW_TIMEOUT)
+                if window is None:
+                    continue
+                start, audio = window
+
+                # how far processing is behind capture, in time and windows
+                behind = ring.written - (start + window_size)
+                self.metrics.record("lag", behind / SAMPLE_RATE)
+                self.metrics.set_gauge("queue_depth", behind // hop_size)
+                if self.window_reader.dropped_windows != dropped_windows:
+                    self.metrics.increment(
+                        "dropped_windows",
+                        self.window_reader.dropped_windows - dropped_windows,
+                    )
+                    dropped_windows = self.window_reader.dropped_windows
+
+                started = time.perf_counter()
+                speech = self.vad.is_speech(audio, hop_size)
+                self.metrics.record("vad", time.perf_counter() - started)
 
-    def process_audio(self, audio):
-        features = extract_single_mfcc_feature(
-            audio, SAMPLE_RATE, n_mfccs=self.model.n_mfccs
+                if speech:
+                    self.process_audio(audio, start)
+                else:
+                    self.metrics.increment("silent_windows")
+                    self.process_silence(start, window_size)
+                self.metrics.maybe_flush()
+        finally:
+            self.source.stop()
+            # stutters still in progress end with the recording
+            self.finish_events()
+            # the last phrase is still transcribed, without holding up the UI
+            if self.transcriber is not None:
+                self.transcriber.stop(wait=False)
+                self.transcriber = None
+            self.metrics.flush()
+
+    def transcribe_audio(self, transcript):
+        # called from the transcription worker, the transcript is annotated
+        # with the stutter events overlapping it
+        events = self.events
+        ongoing = events.active_events() if events is not None else []
+        labels = {
+            event.label
+            for event in list(self.detections) + ongoing
+            if event.start < transcript.end
+            and (event.end is None or event.end > transcript.start)
+        }
+
+        text = f"[{transcript.start:.1f}s] {transcript.text}"
+        if labels:
+            text += f" ({', '.join(sorted(labels))})"
+        self.write_to_transcript(text)
+
+    def process_audio(self, audio, start=None):
+        # windows from the stream carry their start sample for the event
+        # tracker, a standalone window is only classified
+        model = self.model
+        if model is None:
+            self.metrics.increment("skipped_windows")
+            return
+
+        started = time.perf_counter()
+        # extracted like the store, so features match what the model was
+        # trained on
+        if start is None:
+            features = model.pipeline.extract(audio, SAMPLE_RATE)
+        else:
+            features = self.stream_features(model).update_window(start, audio)
+        extracted = time.perf_counter()
+
+        probabilities = model.event_probabilities(features[None])
+        predicted = time.perf_counter()
+
+        if start is not None:
+            self.update_events(model, start, start + len(audio), probabilities)
+        emitted = time.perf_counter()
+
+        self.metrics.record("mfcc", extracted - started)
+        self.metrics.record("predict", predicted - extracted)
+        self.metrics.record("emit", emitted - predicted)
+        self.metrics.record("process", emitted - started)
+        self.metrics.increment("windows")
+
+        # a window that takes longer than the hop cannot keep up with capture
+        if emitted - started > self.hop:
+            self.metrics.increment("overrun_windows")
+
+    def stream_features(self, model):
+        # imported here so startup does not load scipy.fft, a model has
+        # already loaded it by the time the first window arrives
+        from stutter_classification.data.feature_extraction import StreamingFeatures
+
+        if self.features is None or self.features.pipeline is not model.pipeline:
+            self.features = StreamingFeatures(model.pipeline, SAMPLE_RATE)
+        return self.features
+
+    def process_silence(self, start, window_size):
+        # a window without speech has no stutter in any label
+        events = self.events
+        if events is not None:
+            zeros = np.zeros((1, len(events.labels)))
+            self.update_events(self.events_model, start, start + window_size, zeros)
+
+    def update_events(self, model, start, end, probabilities):
+        if model is not self.events_model:
+            # labels can differ between models, events of the old one end
+            self.finish_events()
+            self.events = StutterEventTracker(model.event_labels(), self.smoothing)
+            self.events_model = model
+        self.emit_events(
+            self.events.update(
+                [start / SAMPLE_RATE], [end / SAMPLE_RATE], probabilities
+            )
         )
-        predictions = self.model.predict(features)
-        # print the number of 1s in predictions
-        self.update_prediction.emit(str(predictions[0]))
+
+    def finish_events(self):
+        if self.events is not None:
+            self.emit_events(self.events.flush())
+
+    def emit_events(self, events):
+        for event in events:
+            if event.kind == EVENT_END:
+                self.detections.append(event)
+            self.event_emitted_at = time.perf_counter()
+            self.stutter_event.emit(event)
+            self.metrics.increment(f"stutter_{event.kind}")
 
     def write_to_transcript(self, text):
         self.update_transcription_signal.emit(text)
@@ -1,2 +1,22 @@
-from .all_features import AllFeaturesModel
-from .single_feature import SingleFeatureModel
+import importlib
+
+# model classes are imported on first access, so importing the package (or
+# its options) does not pull in sklearn and the dataset modules
+_MODEL_MODULES = {
+    "AllFeaturesModel": ".all_features",
+    "SingleFeatureModel": ".single_feature",
+    "MultiLabelModel": ".multi_label",
+}
+
+__all__ = list(_MODEL_MODULES)
+
+
+def __getattr__(name):
+    if name in _MODEL_MODULES:
+        module = importlib.import_module(_MODEL_MODULES[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,120 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.model_selection import KFold, StratifiedKFold
+
+from stutter_classification.data.sep28k_data import DATA_DIR
+from stutter_classification.models.base.stutter_model import check_cancelled
+
+FOLDS_DIR = DATA_DIR / "folds"
+
+DEFAULT_N_SPLITS = 5
+
+# fold assignments, keyed by the digest of the data and split settings
+_folds = {}
+
+
+def xy_digest(X: np.ndarray, y: np.ndarray) -> str:
+    # content hash of one model's features and targets, independent of how
+    # they were built. unlike the dataset fingerprint of the feature store it
+    # changes with the model's target and feature groups
+    digest = hashlib.sha1()
+    digest.update(str(X.shape).encode())
+    digest.update(np.ascontiguousarray(X).tobytes())
+    targets = pd.DataFrame(np.asarray(y).reshape(len(y), -1))
+    digest.update(pd.util.hash_pandas_object(targets, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def get_fold_ids(
+    digest: str,
+    y: np.ndarray,
+    n_splits: int = DEFAULT_N_SPLITS,
+    stratified: bool = True,
+    random_state: int = None,
+) -> np.ndarray:
+    # fold number of every sample, cached in memory and on disk
+    # multi-label targets cannot be stratified and use plain k-fold
+    stratified = stratified and np.ndim(y) == 1
+    key = (
+        f"{digest}-{n_splits}-{'stratified' if stratified else 'kfold'}-{random_state}"
+    )
+    if key in _folds:
+        return _folds[key]
+
+    path = FOLDS_DIR / f"{key}.npy"
+    if os.path.exists(path):
+        fold_ids = np.load(path)
+    else:
+        splitter_type = StratifiedKFold if stratified else KFold
+        splitter = splitter_type(n_splits, shuffle=True, random_state=random_state)
+
+        fold_ids = np.zeros(len(y), dtype=np.int8)
+        for fold, (_, test_index) in enumerate(splitter.split(np.zeros(len(y)), y)):
+            fold_ids[test_index] = fold
+
+        os.makedirs(FOLDS_DIR, exist_ok=True)
+        np.save(path, fold_ids)
+
+    _folds[key] = fold_ids
+    return fold_ids
+
+
+def serial_estimator(estimator):
+    # for estimators fitted in workers that already run in parallel, where a
+    # parallel fit would multiply the number of processes
+    if "n_jobs" in estimator.get_params(deep=False):
+        estimator.set_params(n_jobs=1)
+    return estimator
+
+
+def _fit_and_score(score_estimator, estimator, X, y, fold_ids, fold):
+    train, test = fold_ids != fold, fold_ids == fold
+    estimator.fit(X[train], y[train])
+    return fold, score_estimator(estimator, X[test], y[test])
+
+
+def cross_validate(
+    stutter_model,
+    n_splits: int = DEFAULT_N_SPLITS,
+    stratified: bool = True,
+    n_jobs: int = -1,
+    cancelled=None,
+) -> np.ndarray:
+    # folds run in parallel, joblib memory-maps the shared arrays for workers.
+    # cancelled is checked as each fold finishes, leaving the loop early makes
+    # joblib stop the folds still running
+    X, y = stutter_model.get_xy()
+    fold_ids = get_fold_ids(
+        stutter_model.xy_digest(),
+        y,
+        n_splits=n_splits,
+        stratified=stratified,
+        random_state=stutter_model.RANDOM_STATE,
+    )
+
+    check_cancelled(cancelled)
+    # folds running in parallel fit serial copies of the estimator
+    estimator = stutter_model.model
+    if n_jobs != 1:
+        estimator = serial_estimator(clone(estimator))
+    results = Parallel(n_jobs=n_jobs, return_as="generator_unordered")(
+        delayed(_fit_and_score)(
+            stutter_model.score_estimator,
+            clone(estimator),
+            X,
+            y,
+            fold_ids,
+            fold,
+        )
+        for fold in range(n_splits)
+    )
+    scores = np.zeros(n_splits)
+    for fold, score in results:
+        check_cancelled(cancelled)
+        scores[fold] = score
+    return scores
@@ -1,20 +1,72 @@
+import hashlib
+import json
+import os
 from abc import ABC, abstractmethod
+from pathlib import Path
 from typing import NamedTuple, Type
 
+import joblib
+import sklearn
+from sklearn import config_context
 from sklearn.base import BaseEstimator
+from sklearn.model_selection import train_test_split
 import numpy as np
+import pandas as pd
 
-TYPE_LABELS = [
-    "NaturalPause",
-    "Interjection",
-    "Prolongation",
-    "WordRep",
-    "SoundRep",
-    "Block",
-]
+from stutter_classification.data.feature_extraction import (
+    DEFAULT_FEATURE_GROUPS,
+    FeaturePipeline,
+)
+from stutter_classification.data.sep28k_data import (
+    DATA_DIR,
+    get_dataset_fingerprint,
+    get_extraction_params,
+    get_sep28k_features,
+    get_sep28k_store,
+)
+from stutter_classification.data.streaming import DEFAULT_BATCH_SIZE, StreamingDataset
+from stutter_classification.models.options import (  # re-exported
+    NON_STUTTER_LABELS,
+    TYPE_LABELS,
+)
 
 RANDOM_STATE_DEFAULT = 42
 
+# bump when the artifact layout changes so older files are not loaded
+ARTIFACT_VERSION = 3
+MODELS_DIR = DATA_DIR / "models"
+
+# full feature and target arrays, shared by every model on the same dataset
+_xy_cache = {}
+
+
+def class_probabilities(estimator, features: np.ndarray, classes) -> np.ndarray:
+    # probability of each of `classes` per row, estimators without
+    # predict_proba give 1 for the predicted class and 0 for the others
+    fitted = list(estimator.classes_)
+    if not hasattr(estimator, "predict_proba"):
+        predictions = estimator.predict(features)
+        return (predictions[:, None] == np.asarray(classes)[None, :]).astype(float)
+
+    probabilities = estimator.predict_proba(features)
+    columns = np.zeros((len(features), len(classes)))
+    for i, cls in enumerate(classes):
+        # a class missing from the training data is never predicted
+        if cls in fitted:
+            columns[:, i] = probabilities[:, fitted.index(cls)]
+    return columns
+
+
+class TrainingCancelled(Exception):
+    # raised by load_or_train once its cancelled callback returns True
+    pass
+
+
+def check_cancelled(cancelled):
+    if cancelled is not None and cancelled():
+        raise TrainingCancelled()
+
+
 Dataset = NamedTuple(
     "Dataset",
     [
@@ -29,16 +81,22 @@ Dataset = NamedTuple(
 class StutterModel(ABC):
     RANDOM_STATE: int = RANDOM_STATE_DEFAULT
     TEST_SIZE = 0.4
+    CV_FOLDS = 5
 
     model: BaseEstimator
     dataset: Dataset = None
     n_mfccs: int
+    feature_groups: tuple[str, ...]
+    test_score: float = None
+    # fitted on every row, including the test split of get_dataset
+    fitted_on_all: bool = False
 
     def __init__(
         self,
         model: Type[BaseEstimator],
         random_state: int = None,
         n_mfccs: int = 13,
+        feature_groups: tuple[str, ...] = DEFAULT_FEATURE_GROUPS,
     ):
         if random_state is not None:
             self.RANDOM_STATE = random_state
@@ -50,23 +108,333 @@ class StutterModel(ABC):
             self.model = model()
 
         self.n_mfccs = n_mfccs
+        self.feature_groups = tuple(feature_groups)
+        # extracts this model's features from raw audio, as the store did
+        self.pipeline = FeaturePipeline(n_mfccs, self.feature_groups)
+        self.n_features = self.pipeline.n_features
+        self.feature_names = [str(i) for i in range(self.n_features)]
+
+        # preallocated row for single-window predictions
+        self.feature_buffer = np.zeros((1, self.n_features), dtype=np.float32)
+
+    def predict(self, features: np.ndarray | pd.DataFrame) -> np.ndarray:
+        if isinstance(features, pd.DataFrame):
+            features = self.frame_to_array(features)
+        return self.predict_estimator(features)
 
-    def predict(self, features: np.ndarray) -> np.ndarray:
+    def predict_array(self, features: np.ndarray) -> np.ndarray:
+        # fast path for one window of raw features, no dataframe is built and
+        # feature names were already checked when the model was fitted
+        self.feature_buffer[0] = features
+        return self._predict_checked(self.feature_buffer)
+
+    def predict_batch(self, features: np.ndarray) -> np.ndarray:
+        # classify many windows, one row of features per window
+        features = np.ascontiguousarray(features, dtype=np.float32)
+        if features.ndim != 2 or features.shape[1] != self.n_features:
+            raise ValueError(f"expected features of shape (n, {self.n_features})")
+        return self._predict_checked(features)
+
+    def _predict_checked(self, features: np.ndarray) -> np.ndarray:
+        # a single vectorized finite check replaces sklearn's per-call one
+        if not np.isfinite(features).all():
+            raise ValueError("features contain NaN or infinity")
+        with config_context(assume_finite=True):
+            return self.predict_estimator(features)
+
+    def predict_estimator(self, features: np.ndarray) -> np.ndarray:
         return self.model.predict(features)
 
+    def prediction_label(self, prediction) -> str:
+        # text shown for one window's prediction
+        return str(prediction)
+
+    def event_labels(self) -> list[str]:
+        # stutter types tracked as events, see models.smoothing
+        return [label for label in TYPE_LABELS if label not in NON_STUTTER_LABELS]
+
+    def event_probabilities(self, features: np.ndarray) -> np.ndarray:
+        # probability of each event label, one row of features per window
+        features = np.ascontiguousarray(features, dtype=np.float32)
+        if features.ndim != 2 or features.shape[1] != self.n_features:
+            raise ValueError(f"expected features of shape (n, {self.n_features})")
+        if not np.isfinite(features).all():
+            raise ValueError("features contain NaN or infinity")
+        with config_context(assume_finite=True):
+            return self.estimator_event_probabilities(features)
+
+    def estimator_event_probabilities(self, features: np.ndarray) -> np.ndarray:
+        return class_probabilities(self.model, features, self.event_labels())
+
     def train(self):
         dataset = self.get_dataset()
         self.model.fit(dataset.X_train, dataset.y_train)
+        self.fitted_on_all = False
+        self.check_fitted_features()
+
+    def train_all(self):
+        # fit on the whole dataset, when the score comes from cross-validation
+        X, y = self.get_xy()
+        self.model.fit(X, y)
+        self.fitted_on_all = True
+        self.check_fitted_features()
 
     def score(self):
+        # accuracy on the held-out split after train. a model fitted on all
+        # rows has seen that split, its score comes from cross_validate
+        if self.fitted_on_all:
+            raise ValueError(
+                "model was fitted on all data, score it with cross_validate"
+            )
         dataset = self.get_dataset()
-        return self.model.score(dataset.X_test, dataset.y_test)
+        return self.score_estimator(self.model, dataset.X_test, dataset.y_test)
+
+    def supports_incremental(self) -> bool:
+        return hasattr(self.model, "partial_fit")
+
+    def train_incremental(self, dataset: StreamingDataset = None, epochs: int = 1):
+        # fit batch by batch with partial_fit, the full feature matrix is never
+        # loaded, for corpora that do not fit in memory. like train, the
+        # default is the training split, score_stream then scores the rest
+        if not self.supports_incremental():
+            raise ValueError(
+                f"{type(self.model).__name__} does not support incremental training"
+            )
+        if dataset is None:
+            dataset, _ = self.stream_split()
+
+        classes = self.partial_fit_classes(dataset.targets)
+        for _ in range(epochs):
+            for X, y in dataset:
+                self.model.partial_fit(X, y, classes=classes)
+        self.fitted_on_all = False
+        self.check_fitted_features()
+
+    def partial_fit_classes(self, y):
+        # every class has to be known on the first partial_fit call
+        return np.unique(y)
+
+    def score_stream(self, dataset: StreamingDataset = None) -> float:
+        # the streamed counterpart of score, on the held-out split by default.
+        # scores are per-sample means, so batch scores weighted by batch size
+        # add up to the score of the whole dataset
+        if dataset is None:
+            if self.fitted_on_all:
+                raise ValueError(
+                    "model was fitted on all data, score it with cross_validate"
+                )
+            _, dataset = self.stream_split()
+        total = 0.0
+        for X, y in dataset:
+            total += self.score_estimator(self.model, X, y) * len(X)
+        return total / len(dataset)
+
+    @staticmethod
+    def score_estimator(estimator, X, y) -> float:
+        return estimator.score(X, y)
+
+    def cross_validate(
+        self,
+        n_splits: int = None,
+        stratified: bool = True,
+        n_jobs: int = -1,
+        cancelled=None,
+    ) -> np.ndarray:
+        # per-fold accuracy, folds are cached per dataset fingerprint so every
+        # estimator evaluated on the same data uses the same splits
+        from stutter_classification.models.base.cross_validation import (
+            cross_validate,
+        )
+
+        return cross_validate(
+            self,
+            n_splits or self.CV_FOLDS,
+            stratified=stratified,
+            n_jobs=n_jobs,
+            cancelled=cancelled,
+        )
+
+    def export(self):
+        # the fitted estimators as a NumPy-only CompactModel, for devices that
+        # cannot run sklearn
+        from stutter_classification.export.convert import export_model
+
+        return export_model(self)
+
+    def load_or_train(self, directory: Path = MODELS_DIR, cancelled=None) -> float:
+        # an identical configuration is loaded from disk instead of refit.
+        # cancelled is polled as each fold finishes and before the final fit,
+        # raising TrainingCancelled stops the folds still running. the final
+        # fit and building the feature store run to the end once started
+        if not self.load(directory):
+            # score with cross-validation, then use all of the data for the
+            # model that is actually served
+            self.test_score = float(np.mean(self.cross_validate(cancelled=cancelled)))
+            check_cancelled(cancelled)
+            self.train_all()
+            self.save(directory)
+        return self.test_score
+
+    def save(self, directory: Path = MODELS_DIR) -> Path:
+        path = self.artifact_path(directory)
+        os.makedirs(directory, exist_ok=True)
+
+        artifact = {
+            "params": self.artifact_params(),
+            "data": get_dataset_fingerprint(),
+            "model": self.model,
+            "test_score": self.test_score,
+            "fitted_on_all": self.fitted_on_all,
+        }
+        tmp_path = path.with_suffix(".tmp")
+        joblib.dump(artifact, tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    def load(self, directory: Path = MODELS_DIR) -> bool:
+        path = self.artifact_path(directory)
+        if not os.path.exists(path):
+            return False
+
+        artifact = joblib.load(path)
+        if artifact["params"] != self.artifact_params():
+            return False
+        # a model trained on other labels or clips is never served stale, the
+        # check is skipped on hosts with only the models and no feature store
+        data = get_dataset_fingerprint()
+        if data is not None and artifact.get("data") != data:
+            return False
+
+        self.model = artifact["model"]
+        self.test_score = artifact["test_score"]
+        self.fitted_on_all = artifact["fitted_on_all"]
+        self.check_fitted_features()
+        return True
+
+    def artifact_path(self, directory: Path = MODELS_DIR) -> Path:
+        return Path(directory) / f"{type(self).__name__}-{self.artifact_key()}.joblib"
+
+    def artifact_key(self) -> str:
+        params = json.dumps(self.artifact_params(), sort_keys=True)
+        return hashlib.sha1(params.encode()).hexdigest()[:16]
+
+    def artifact_params(self) -> dict:
+        # everything that changes the fitted model
+        estimator = type(self.model)
+        # n_jobs only changes how the model is fitted, not the fitted model
+        hyperparameters = {
+            k: v for k, v in self.model.get_params().items() if not k.endswith("n_jobs")
+        }
+        return {
+            "version": ARTIFACT_VERSION,
+            "sklearn_version": sklearn.__version__,
+            "estimator": f"{estimator.__module__}.{estimator.__qualname__}",
+            "hyperparameters": {k: repr(v) for k, v in sorted(hyperparameters.items())},
+            "random_state": self.RANDOM_STATE,
+            "cv_folds": self.CV_FOLDS,
+            **self.dataset_params(),
+        }
+
+    def dataset_params(self) -> dict:
+        # everything that changes the features and targets, subclasses add their own
+        return {
+            "model_type": type(self).__name__,
+            "n_mfccs": self.n_mfccs,
+            "feature_groups": list(self.feature_groups),
+            "extraction": get_extraction_params(),
+        }
+
+    def check_fitted_features(self):
+        # done once after fitting, so predictions can skip name validation
+        n_features = getattr(self.model, "n_features_in_", self.n_features)
+        if n_features != self.n_features:
+            raise ValueError(
+                f"model was fitted on {n_features} features, expected {self.n_features}"
+            )
+        fitted_names = getattr(self.model, "feature_names_in_", None)
+        if fitted_names is not None and list(fitted_names) != self.feature_names:
+            raise ValueError("model was fitted with unexpected feature names")
+
+    def frame_to_array(self, features: pd.DataFrame) -> np.ndarray:
+        if list(features.columns) != self.feature_names:
+            raise ValueError(f"expected feature columns {self.feature_names}")
+        return features.to_numpy(dtype=np.float32)
+
+    def stream_dataset(
+        self, batch_size: int = DEFAULT_BATCH_SIZE, shuffle: bool = False
+    ) -> StreamingDataset:
+        # the same rows and targets as get_xy, read from the store in batches
+        labels, features, columns = get_sep28k_store(
+            n_mfccs=self.n_mfccs, feature_groups=self.feature_groups
+        )
+        rows, y = self._get_targets(labels)
+        return StreamingDataset(
+            features,
+            rows,
+            y,
+            columns=columns,
+            batch_size=batch_size,
+            shuffle=shuffle,
+            random_state=self.RANDOM_STATE,
+        )
+
+    def stream_split(
+        self, batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> tuple[StreamingDataset, StreamingDataset]:
+        # the training and held-out rows of get_dataset, read in batches. the
+        # training rows are shuffled for partial_fit
+        dataset = self.stream_dataset(batch_size=batch_size, shuffle=True)
+        return dataset.split(self.TEST_SIZE, random_state=self.RANDOM_STATE)
+
+    def get_features(self) -> tuple[pd.DataFrame, np.ndarray]:
+        # label table and the stored feature groups this model uses
+        return get_sep28k_features(
+            n_mfccs=self.n_mfccs, feature_groups=self.feature_groups
+        )
+
+    def features_array(self, features: np.ndarray) -> np.ndarray:
+        # estimators are fitted on contiguous float32 arrays without names
+        return np.ascontiguousarray(features, dtype=np.float32)
 
     def get_dataset(self) -> Dataset:
         if self.dataset is None:
             self.dataset = self._get_dataset()
         return self.dataset
 
-    @abstractmethod
     def _get_dataset(self) -> Dataset:
+        X, y = self.get_xy()
+
+        # split into train and test data
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=self.TEST_SIZE, random_state=self.RANDOM_STATE
+        )
+
+        return Dataset(X_train, X_test, y_train, y_test)
+
+    def get_xy(self) -> tuple[np.ndarray, np.ndarray]:
+        key = self.dataset_key()
+        if key not in _xy_cache:
+            _xy_cache[key] = self._get_xy()
+        return _xy_cache[key]
+
+    def dataset_key(self) -> str:
+        return json.dumps(self.dataset_params(), sort_keys=True)
+
+    def xy_digest(self) -> str:
+        from stutter_classification.models.base.cross_validation import xy_digest
+
+        key = ("digest", self.dataset_key())
+        if key not in _xy_cache:
+            _xy_cache[key] = xy_digest(*self.get_xy())
+        return _xy_cache[key]
+
+    def _get_xy(self) -> tuple[np.ndarray, np.ndarray]:
+        # full feature matrix and targets, before any split
+        labels, features = self.get_features()
+        rows, y = self._get_targets(labels)
+        return self.features_array(features[rows]), y
+
+    @abstractmethod
+    def _get_targets(self, labels: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        # feature store rows used by this model and their targets
         pass
@@ -0,0 +1,94 @@
+from typing import Type
+
+import numpy as np
+from sklearn.base import BaseEstimator
+from sklearn.multioutput import MultiOutputClassifier
+
+from stutter_classification.data.feature_extraction import DEFAULT_FEATURE_GROUPS
+from stutter_classification.models.base.stutter_model import (
+    NON_STUTTER_LABELS,
+    StutterModel,
+    TYPE_LABELS,
+)
+
+NO_STUTTER_LABEL = "NoStutteredWords"
+
+
+class MultiLabelModel(StutterModel):
+    # one binary estimator per label, fitted on one shared dataset and
+    # evaluated together from a single feature vector per window. labels are
+    # fitted in parallel, cross-validation folds and sweep cells fit their
+    # copies serially since they already run in parallel themselves
+
+    def __init__(
+        self,
+        model: Type[BaseEstimator],
+        labels: list[str] = TYPE_LABELS,
+        n_jobs: int = -1,
+        random_state: int = None,
+        n_mfccs: int = 13,
+        feature_groups: tuple[str, ...] = DEFAULT_FEATURE_GROUPS,
+    ):
+        super().__init__(
+            model,
+            random_state=random_state,
+            n_mfccs=n_mfccs,
+            feature_groups=feature_groups,
+        )
+        self.labels = list(labels)
+        self.model = MultiOutputClassifier(self.model, n_jobs=n_jobs)
+
+    def _get_targets(self, df):
+        # get one binary target column per label
+        y = (df[self.labels].to_numpy() >= 1).astype(np.int8)
+
+        return df.index.to_numpy(), y
+
+    def partial_fit_classes(self, y):
+        # MultiOutputClassifier takes the classes of every output
+        return [np.array([0, 1])] * len(self.labels)
+
+    @staticmethod
+    def score_estimator(estimator, X, y) -> float:
+        # mean accuracy over labels, rather than requiring every label to match
+        predictions = np.column_stack([e.predict(X) for e in estimator.estimators_])
+        return float(np.mean(predictions == y))
+
+    def predict_estimator(self, features: np.ndarray) -> np.ndarray:
+        # MultiOutputClassifier.predict dispatches every call through joblib,
+        # which costs far more than the estimators do for a single window
+        return np.column_stack(
+            [estimator.predict(features) for estimator in self.model.estimators_]
+        )
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        # probability of each label being present, one column per label
+        features = np.ascontiguousarray(features, dtype=np.float32)
+        probabilities = np.zeros((len(features), len(self.labels)))
+        for i, estimator in enumerate(self.model.estimators_):
+            classes = list(estimator.classes_)
+            if 1 not in classes:
+                # label never present in the training data
+                continue
+            if hasattr(estimator, "predict_proba"):
+                label_probabilities = estimator.predict_proba(features)
+                probabilities[:, i] = label_probabilities[:, classes.index(1)]
+            else:
+                probabilities[:, i] = estimator.predict(features)
+        return probabilities
+
+    def event_labels(self) -> list[str]:
+        return [label for label in self.labels if label not in NON_STUTTER_LABELS]
+
+    def estimator_event_probabilities(self, features: np.ndarray) -> np.ndarray:
+        columns = [self.labels.index(label) for label in self.event_labels()]
+        return self.predict_proba(features)[:, columns]
+
+    def prediction_label(self, prediction) -> str:
+        present = [label for label, flag in zip(self.labels, prediction) if flag]
+        return "+".join(present) if present else NO_STUTTER_LABEL
+
+    def dataset_params(self) -> dict:
+        params = super().dataset_params()
+        params["labels"] = self.labels
+        return params
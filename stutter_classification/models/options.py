@@ -0,0 +1,105 @@
+import importlib
+from functools import partial
+
+# no model or estimator module is imported here, so the GUI and CLIs can list
+# their options without paying for sklearn until a model is actually built
+
+TYPE_LABELS = [
+    "NaturalPause",
+    "Interjection",
+    "Prolongation",
+    "WordRep",
+    "SoundRep",
+    "Block",
+]
+# labels that are not stutters, never reported as stutter events
+NON_STUTTER_LABELS = {"NoStutteredWords", "NaturalPause"}
+
+
+class LazyClass:
+    # a class named by its dotted path, imported the first time it is used.
+    # calling it constructs an instance, with any default keyword arguments
+
+    def __init__(self, path: str, **defaults):
+        self.path = path
+        self.defaults = defaults
+        self.resolved = None
+
+    def resolve(self) -> type:
+        if self.resolved is None:
+            module, name = self.path.rsplit(".", 1)
+            self.resolved = getattr(importlib.import_module(module), name)
+        return self.resolved
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **{**self.defaults, **kwargs})
+
+    def __repr__(self):
+        return f"LazyClass({self.path!r})"
+
+
+def resolve_class(cls) -> type:
+    return cls.resolve() if isinstance(cls, LazyClass) else cls
+
+
+SINGLE_LABEL_MODEL = "Single Label Model"
+
+MODEL_TYPE_OPTIONS = {
+    SINGLE_LABEL_MODEL: LazyClass(
+        "stutter_classification.models.single_feature.SingleFeatureModel"
+    ),
+    "All Labels Model": LazyClass(
+        "stutter_classification.models.all_features.AllFeaturesModel"
+    ),
+    "Multi Label Model": LazyClass(
+        "stutter_classification.models.multi_label.MultiLabelModel"
+    ),
+}
+UNDERLYING_MODEL_OPTIONS = {
+    "DecisionTreeClassifier": LazyClass(
+        "sklearn.tree.DecisionTreeClassifier", criterion="gini"
+    ),
+    "RandomForestClassifier": LazyClass("sklearn.ensemble.RandomForestClassifier"),
+    "GradientBoostingClassifier": LazyClass(
+        "sklearn.ensemble.GradientBoostingClassifier"
+    ),
+    "SVC": LazyClass("sklearn.svm.SVC"),
+    "GaussianNB": LazyClass("sklearn.naive_bayes.GaussianNB"),
+    "Neural Network": LazyClass("sklearn.neural_network.MLPClassifier"),
+}
+
+MIN_N_MFCC = 5
+MAX_N_MFCC = 21
+DEFAULT_N_MFCC = 13
+
+# named selections of the groups in data.feature_extraction.FEATURE_GROUPS
+MFCC_STATISTICS_GROUPS = ("mfcc_mean", "mfcc_std", "mfcc_delta_std", "mfcc_delta2_std")
+FEATURE_SET_OPTIONS = {
+    "MFCC Mean": ("mfcc_mean",),
+    "MFCC Statistics": MFCC_STATISTICS_GROUPS,
+    "All Features": (*MFCC_STATISTICS_GROUPS, "zcr", "spectral_flux", "pitch"),
+}
+DEFAULT_FEATURE_SET = "MFCC Mean"
+
+
+def make_model(
+    underlying_model,
+    model_type,
+    feature_name=None,
+    n_mfccs=13,
+    random_state=None,
+    feature_groups=None,
+):
+    from stutter_classification.models.single_feature import SingleFeatureModel
+
+    # options may be given as classes or as lazy references to them
+    model_type = resolve_class(model_type)
+    model_init = partial(
+        model_type, underlying_model, n_mfccs=n_mfccs, random_state=random_state
+    )
+    if feature_groups:
+        model_init = partial(model_init, feature_groups=tuple(feature_groups))
+
+    if model_type == SingleFeatureModel and feature_name:
+        return model_init(feature_name)
+    return model_init()
@@ -1,13 +1,14 @@
 from typing import Type
-from sklearn.model_selection import train_test_split
+
+import numpy as np
 from sklearn.base import BaseEstimator
 
+from stutter_classification.data.feature_extraction import DEFAULT_FEATURE_GROUPS
 from stutter_classification.models.base.stutter_model import (
-    Dataset,
     StutterModel,
     TYPE_LABELS,
+    class_probabilities,
 )
-from stutter_classification.data.sep28k_data import get_sep28k_mfcc_df
 
 
 class SingleFeatureModel(StutterModel):
@@ -19,32 +20,43 @@ class SingleFeatureModel(StutterModel):
         filter_extreme_cases: bool = False,
         random_state: int = None,
         n_mfccs: int = 13,
+        feature_groups: tuple[str, ...] = DEFAULT_FEATURE_GROUPS,
     ):
-        super().__init__(model, random_state=random_state, n_mfccs=n_mfccs)
+        super().__init__(
+            model,
+            random_state=random_state,
+            n_mfccs=n_mfccs,
+            feature_groups=feature_groups,
+        )
         self.target_column = target_column
         self.filter_extreme_cases = filter_extreme_cases
         self.filter = filter
 
-    def _get_dataset(self) -> Dataset:
-        df = get_sep28k_mfcc_df(n_mfccs=self.n_mfccs)
+    def _get_targets(self, df):
         if self.filter:
             df = self.filter_columns_except_target(df, self.target_column)
 
-        # ensure target column is binary
-        df.loc[df[self.target_column] >= 1.0, self.target_column] = 1.0
+        # get target column, ensuring it is binary
+        y = df[self.target_column].clip(upper=1).to_numpy()
 
-        # get feature columns
-        X = df.iloc[:, (-1 * self.n_mfccs) :]
+        # feature rows matching the filtered labels
+        return df.index.to_numpy(), y
 
-        # get target column
-        y = df[self.target_column]
+    def partial_fit_classes(self, y):
+        return np.array([0, 1])
 
-        # split into train and test data
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=self.TEST_SIZE, random_state=self.RANDOM_STATE
-        )
+    def event_labels(self) -> list[str]:
+        return [self.target_column]
+
+    def estimator_event_probabilities(self, features: np.ndarray) -> np.ndarray:
+        return class_probabilities(self.model, features, [1])
 
-        return Dataset(X_train, X_test, y_train, y_test)
+    def dataset_params(self) -> dict:
+        params = super().dataset_params()
+        params["target_column"] = self.target_column
+        params["filter"] = self.filter
+        params["filter_extreme_cases"] = self.filter_extreme_cases
+        return params
 
     def filter_columns_except_target(self, df, target_column):
         if self.filter_extreme_cases:
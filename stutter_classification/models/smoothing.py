@@ -0,0 +1,257 @@
+from typing import NamedTuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# per-window stutter probabilities are smoothed over time, turned on and off
+# with hysteresis and merged into events. the tracker takes windows in chunks
+# of any size, so the live path (one window at a time) and the batch path
+# (thousands at once) produce the same events
+
+DEFAULT_SMOOTHING = "median"
+
+MEDIAN_WIDTH = 3  # windows, centered so the output lags by half of it
+HMM_STAY_PROBABILITY = 0.9  # chance of staying in or out of a stutter per window
+HMM_INITIAL_PROBABILITY = 0.1
+
+ON_THRESHOLD = 0.6  # smoothed probability that starts an event
+OFF_THRESHOLD = 0.4  # and that ends it, the gap between them stops flicker
+MERGE_GAP_SECONDS = 0.5  # events closer than this are one event
+MIN_EVENT_SECONDS = 0.5  # shorter events are dropped
+
+EVENT_START = "start"
+EVENT_END = "end"
+
+
+class StutterEvent(NamedTuple):
+    kind: str  # EVENT_START or EVENT_END
+    label: str
+    start: float  # seconds
+    end: float | None  # None for start notifications
+    peak: float  # highest smoothed probability so far
+
+
+class MedianSmoother:
+    # running median over `width` windows, the stream's first and last
+    # windows are repeated at the edges
+
+    def __init__(self, width: int = MEDIAN_WIDTH):
+        self.half = width // 2
+        self.reset()
+
+    def reset(self):
+        self.history = None
+
+    def process(self, probabilities: np.ndarray) -> np.ndarray:
+        if len(probabilities) == 0:
+            return probabilities
+        if self.history is None:
+            self.history = np.repeat(probabilities[:1], self.half, axis=0)
+        return self._medians(np.concatenate((self.history, probabilities)))
+
+    def flush(self) -> np.ndarray:
+        if self.history is None:
+            return np.zeros((0, 0))
+        padding = np.repeat(self.history[-1:], self.half, axis=0)
+        smoothed = self._medians(np.concatenate((self.history, padding)))
+        self.history = None
+        return smoothed
+
+    def _medians(self, buffer: np.ndarray) -> np.ndarray:
+        width = 2 * self.half + 1
+        # the windows still needed by later medians are kept
+        self.history = buffer[max(len(buffer) - width + 1, 0) :]
+        if len(buffer) < width:
+            return buffer[:0]
+        return np.median(sliding_window_view(buffer, width, axis=0), axis=-1)
+
+
+class HMMSmoother:
+    # forward filtering of a two-state (stutter or not) hidden Markov model per
+    # label, the classifier's probabilities are used as emission likelihoods.
+    # causal, so nothing is delayed
+
+    def __init__(
+        self,
+        stay_probability: float = HMM_STAY_PROBABILITY,
+        initial_probability: float = HMM_INITIAL_PROBABILITY,
+    ):
+        self.stay = stay_probability
+        self.initial = initial_probability
+        self.reset()
+
+    def reset(self):
+        self.posterior = None
+
+    def process(self, probabilities: np.ndarray) -> np.ndarray:
+        if self.posterior is None:
+            self.posterior = np.full(probabilities.shape[1], self.initial)
+        smoothed = np.empty_like(probabilities, dtype=np.float64)
+        posterior = self.posterior
+        for i, p in enumerate(probabilities):
+            prior = self.stay * posterior + (1 - self.stay) * (1 - posterior)
+            stutter = prior * p
+            posterior = stutter / np.maximum(stutter + (1 - prior) * (1 - p), 1e-12)
+            smoothed[i] = posterior
+        self.posterior = posterior
+        return smoothed
+
+    def flush(self) -> np.ndarray:
+        self.posterior = None
+        return np.zeros((0, 0))
+
+
+class IdentitySmoother:
+    def reset(self):
+        pass
+
+    def process(self, probabilities: np.ndarray) -> np.ndarray:
+        return probabilities
+
+    def flush(self) -> np.ndarray:
+        return np.zeros((0, 0))
+
+
+SMOOTHERS = {"median": MedianSmoother, "hmm": HMMSmoother, "none": IdentitySmoother}
+SMOOTHING_OPTIONS = list(SMOOTHERS)
+
+
+def hysteresis(
+    probabilities: np.ndarray, initial: np.ndarray, on=ON_THRESHOLD, off=OFF_THRESHOLD
+) -> np.ndarray:
+    # (windows, labels) on/off state. a window above `on` turns a label on,
+    # below `off` turns it off, and in between keeps the previous state
+    decided = np.where(probabilities >= on, 1, np.where(probabilities < off, 0, -1))
+    last_decided = np.where(decided >= 0, np.arange(len(decided))[:, None], -1)
+    np.maximum.accumulate(last_decided, axis=0, out=last_decided)
+    previous = decided[np.maximum(last_decided, 0), np.arange(decided.shape[1])]
+    return np.where(last_decided >= 0, previous, initial).astype(bool)
+
+
+class OpenEvent:
+    def __init__(self, start, end, peak):
+        self.start = start
+        self.end = end
+        self.peak = peak
+        self.confirmed = False
+
+
+class StutterEventTracker:
+    # turns a stream of per-window probabilities, one column per label, into
+    # start and end notifications. windows are given by their start and end
+    # times in seconds and must arrive in order
+
+    def __init__(
+        self,
+        labels: list[str],
+        smoothing: str = DEFAULT_SMOOTHING,
+        on_threshold: float = ON_THRESHOLD,
+        off_threshold: float = OFF_THRESHOLD,
+        merge_gap: float = MERGE_GAP_SECONDS,
+        min_duration: float = MIN_EVENT_SECONDS,
+    ):
+        if smoothing not in SMOOTHERS:
+            raise ValueError(f"smoothing must be one of {SMOOTHING_OPTIONS}")
+        if off_threshold > on_threshold:
+            raise ValueError("off_threshold must not be above on_threshold")
+
+        self.labels = list(labels)
+        self.smoother = SMOOTHERS[smoothing]()
+        self.on_threshold = on_threshold
+        self.off_threshold = off_threshold
+        self.merge_gap = merge_gap
+        self.min_duration = min_duration
+        self.reset()
+
+    def reset(self):
+        self.smoother.reset()
+        # times of windows the smoother has not returned yet
+        self.pending_times = np.zeros((0, 2))
+        self.state = np.zeros(len(self.labels), dtype=bool)
+        self.open_events = [None] * len(self.labels)
+
+    def active_events(self) -> list[StutterEvent]:
+        # start notifications of the events that have not ended yet
+        return [
+            StutterEvent(EVENT_START, label, event.start, None, event.peak)
+            for label, event in zip(self.labels, self.open_events)
+            if event is not None and event.confirmed
+        ]
+
+    def update(self, starts, ends, probabilities) -> list[StutterEvent]:
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        if probabilities.ndim != 2 or probabilities.shape[1] != len(self.labels):
+            raise ValueError(f"expected probabilities of shape (n, {len(self.labels)})")
+        times = np.column_stack((starts, ends)).astype(np.float64)
+        self.pending_times = np.concatenate((self.pending_times, times))
+        return self._events(self.smoother.process(probabilities))
+
+    def flush(self) -> list[StutterEvent]:
+        # the remaining windows, then every open event is ended
+        smoothed = self.smoother.flush()
+        events = self._events(smoothed) if len(smoothed) else []
+        for i, event in enumerate(self.open_events):
+            if event is not None:
+                events += self._close(i)
+        self.reset()
+        return events
+
+    def _events(self, smoothed: np.ndarray) -> list[StutterEvent]:
+        n = len(smoothed)
+        times, self.pending_times = self.pending_times[:n], self.pending_times[n:]
+        if n == 0:
+            return []
+
+        active = hysteresis(smoothed, self.state, self.on_threshold, self.off_threshold)
+        self.state = active[-1]
+
+        events = []
+        for i in range(len(self.labels)):
+            # runs of windows in the same state, so the loop is per change
+            changes = np.flatnonzero(np.diff(active[:, i])) + 1
+            bounds = np.concatenate(([0], changes, [n]))
+            for a, b in zip(bounds[:-1], bounds[1:]):
+                if active[a, i]:
+                    events += self._extend(i, times[a:b], smoothed[a:b, i])
+                else:
+                    events += self._gap(i, times[a:b, 0])
+        events.sort(key=lambda e: e.start if e.kind == EVENT_START else e.end)
+        return events
+
+    def _extend(self, i, times, probabilities) -> list[StutterEvent]:
+        events = []
+        event = self.open_events[i]
+        if event is not None and times[0, 0] - event.end > self.merge_gap:
+            events += self._close(i)
+            event = None
+        if event is None:
+            event = self.open_events[i] = OpenEvent(times[0, 0], times[0, 1], 0.0)
+
+        if not event.confirmed and times[-1, 1] - event.start >= self.min_duration:
+            # started by the first window that makes it long enough, its peak
+            # is up to that window however the stream was chunked
+            first = np.searchsorted(times[:, 1] - event.start, self.min_duration)
+            peak = max(event.peak, float(probabilities[: first + 1].max()))
+            event.confirmed = True
+            events.append(
+                StutterEvent(EVENT_START, self.labels[i], event.start, None, peak)
+            )
+        event.end = times[-1, 1]
+        event.peak = max(event.peak, float(probabilities.max()))
+        return events
+
+    def _gap(self, i, starts) -> list[StutterEvent]:
+        # an event ends once no later window could be merged into it
+        event = self.open_events[i]
+        if event is not None and starts[-1] - event.end > self.merge_gap:
+            return self._close(i)
+        return []
+
+    def _close(self, i) -> list[StutterEvent]:
+        event, self.open_events[i] = self.open_events[i], None
+        # events that never lasted min_duration were never started
+        if not event.confirmed:
+            return []
+        return [
+            StutterEvent(EVENT_END, self.labels[i], event.start, event.end, event.peak)
+        ]
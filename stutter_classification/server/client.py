@@ -0,0 +1,163 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import numpy as np
+
+from stutter_classification.audio.stream import INPUT_HOP, SAMPLE_RATE
+from stutter_classification.models.options import MODEL_TYPE_OPTIONS
+from stutter_classification.server.http import (
+    HttpError,
+    encode_request,
+    read_message,
+)
+from stutter_classification.server.inference_server import DEFAULT_HOST, DEFAULT_PORT
+from stutter_classification.server.model_pool import ModelConfig
+
+DEFAULT_SESSIONS = 4
+
+
+class InferenceClient:
+    # one keep-alive connection to the inference server, standing in for a
+    # live client in tests and load simulations
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+        # requests on one connection are answered in order
+        self.lock = asyncio.Lock()
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+            self.writer = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def request(self, method, path, body=b"", content_type=None):
+        async with self.lock:
+            self.writer.write(encode_request(method, path, body, content_type))
+            await self.writer.drain()
+            response = await read_message(self.reader)
+        if response is None:
+            raise ConnectionError("the server closed the connection")
+
+        status = int(response.start_line[1])
+        payload = response.json()
+        if status >= 400:
+            raise HttpError(status, payload.get("error", ""))
+        return payload
+
+    async def create_session(self, encoding="float32", **model_options) -> dict:
+        options = {"encoding": encoding, **model_options}
+        body = json.dumps(options).encode()
+        return await self.request("POST", "/sessions", body, "application/json")
+
+    async def send_audio(self, session_id, samples: np.ndarray) -> list[dict]:
+        body = np.ascontiguousarray(samples, dtype="<f4").tobytes()
+        response = await self.request(
+            "POST", f"/sessions/{session_id}/audio", body, "application/octet-stream"
+        )
+        return response["windows"]
+
+    async def session_stats(self, session_id) -> dict:
+        return await self.request("GET", f"/sessions/{session_id}")
+
+    async def close_session(self, session_id) -> dict:
+        return await self.request("DELETE", f"/sessions/{session_id}")
+
+    async def stats(self) -> dict:
+        return await self.request("GET", "/stats")
+
+
+async def stream_session(args, audio, index) -> dict:
+    # one simulated user streaming the file in chunks, optionally in real time
+    chunk_size = int(args.chunk * SAMPLE_RATE)
+    options = ModelConfig.from_json(
+        {"model_type": args.model_type, "n_mfccs": args.n_mfccs}
+    )._asdict()
+    round_trips = []
+    windows = []
+
+    async with InferenceClient(args.host, args.port) as client:
+        session = await client.create_session(**options)
+        # sessions start staggered, like users joining at different times
+        await asyncio.sleep(index * args.chunk / args.sessions)
+        started = time.perf_counter()
+        for i, start in enumerate(range(0, len(audio), chunk_size)):
+            if args.realtime:
+                delay = started + i * args.chunk - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            sent = time.perf_counter()
+            windows += await client.send_audio(
+                session["session"], audio[start : start + chunk_size]
+            )
+            round_trips.append(time.perf_counter() - sent)
+        summary = await client.close_session(session["session"])
+
+    summary["round_trips"] = round_trips
+    summary["windows"] = windows
+    return summary
+
+
+async def simulate(args):
+    from stutter_classification.audio.decode import load_audio
+
+    audio, _ = load_audio(args.audio, SAMPLE_RATE)
+    summaries = await asyncio.gather(
+        *(stream_session(args, audio, i) for i in range(args.sessions))
+    )
+
+    batch_sizes = []
+    for summary in summaries:
+        latency = summary["metrics"]["stages"].get("latency", {})
+        round_trips = np.array(summary["round_trips"]) * 1000
+        batch_sizes += [
+            w["batch_size"] for w in summary["windows"] if "batch_size" in w
+        ]
+        print(
+            f"session {summary['session'][:8]}: {len(summary['windows'])} windows, "
+            f"latency p50 {latency.get('p50_ms', 0):.1f} ms "
+            f"p95 {latency.get('p95_ms', 0):.1f} ms, "
+            f"round trip p50 {np.percentile(round_trips, 50):.1f} ms"
+        )
+    if batch_sizes:
+        print(f"mean batch size {np.mean(batch_sizes):.1f} windows")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Stream an audio file to the inference server as several users."
+    )
+    parser.add_argument("audio", help="audio file every session streams")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--sessions", type=int, default=DEFAULT_SESSIONS)
+    parser.add_argument("--chunk", type=float, default=INPUT_HOP, help="seconds")
+    parser.add_argument(
+        "--realtime", action="store_true", help="send chunks at the audio's pace"
+    )
+    parser.add_argument(
+        "--model-type", choices=MODEL_TYPE_OPTIONS, default=ModelConfig().model_type
+    )
+    parser.add_argument("--n-mfccs", type=int, default=ModelConfig().n_mfccs)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(simulate(parse_args())))
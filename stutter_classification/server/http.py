@@ -0,0 +1,96 @@
+import json
+from typing import NamedTuple
+
+# just enough HTTP/1.1 for the inference server and its client, over asyncio
+# streams so no web framework is needed. bodies always have a Content-Length
+MAX_LINE_BYTES = 8192
+MAX_HEADERS = 64
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+REASONS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Message(NamedTuple):
+    # a request (method, path, version) or a response (version, status, reason)
+    start_line: list[str]
+    headers: dict[str, str]
+    body: bytes
+
+    def json(self):
+        try:
+            return json.loads(self.body or b"null")
+        except ValueError:
+            raise HttpError(400, "body is not valid JSON")
+
+    def keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+
+async def read_message(reader) -> Message | None:
+    # None when the peer closed the connection between messages
+    line = await reader.readline()
+    if not line:
+        return None
+    if len(line) > MAX_LINE_BYTES or not line.endswith(b"\r\n"):
+        raise HttpError(400, "malformed start line")
+    start_line = line.decode("latin-1").strip().split(" ", 2)
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= MAX_HEADERS or len(line) > MAX_LINE_BYTES:
+            raise HttpError(400, "too many or too long headers")
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HttpError(400, "Content-Length is not a number")
+    if length < 0:
+        raise HttpError(400, "Content-Length is negative")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, f"body is larger than {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return Message(start_line, headers, body)
+
+
+def encode_message(
+    start_line: str, body: bytes = b"", content_type: str = None, close=False
+) -> bytes:
+    headers = [start_line, f"Content-Length: {len(body)}"]
+    if content_type:
+        headers.append(f"Content-Type: {content_type}")
+    if close:
+        headers.append("Connection: close")
+    return ("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body
+
+
+def encode_response(status: int, payload, close=False) -> bytes:
+    body = json.dumps(payload).encode()
+    start_line = f"HTTP/1.1 {status} {REASONS.get(status, '')}"
+    return encode_message(start_line, body, "application/json", close)
+
+
+def encode_request(
+    method: str, path: str, body: bytes = b"", content_type: str = None
+) -> bytes:
+    return encode_message(f"{method} {path} HTTP/1.1", body, content_type)
@@ -0,0 +1,343 @@
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+
+import numpy as np
+
+from stutter_classification.audio.decode import Resampler
+from stutter_classification.audio.stream import (
+    DEFAULT_BUFFER_SECONDS,
+    INPUT_HOP,
+    INPUT_WINDOW,
+    SAMPLE_RATE,
+    RingBuffer,
+    SlidingWindowReader,
+)
+from stutter_classification.audio.vad import VoiceActivityDetector
+from stutter_classification.data.feature_extraction import StreamingFeatures
+from stutter_classification.models.options import MODEL_TYPE_OPTIONS
+from stutter_classification.server.http import (
+    HttpError,
+    encode_response,
+    read_message,
+)
+from stutter_classification.server.model_pool import (
+    DEFAULT_MAX_BATCH_SIZE,
+    DEFAULT_MAX_WAIT,
+    ModelConfig,
+    ModelPool,
+)
+from stutter_classification.telemetry.metrics import Metrics
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# a chunk has to fit in a session's ring buffer next to the window being read
+MAX_CHUNK_SECONDS = DEFAULT_BUFFER_SECONDS / 2
+SESSION_IDLE_SECONDS = 300.0  # sessions without audio for this long are closed
+REAP_INTERVAL = 30.0
+
+# same as the recorder, silent windows are not classified
+NO_SPEECH_LABEL = "NoSpeech"
+VAD_HANGOVER_SECONDS = 0.5
+
+AUDIO_ENCODINGS = {"float32": np.dtype("<f4"), "int16": np.dtype("<i2")}
+
+
+class Session:
+    # one client's audio stream. windows are cut and their features extracted
+    # exactly as in the recorder, then predicted by the pooled model together
+    # with every other session's windows
+
+    def __init__(self, session_id, pooled, encoding="float32", sample_rate=SAMPLE_RATE):
+        if not isinstance(encoding, str) or encoding not in AUDIO_ENCODINGS:
+            raise ValueError(f"encoding must be one of {list(AUDIO_ENCODINGS)}")
+        if (
+            isinstance(sample_rate, bool)
+            or not isinstance(sample_rate, int)
+            or sample_rate <= 0
+        ):
+            raise ValueError("sample_rate must be a positive integer")
+
+        self.id = session_id
+        self.pooled = pooled
+        self.model = pooled.model
+        self.dtype = AUDIO_ENCODINGS[encoding]
+
+        # audio sent at another rate is resampled to the models' rate
+        self.sample_rate = sample_rate
+        self.resampler = Resampler(sample_rate, SAMPLE_RATE)
+
+        window_size = int(INPUT_WINDOW * SAMPLE_RATE)
+        self.hop_size = int(INPUT_HOP * SAMPLE_RATE)
+        self.ring = RingBuffer(int(DEFAULT_BUFFER_SECONDS * SAMPLE_RATE))
+        self.reader = SlidingWindowReader(self.ring, window_size, self.hop_size)
+        self.vad = VoiceActivityDetector(SAMPLE_RATE, VAD_HANGOVER_SECONDS)
+        self.features = StreamingFeatures(self.model.pipeline, SAMPLE_RATE)
+
+        self.metrics = Metrics()
+        # chunks of one session are processed in order
+        self.lock = asyncio.Lock()
+        self.last_active = time.monotonic()
+
+    def decode(self, body: bytes) -> np.ndarray:
+        if len(body) % self.dtype.itemsize:
+            raise HttpError(400, f"audio is not a whole number of {self.dtype} samples")
+        samples = np.frombuffer(body, dtype=self.dtype)
+        if len(samples) > MAX_CHUNK_SECONDS * self.sample_rate:
+            raise HttpError(
+                413, f"chunks may hold at most {MAX_CHUNK_SECONDS}s of audio"
+            )
+        if self.dtype.kind == "i":
+            return samples.astype(np.float32) / 32768
+        return samples.astype(np.float32)
+
+    def extract(self, samples: np.ndarray) -> list[tuple[int, np.ndarray | None]]:
+        # runs in a worker thread, returns the start and features of every
+        # window the chunk completed, None for windows without speech
+        started = time.perf_counter()
+        self.ring.write(self.resampler.process(samples))
+        windows = []
+        while (window := self.reader.next_window(timeout=0)) is not None:
+            start, audio = window
+            if not self.vad.is_speech(audio, self.hop_size):
+                windows.append((start, None))
+            else:
+                windows.append((start, self.features.update_window(start, audio)))
+        self.metrics.record("extract", time.perf_counter() - started)
+        return windows
+
+    async def process(self, body: bytes) -> list[dict]:
+        received = time.perf_counter()
+        self.last_active = time.monotonic()
+        samples = self.decode(body)
+        async with self.lock:
+            windows = await asyncio.to_thread(self.extract, samples)
+
+        async def classify(start, features):
+            window = {
+                "start": start / SAMPLE_RATE,
+                "end": (start + self.reader.window_size) / SAMPLE_RATE,
+            }
+            if features is None:
+                self.metrics.increment("silent_windows")
+                return {**window, "prediction": NO_SPEECH_LABEL}
+
+            prediction = await self.pooled.batcher.predict(features)
+            latency = time.perf_counter() - received
+            self.metrics.record("queue", prediction.queued)
+            self.metrics.record("predict", prediction.predicted)
+            self.metrics.record("latency", latency)
+            self.metrics.increment("windows")
+            return {
+                **window,
+                "prediction": prediction.label,
+                "batch_size": prediction.batch_size,
+                "latency_ms": latency * 1000,
+            }
+
+        return await asyncio.gather(*(classify(*window) for window in windows))
+
+    def describe(self) -> dict:
+        return {
+            "session": self.id,
+            "model": self.pooled.config._asdict(),
+            "test_score": self.pooled.test_score,
+            "sample_rate": self.sample_rate,
+            "window": INPUT_WINDOW,
+            "hop": INPUT_HOP,
+            "dropped_windows": self.reader.dropped_windows,
+            "metrics": self.metrics.snapshot(),
+        }
+
+
+class InferenceServer:
+    # HTTP endpoints:
+    #   POST   /sessions              json model options -> new session
+    #   POST   /sessions/<id>/audio   raw mono samples -> predicted windows
+    #   GET    /sessions/<id>         session latency and counters
+    #   DELETE /sessions/<id>         close a session
+    #   GET    /stats                 pooled models, batching and sessions
+
+    def __init__(
+        self,
+        host=DEFAULT_HOST,
+        port=DEFAULT_PORT,
+        max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+        max_wait=DEFAULT_MAX_WAIT,
+    ):
+        self.host = host
+        self.port = port
+        self.pool = ModelPool(max_batch_size, max_wait)
+        self.sessions = {}
+        self.server = None
+        self.reaper = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self.handle_connection, self.host, self.port
+        )
+        # port 0 picks a free port, report the one actually bound
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.reaper = asyncio.create_task(self._reap_idle_sessions())
+
+    async def close(self):
+        if self.reaper is not None:
+            self.reaper.cancel()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.pool.close()
+        self.sessions.clear()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_message(reader)
+                except HttpError as e:
+                    # the stream can no longer be parsed, so it is closed
+                    writer.write(
+                        encode_response(e.status, {"error": e.message}, close=True)
+                    )
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+
+                try:
+                    status, payload = await self.route(request)
+                except HttpError as e:
+                    status, payload = e.status, {"error": e.message}
+                except Exception as e:
+                    print(f"Request failed: {e}")
+                    status, payload = 500, {"error": str(e)}
+
+                keep_alive = request.keep_alive()
+                writer.write(encode_response(status, payload, close=not keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, request) -> tuple[int, dict]:
+        if len(request.start_line) != 3:
+            raise HttpError(400, "malformed request line")
+        method, path, _ = request.start_line
+        parts = path.strip("/").split("/")
+
+        if parts == ["stats"] and method == "GET":
+            return 200, self.stats()
+        if parts == ["sessions"] and method == "POST":
+            return 201, await self.create_session(request.json())
+        if len(parts) >= 2 and parts[0] == "sessions":
+            session = self.sessions.get(parts[1])
+            if session is None:
+                raise HttpError(404, f"no session {parts[1]}")
+            if len(parts) == 3 and parts[2] == "audio" and method == "POST":
+                return 200, {"windows": await session.process(request.body)}
+            if len(parts) == 2 and method == "GET":
+                return 200, session.describe()
+            if len(parts) == 2 and method == "DELETE":
+                del self.sessions[session.id]
+                return 200, session.describe()
+            raise HttpError(405, f"{method} is not supported on {path}")
+        raise HttpError(404, f"no endpoint {path}")
+
+    async def create_session(self, options) -> dict:
+        if options is None:
+            options = {}
+        if not isinstance(options, dict):
+            raise HttpError(400, "body must be a JSON object of model options")
+        options = dict(options)
+        encoding = options.pop("encoding", "float32")
+        sample_rate = options.pop("sample_rate", SAMPLE_RATE)
+        try:
+            config = ModelConfig.from_json(options)
+            pooled = await self.pool.get(config)
+            session = Session(uuid.uuid4().hex, pooled, encoding, sample_rate)
+        except ValueError as e:
+            raise HttpError(400, str(e))
+        self.sessions[session.id] = session
+        return session.describe()
+
+    def stats(self) -> dict:
+        return {
+            "models": [
+                {
+                    "model": pooled.config._asdict(),
+                    "test_score": pooled.test_score,
+                    "sessions": sum(
+                        session.pooled is pooled for session in self.sessions.values()
+                    ),
+                    "metrics": pooled.batcher.metrics.snapshot(),
+                }
+                for pooled in self.pool.loaded()
+            ],
+            "sessions": {
+                session.id: session.metrics.snapshot()
+                for session in self.sessions.values()
+            },
+        }
+
+    async def _reap_idle_sessions(self):
+        while True:
+            await asyncio.sleep(REAP_INTERVAL)
+            now = time.monotonic()
+            for session in list(self.sessions.values()):
+                if now - session.last_active > SESSION_IDLE_SECONDS:
+                    del self.sessions[session.id]
+
+
+async def serve(args):
+    server = InferenceServer(
+        args.host, args.port, args.max_batch_size, args.max_wait_ms / 1000
+    )
+    await server.start()
+    for model_type in args.preload or []:
+        # load or train commonly used models before clients ask for them
+        await server.pool.get(ModelConfig.from_json({"model_type": model_type}))
+    print(f"Serving stutter detection on http://{server.host}:{server.port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serve live stutter detection to many clients over HTTP."
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=DEFAULT_MAX_WAIT * 1000,
+        help="how long a window may wait for windows of other sessions",
+    )
+    parser.add_argument(
+        "--preload",
+        nargs="+",
+        choices=MODEL_TYPE_OPTIONS,
+        help="model types to load with default options at startup",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    try:
+        asyncio.run(serve(parse_args(argv)))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
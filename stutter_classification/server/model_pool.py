@@ -0,0 +1,200 @@
+import asyncio
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+from stutter_classification.data.sep28k_data import MAX_N_MFCCS
+from stutter_classification.models.options import (
+    DEFAULT_FEATURE_SET,
+    DEFAULT_N_MFCC,
+    FEATURE_SET_OPTIONS,
+    MODEL_TYPE_OPTIONS,
+    SINGLE_LABEL_MODEL,
+    TYPE_LABELS,
+    UNDERLYING_MODEL_OPTIONS,
+    make_model,
+)
+from stutter_classification.telemetry.metrics import Metrics
+
+DEFAULT_MAX_BATCH_SIZE = 256  # windows per predict call
+DEFAULT_MAX_WAIT = 0.005  # seconds a window may wait for others to join it
+
+
+class ModelConfig(NamedTuple):
+    # option names as shown in the GUI, the key of a pooled model
+    underlying_model: str = list(UNDERLYING_MODEL_OPTIONS)[0]
+    model_type: str = list(MODEL_TYPE_OPTIONS)[0]
+    label: str | None = TYPE_LABELS[0]
+    n_mfccs: int = DEFAULT_N_MFCC
+    features: str = DEFAULT_FEATURE_SET
+
+    @classmethod
+    def from_json(cls, data: dict | None) -> "ModelConfig":
+        data = dict(data or {})
+        unknown = set(data) - set(cls._fields)
+        if unknown:
+            raise ValueError(f"unknown model options {sorted(unknown)}")
+        config = cls(**data)
+
+        for value, options in (
+            (config.underlying_model, UNDERLYING_MODEL_OPTIONS),
+            (config.model_type, MODEL_TYPE_OPTIONS),
+            (config.features, FEATURE_SET_OPTIONS),
+        ):
+            if not isinstance(value, str) or value not in options:
+                raise ValueError(f"{value!r} is not one of {list(options)}")
+        # bool is a subclass of int, true is not a number of coefficients
+        if isinstance(config.n_mfccs, bool) or not isinstance(config.n_mfccs, int):
+            raise ValueError("n_mfccs must be an integer")
+        if not 1 <= config.n_mfccs <= MAX_N_MFCCS:
+            raise ValueError(f"n_mfccs must be between 1 and {MAX_N_MFCCS}")
+
+        # the label only matters to single label models, so it is not part of
+        # the key of any other model type
+        if config.model_type != SINGLE_LABEL_MODEL:
+            return config._replace(label=None)
+        if config.label not in TYPE_LABELS:
+            raise ValueError(f"{config.label!r} is not one of {TYPE_LABELS}")
+        return config
+
+    def build(self):
+        return make_model(
+            UNDERLYING_MODEL_OPTIONS[self.underlying_model],
+            MODEL_TYPE_OPTIONS[self.model_type],
+            self.label,
+            self.n_mfccs,
+            feature_groups=FEATURE_SET_OPTIONS[self.features],
+        )
+
+
+class Prediction(NamedTuple):
+    label: str
+    queued: float  # seconds waiting for the batch to start
+    predicted: float  # seconds spent in the batch's predict call
+    batch_size: int
+
+
+class MicroBatcher:
+    # windows from every session sharing a model are collected for at most
+    # max_wait and predicted with a single call, which costs about as much as
+    # predicting one of them
+
+    def __init__(
+        self,
+        model,
+        max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+        max_wait=DEFAULT_MAX_WAIT,
+        metrics=None,
+    ):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.metrics = metrics or Metrics()
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+
+    async def predict(self, features: np.ndarray) -> Prediction:
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((features, future, time.perf_counter()))
+        return await future
+
+    def _drain(self, batch):
+        while len(batch) < self.max_batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            self._drain(batch)
+            if len(batch) < self.max_batch_size and self.max_wait > 0:
+                await asyncio.sleep(self.max_wait)
+                self._drain(batch)
+
+            started = time.perf_counter()
+            features = np.stack([features for features, _, _ in batch])
+            try:
+                # the event loop keeps accepting audio while the model runs
+                predictions = await asyncio.to_thread(
+                    self.model.predict_batch, features
+                )
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            predicted = time.perf_counter() - started
+
+            self.metrics.record("predict", predicted)
+            self.metrics.increment("batches")
+            self.metrics.increment("batched_windows", len(batch))
+            for (_, future, queued), prediction in zip(batch, predictions):
+                if not future.done():
+                    future.set_result(
+                        Prediction(
+                            self.model.prediction_label(prediction),
+                            started - queued,
+                            predicted,
+                            len(batch),
+                        )
+                    )
+
+    def close(self):
+        self.task.cancel()
+
+
+class PooledModel(NamedTuple):
+    config: ModelConfig
+    model: object
+    test_score: float
+    batcher: MicroBatcher
+
+
+class ModelPool:
+    # one loaded model per configuration, shared by every session asking for
+    # it. a configuration is loaded or trained once, concurrent requests for
+    # it wait on the same load
+
+    def __init__(
+        self, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.loads = {}
+
+    async def get(self, config: ModelConfig) -> PooledModel:
+        load = self.loads.get(config)
+        if load is None:
+            load = self.loads[config] = asyncio.create_task(self._load(config))
+        try:
+            # shielded, a client giving up does not cancel a shared load
+            return await asyncio.shield(load)
+        except Exception:
+            # a failed load is retried by the next request
+            if self.loads.get(config) is load and load.done():
+                del self.loads[config]
+            raise
+
+    async def _load(self, config: ModelConfig) -> PooledModel:
+        def load():
+            model = config.build()
+            return model, model.load_or_train()
+
+        model, test_score = await asyncio.to_thread(load)
+        metrics = Metrics()
+        batcher = MicroBatcher(model, self.max_batch_size, self.max_wait, metrics)
+        return PooledModel(config, model, test_score, batcher)
+
+    def loaded(self) -> list[PooledModel]:
+        return [
+            load.result()
+            for load in self.loads.values()
+            if load.done() and not load.cancelled() and load.exception() is None
+        ]
+
+    def close(self):
+        for pooled in self.loaded():
+            pooled.batcher.close()
+        for load in self.loads.values():
+            load.cancel()
+        self.loads.clear()
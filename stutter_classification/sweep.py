@@ -0,0 +1,247 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from stutter_classification.data.sep28k_data import (
+    DATA_DIR,
+    get_dataset_fingerprint,
+    get_sep28k_features,
+)
+from stutter_classification.models.base.cross_validation import serial_estimator
+from stutter_classification.models.options import (
+    DEFAULT_FEATURE_SET,
+    FEATURE_SET_OPTIONS,
+    MAX_N_MFCC,
+    MIN_N_MFCC,
+    MODEL_TYPE_OPTIONS,
+    SINGLE_LABEL_MODEL,
+    TYPE_LABELS,
+    UNDERLYING_MODEL_OPTIONS,
+    make_model,
+)
+
+SWEEP_DIR = DATA_DIR / "sweep"
+LEADERBOARD_PATH = SWEEP_DIR / "leaderboard.csv"
+
+LATENCY_REPEATS = 200  # single-window predictions timed per cell
+TOP_PER_GROUP = 5  # leaderboard rows printed per model type and label
+
+# what the accuracy of each model type measures. accuracies of different
+# model types or labels are not comparable, so each is ranked on its own
+ACCURACY_METRICS = {
+    SINGLE_LABEL_MODEL: "label present accuracy",
+    "All Labels Model": "stutter type accuracy",
+    "Multi Label Model": "mean per-label accuracy",
+}
+
+
+def sweep_grid(estimators, model_types, labels, n_mfccs_values, seeds, feature_sets):
+    # labels only apply to single label models
+    for estimator, model_type, n_mfccs, seed, features in itertools.product(
+        estimators, model_types, n_mfccs_values, seeds, feature_sets
+    ):
+        if model_type == SINGLE_LABEL_MODEL:
+            for label in labels:
+                yield estimator, model_type, label, n_mfccs, seed, features
+        else:
+            yield estimator, model_type, None, n_mfccs, seed, features
+
+
+def build_model(estimator, model_type, label, n_mfccs, seed, features):
+    return make_model(
+        UNDERLYING_MODEL_OPTIONS[estimator],
+        MODEL_TYPE_OPTIONS[model_type],
+        label,
+        n_mfccs,
+        random_state=seed,
+        feature_groups=FEATURE_SET_OPTIONS[features],
+    )
+
+
+def cell_path(model):
+    # cells are cached under the same key as the model's artifact
+    return SWEEP_DIR / f"{model.artifact_key()}.json"
+
+
+def _init_worker():
+    # open the memory-mapped feature store once per worker, the pages are
+    # shared with the other workers through the OS page cache
+    get_sep28k_features()
+
+
+def run_cell(cell):
+    estimator, model_type, label, n_mfccs, seed, features = cell
+    model = build_model(*cell)
+
+    # cells already run in parallel, so neither the folds of one cell nor its
+    # estimator do
+    serial_estimator(model.model)
+    scores = model.cross_validate(n_jobs=1)
+
+    X, _ = model.get_xy()
+    started = time.perf_counter()
+    model.train_all()
+    fit_seconds = time.perf_counter() - started
+
+    # single-window latency, as seen by the live recorder
+    windows = X[:LATENCY_REPEATS]
+    latencies = np.zeros(len(windows))
+    for i, window in enumerate(windows):
+        started = time.perf_counter()
+        model.predict_array(window)
+        latencies[i] = time.perf_counter() - started
+
+    # batched throughput, as seen by the batch inference command
+    started = time.perf_counter()
+    model.predict_batch(X)
+    batch_seconds = time.perf_counter() - started
+
+    result = {
+        "estimator": estimator,
+        "model_type": model_type,
+        "label": label,
+        "n_mfccs": n_mfccs,
+        "features": features,
+        "seed": seed,
+        "accuracy": float(np.mean(scores)),
+        "accuracy_std": float(np.std(scores)),
+        "fit_seconds": fit_seconds,
+        "predict_p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "predict_p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "batch_windows_per_second": len(X) / batch_seconds,
+        "data": get_dataset_fingerprint(),
+    }
+
+    path = cell_path(model)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(result, f, indent=2)
+    os.replace(tmp_path, path)
+    return result
+
+
+def load_cell(cell):
+    path = cell_path(build_model(*cell))
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        result = json.load(f)
+    # cells run on other labels or clips are run again
+    if result.get("data") != get_dataset_fingerprint():
+        return None
+    return result
+
+
+def run_sweep(cells, n_workers=None) -> pd.DataFrame:
+    os.makedirs(SWEEP_DIR, exist_ok=True)
+
+    # build the feature store before workers start using it
+    get_sep28k_features()
+
+    results = []
+    pending = []
+    for cell in cells:
+        result = load_cell(cell)
+        if result is None:
+            pending.append(cell)
+        else:
+            results.append(result)
+    print(f"{len(results)} cached cells, {len(pending)} to run")
+
+    if pending:
+        with ProcessPoolExecutor(
+            max_workers=n_workers, initializer=_init_worker
+        ) as executor:
+            futures = {executor.submit(run_cell, cell): cell for cell in pending}
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    tqdm.write(f"Cell {futures[future]} failed: {e}")
+
+    return leaderboard(results)
+
+
+def leaderboard(results) -> pd.DataFrame:
+    # ranked within each model type and label, best accuracy first and the
+    # faster model first on ties
+    df = pd.DataFrame(results)
+    if df.empty:
+        return df
+    df["metric"] = df.model_type.map(ACCURACY_METRICS)
+    df = df.sort_values(
+        ["model_type", "label", "accuracy", "predict_p50_ms"],
+        ascending=[True, True, False, True],
+        na_position="first",
+    )
+    groups = df.groupby(["model_type", "label"], dropna=False, sort=False)
+    df.insert(0, "rank", groups.cumcount() + 1)
+    return df.reset_index(drop=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Train and score every model configuration in a grid."
+    )
+    parser.add_argument(
+        "--estimators",
+        nargs="+",
+        choices=UNDERLYING_MODEL_OPTIONS,
+        default=list(UNDERLYING_MODEL_OPTIONS),
+    )
+    parser.add_argument(
+        "--model-types",
+        nargs="+",
+        choices=MODEL_TYPE_OPTIONS,
+        default=list(MODEL_TYPE_OPTIONS),
+    )
+    parser.add_argument(
+        "--labels", nargs="+", choices=TYPE_LABELS, default=list(TYPE_LABELS)
+    )
+    parser.add_argument("--min-n-mfccs", type=int, default=MIN_N_MFCC)
+    parser.add_argument("--max-n-mfccs", type=int, default=MAX_N_MFCC)
+    parser.add_argument("--n-mfccs-step", type=int, default=1)
+    parser.add_argument(
+        "--features",
+        nargs="+",
+        choices=FEATURE_SET_OPTIONS,
+        default=[DEFAULT_FEATURE_SET],
+    )
+    parser.add_argument("--seeds", nargs="+", type=int, default=[42])
+    parser.add_argument("--workers", type=int, help="parallel worker processes")
+    parser.add_argument("-o", "--output", default=str(LEADERBOARD_PATH))
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cells = list(
+        sweep_grid(
+            args.estimators,
+            args.model_types,
+            args.labels,
+            range(args.min_n_mfccs, args.max_n_mfccs + 1, args.n_mfccs_step),
+            args.seeds,
+            args.features,
+        )
+    )
+
+    board = run_sweep(cells, n_workers=args.workers)
+    board.to_csv(args.output, index=False)
+
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(board[board["rank"] <= TOP_PER_GROUP].to_string())
+    print(f"Leaderboard written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
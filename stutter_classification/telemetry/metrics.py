@@ -0,0 +1,172 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# histogram bucket upper edges in seconds, 10 µs to ~40 s growing by 25%
+BUCKET_GROWTH = 1.25
+BUCKET_EDGES = [1e-5 * BUCKET_GROWTH**i for i in range(69)]
+
+DEFAULT_FLUSH_INTERVAL = 5.0  # seconds between snapshots sent to the sink
+DEFAULT_MEMORY_SNAPSHOTS = 1000
+
+
+class Histogram:
+    # fixed log-spaced buckets, recording is a bisect and an increment so it
+    # can sit on the hot path, percentiles are accurate to one bucket width
+
+    def __init__(self, edges=BUCKET_EDGES):
+        self.edges = edges
+        self.counts = [0] * (len(edges) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value: float):
+        self.counts[bisect.bisect_left(self.edges, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> float:
+        # upper edge of the bucket holding the q-th percentile
+        if self.count == 0:
+            return 0.0
+        rank = q / 100 * self.count
+        cumulative = np.cumsum(self.counts)
+        bucket = int(np.searchsorted(cumulative, rank))
+        if bucket >= len(self.edges):
+            return self.max
+        return min(self.edges[bucket], self.max)
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p95_ms": self.percentile(95) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+class Metrics:
+    # stage timings, counters and gauges of the live detection loop. written
+    # from the record thread, read from the UI thread and sent to a sink
+
+    def __init__(self, sink=None, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.sink = sink
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+            self.gauges = {}
+            self.started = time.time()
+            self.last_flush = time.perf_counter()
+
+    def record(self, stage: str, seconds: float):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.record(seconds)
+
+    @contextmanager
+    def time(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def increment(self, counter: str, n: int = 1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def set_gauge(self, gauge: str, value: float):
+        with self.lock:
+            self.gauges[gauge] = value
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "time": time.time(),
+                "uptime": time.time() - self.started,
+                "stages": {
+                    stage: histogram.snapshot()
+                    for stage, histogram in self.histograms.items()
+                },
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+            }
+
+    def maybe_flush(self):
+        # cheap enough to call on every window, only flushes every interval
+        if self.sink is None:
+            return
+        now = time.perf_counter()
+        if now - self.last_flush >= self.flush_interval:
+            self.last_flush = now
+            self.flush()
+
+    def flush(self):
+        if self.sink is not None:
+            self.sink.emit(self.snapshot())
+
+    def close(self):
+        self.flush()
+        if self.sink is not None:
+            self.sink.close()
+
+
+class InMemorySink:
+    # keeps the most recent snapshots, for tests and the stats panel
+
+    def __init__(self, max_snapshots=DEFAULT_MEMORY_SNAPSHOTS):
+        self.snapshots = deque(maxlen=max_snapshots)
+
+    def emit(self, snapshot: dict):
+        self.snapshots.append(snapshot)
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink:
+    # appends one JSON snapshot per line to a local file
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, "a")
+
+    def emit(self, snapshot: dict):
+        self.file.write(json.dumps(snapshot) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def format_snapshot(snapshot: dict) -> str:
+    # plain text summary, one line per stage, counter and gauge
+    lines = []
+    for stage, stats in snapshot["stages"].items():
+        lines.append(
+            f"{stage:<10} p50 {stats['p50_ms']:7.2f} ms  "
+            f"p95 {stats['p95_ms']:7.2f} ms  max {stats['max_ms']:7.2f} ms"
+        )
+    for counter, value in snapshot["counters"].items():
+        lines.append(f"{counter:<18} {value}")
+    for gauge, value in snapshot["gauges"].items():
+        lines.append(f"{gauge:<18} {value:g}")
+    return "\n".join(lines)
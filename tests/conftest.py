@@ -0,0 +1,31 @@
+import shutil
+
+import pytest
+
+import stutter_classification.data.sep28k_data as sep28k_data
+import stutter_classification.models.base.cross_validation as cross_validation
+from stutter_classification.benchmark import synthetic_corpus, write_synthetic_corpus
+
+N_CLIPS = 200  # enough for stratified folds of every target class
+
+
+@pytest.fixture(scope="session")
+def corpus_template(tmp_path_factory):
+    # a small synthetic corpus with its feature store built once per run
+    directory = tmp_path_factory.mktemp("corpus")
+    write_synthetic_corpus(directory, N_CLIPS)
+    with synthetic_corpus(directory):
+        sep28k_data._load_sep28k_features(n_workers=1)
+    return directory
+
+
+@pytest.fixture
+def corpus(corpus_template, tmp_path, monkeypatch):
+    # a copy of the corpus per test, so tests may change clips and labels.
+    # copies keep modification times, so the copied store stays valid
+    directory = tmp_path / "corpus"
+    shutil.copytree(corpus_template, directory)
+    monkeypatch.setattr(cross_validation, "FOLDS_DIR", directory / "folds")
+    monkeypatch.setattr(cross_validation, "_folds", {})
+    with synthetic_corpus(directory):
+        yield directory
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+import soundfile
+
+from stutter_classification.audio.decode import load_audio, read_audio_blocks
+from stutter_classification.batch_inference import (
+    extract_file_windows,
+    find_audio_files,
+)
+from stutter_classification.data.feature_extraction import FeaturePipeline
+
+
+def write_noise(path, seconds, rate=16000, channels=1, subtype="PCM_16"):
+    rng = np.random.default_rng(rate)
+    audio = rng.uniform(-0.5, 0.5, (int(seconds * rate), channels))
+    soundfile.write(path, audio, rate, subtype)
+
+
+@pytest.mark.parametrize(
+    "rate, channels, subtype",
+    [(16000, 1, "PCM_16"), (44100, 2, "PCM_24"), (22050, 1, "FLOAT")],
+)
+def test_read_audio_blocks_matches_load_audio(tmp_path, rate, channels, subtype):
+    path = tmp_path / "clip.wav"
+    write_noise(path, 1 + 77 / rate, rate, channels, subtype)
+
+    audio, sample_rate = load_audio(path)
+    blocks = np.concatenate(list(read_audio_blocks(path, block_size=1000)))
+    assert sample_rate == 16000
+    np.testing.assert_array_equal(blocks, audio)
+
+
+def test_file_windows_match_the_decoded_audio(tmp_path):
+    path = tmp_path / "recording.wav"
+    write_noise(path, 3.0, rate=44100)
+    pipeline = FeaturePipeline(13, ("mfcc_mean", "zcr"))
+
+    _, starts, features, duration, error = extract_file_windows(
+        path, pipeline, 0.5, 0.25
+    )
+    audio, sample_rate = load_audio(path)
+    assert error is None
+    assert duration == len(audio) / sample_rate
+    np.testing.assert_allclose(starts, np.arange(11) * 0.25)
+    for start, row in zip(starts, features):
+        offset = int(start * sample_rate)
+        window = audio[offset : offset + sample_rate // 2]
+        np.testing.assert_allclose(
+            row, pipeline.extract(window, sample_rate), rtol=1e-5, atol=1e-5
+        )
+
+
+def test_unreadable_file_is_reported(tmp_path):
+    path = tmp_path / "broken.wav"
+    path.write_bytes(b"not audio")
+    _, starts, features, _, error = extract_file_windows(
+        path, FeaturePipeline(13), 0.5, 0.5
+    )
+    assert error
+    assert len(starts) == 0 and features.shape == (0, FeaturePipeline(13).n_features)
+
+
+def test_find_audio_files_searches_directories(tmp_path):
+    (tmp_path / "a").mkdir()
+    for name in ["a/2.wav", "a/1.flac", "a/notes.txt", "3.wav"]:
+        (tmp_path / name).touch()
+    listed = tmp_path / "list.txt"
+    listed.write_text(f"{tmp_path / '3.wav'}\n\n")
+
+    paths = find_audio_files([tmp_path / "a"], file_list=listed)
+    assert [p.name for p in paths] == ["1.flac", "2.wav", "3.wav"]
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from sklearn.naive_bayes import GaussianNB
+from sklearn.tree import DecisionTreeClassifier
+
+import stutter_classification.models.base.cross_validation as cross_validation
+from stutter_classification.models import SingleFeatureModel
+from stutter_classification.models.base.cross_validation import (
+    get_fold_ids,
+    xy_digest,
+)
+from stutter_classification.models.options import TYPE_LABELS
+
+
+def make_model(estimator=GaussianNB, label=TYPE_LABELS[0]):
+    return SingleFeatureModel(estimator, label)
+
+
+def test_folds_are_cached_in_memory_and_on_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(cross_validation, "FOLDS_DIR", tmp_path)
+    monkeypatch.setattr(cross_validation, "_folds", {})
+    y = np.arange(50) % 2
+
+    fold_ids = get_fold_ids("digest", y, n_splits=5, random_state=0)
+    assert sorted(np.bincount(fold_ids)) == [10] * 5
+    # stratified, every fold has both classes in equal numbers
+    for fold in range(5):
+        assert np.bincount(y[fold_ids == fold]).tolist() == [5, 5]
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+    assert get_fold_ids("digest", y, n_splits=5, random_state=0) is fold_ids
+
+    # a new process reads the folds from disk instead of splitting again
+    monkeypatch.setattr(cross_validation, "_folds", {})
+    monkeypatch.setattr(cross_validation, "StratifiedKFold", None)
+    reloaded = get_fold_ids("digest", y, n_splits=5, random_state=0)
+    np.testing.assert_array_equal(reloaded, fold_ids)
+
+
+def test_multi_label_targets_use_plain_folds(tmp_path, monkeypatch):
+    monkeypatch.setattr(cross_validation, "FOLDS_DIR", tmp_path)
+    monkeypatch.setattr(cross_validation, "_folds", {})
+    y = np.zeros((20, 3))
+    fold_ids = get_fold_ids("multi", y, n_splits=4, random_state=0)
+    assert sorted(np.bincount(fold_ids)) == [5] * 4
+    assert "kfold" in next(tmp_path.glob("*.npy")).name
+
+
+def test_xy_digest_follows_content():
+    X = np.arange(12, dtype=np.float32).reshape(4, 3)
+    y = np.array([0, 1, 0, 1])
+    assert xy_digest(X, y) == xy_digest(X.copy(), y.copy())
+    assert xy_digest(X, y) != xy_digest(X, y[::-1])
+    assert xy_digest(X, y) != xy_digest(X.reshape(3, 4), y)
+
+
+def test_estimators_on_the_same_data_share_folds(corpus):
+    first = make_model(GaussianNB)
+    second = make_model(DecisionTreeClassifier)
+    other_label = make_model(label=TYPE_LABELS[1])
+    assert first.xy_digest() == second.xy_digest()
+    assert first.xy_digest() != other_label.xy_digest()
+
+    first.cross_validate(n_jobs=1)
+    second.cross_validate(n_jobs=1)
+    assert len(cross_validation._folds) == 1
+    assert len(list(cross_validation.FOLDS_DIR.glob("*.npy"))) == 1
+
+
+def test_cross_validate_scores_every_fold(corpus):
+    model = make_model()
+    scores = model.cross_validate(n_jobs=2)
+    assert len(scores) == model.CV_FOLDS
+
+    X, y = model.get_xy()
+    fold_ids = get_fold_ids(model.xy_digest(), y, random_state=model.RANDOM_STATE)
+    for fold, score in enumerate(scores):
+        test = fold_ids == fold
+        estimator = GaussianNB().fit(X[~test], y[~test])
+        assert score == pytest.approx(estimator.score(X[test], y[test]))
+
+
+def test_score_needs_a_held_out_split(corpus):
+    model = make_model()
+    model.train()
+    assert 0.0 <= model.score() <= 1.0
+
+    model.train_all()
+    with pytest.raises(ValueError):
+        model.score()
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from scipy.signal import resample_poly
+
+from stutter_classification.audio.decode import (
+    FILTER_WINDOW,
+    Resampler,
+    resample,
+)
+
+RATE_PAIRS = [(44100, 16000), (48000, 16000), (8000, 16000), (22050, 16000)]
+CHUNK_SIZES = [1, 7, 512, 4096, None]  # None feeds everything at once
+
+
+def streamed(resampler, audio, chunk_size):
+    if chunk_size is None:
+        chunk_size = len(audio)
+    blocks = [
+        resampler.process(audio[i : i + chunk_size])
+        for i in range(0, len(audio), chunk_size)
+    ]
+    return np.concatenate(blocks + [resampler.flush()])
+
+
+@pytest.mark.parametrize("orig_rate, target_rate", RATE_PAIRS)
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_resampler_matches_resample_poly(orig_rate, target_rate, chunk_size):
+    rng = np.random.default_rng(orig_rate)
+    audio = rng.uniform(-1, 1, orig_rate // 4 + 13).astype(np.float32)
+    up, down = target_rate, orig_rate
+    divisor = np.gcd(up, down)
+
+    expected = resample_poly(
+        audio.astype(np.float64), up // divisor, down // divisor, window=FILTER_WINDOW
+    )
+    actual = streamed(Resampler(orig_rate, target_rate), audio, chunk_size)
+    assert len(actual) == len(expected)
+    np.testing.assert_allclose(actual, expected, atol=1e-5)
+
+
+def test_resampler_same_rate_passes_through():
+    audio = np.linspace(-1, 1, 100, dtype=np.float32)
+    np.testing.assert_array_equal(resample(audio, 16000, 16000), audio)
+
+
+def test_resampler_reset_starts_a_new_stream():
+    audio = np.random.default_rng(1).uniform(-1, 1, 4410).astype(np.float32)
+    resampler = Resampler(44100, 16000)
+    first = streamed(resampler, audio, 100)
+    resampler.reset()
+    np.testing.assert_array_equal(streamed(resampler, audio, 100), first)
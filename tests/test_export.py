@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.naive_bayes import GaussianNB
+from sklearn.neural_network import MLPClassifier
+from sklearn.svm import SVC
+from sklearn.tree import DecisionTreeClassifier
+
+from stutter_classification.export.compact import (
+    COMPACT_FORMAT_VERSION,
+    CompactEstimator,
+    CompactModel,
+)
+from stutter_classification.export.convert import export_estimator
+
+N_FEATURES = 13
+
+ESTIMATORS = {
+    "DecisionTreeClassifier": lambda: DecisionTreeClassifier(random_state=0),
+    "RandomForestClassifier": lambda: RandomForestClassifier(
+        n_estimators=10, random_state=0
+    ),
+    "GradientBoostingClassifier": lambda: GradientBoostingClassifier(
+        n_estimators=20, random_state=0
+    ),
+    "SVC": lambda: SVC(random_state=0),
+    "GaussianNB": lambda: GaussianNB(),
+    "Neural Network": lambda: MLPClassifier(
+        hidden_layer_sizes=(16,), max_iter=50, random_state=0
+    ),
+}
+
+
+def dataset(n_classes, seed=0):
+    # MFCC-like float32 features, classes separated along a few directions
+    rng = np.random.default_rng(seed)
+    X = rng.normal(0, 10, (600, N_FEATURES)).astype(np.float32)
+    y = (X[:, 0] + 0.5 * X[:, 1] > 0).astype(int)
+    if n_classes > 2:
+        y += (X[:, 2] > 5).astype(int) * 2
+    return X, y
+
+
+def meta(labels=None):
+    return {
+        "format_version": COMPACT_FORMAT_VERSION,
+        "n_mfccs": N_FEATURES,
+        "feature_groups": ["mfcc_mean"],
+        "n_features": N_FEATURES,
+        "labels": labels,
+        "empty_label": "NoStutteredWords",
+    }
+
+
+@pytest.mark.filterwarnings("ignore", category=ConvergenceWarning)
+@pytest.mark.parametrize("name", ESTIMATORS)
+@pytest.mark.parametrize("n_classes", [2, 4])
+def test_export_predicts_like_sklearn(name, n_classes):
+    X, y = dataset(n_classes)
+    estimator = ESTIMATORS[name]().fit(X[:400], y[:400])
+
+    compact = CompactModel(meta(), [export_estimator(estimator)])
+    X_test = np.concatenate((X[400:], dataset(n_classes, seed=1)[0]))
+    np.testing.assert_array_equal(
+        compact.predict_batch(X_test), estimator.predict(X_test)
+    )
+
+
+@pytest.mark.filterwarnings("ignore", category=ConvergenceWarning)
+@pytest.mark.parametrize("name", ["RandomForestClassifier", "Neural Network"])
+def test_saved_export_loads_with_same_predictions(tmp_path, name):
+    X, y = dataset(2)
+    labels = ["Block", "Prolongation"]
+    estimators = [ESTIMATORS[name]().fit(X, y), ESTIMATORS[name]().fit(X, 1 - y)]
+    compact = CompactModel(meta(labels), [export_estimator(e) for e in estimators])
+
+    loaded = CompactModel.load(compact.save(tmp_path / "model.compact"))
+    expected = np.column_stack([e.predict(X) for e in estimators])
+    np.testing.assert_array_equal(loaded.predict_batch(X), expected)
+    np.testing.assert_array_equal(loaded.predict_array(X[0]), expected[:1])
+    assert loaded.prediction_label(expected[0]) in ("Block", "Prolongation")
+
+
+def test_compact_model_rejects_bad_features():
+    X, y = dataset(2)
+    compact = CompactModel(meta(), [export_estimator(GaussianNB().fit(X, y))])
+    with pytest.raises(ValueError):
+        compact.predict_batch(X[:, :5])
+    X[0, 0] = np.nan
+    with pytest.raises(ValueError):
+        compact.predict_batch(X)
+
+
+def test_compact_estimator_is_abstract():
+    with pytest.raises(TypeError):
+        CompactEstimator()
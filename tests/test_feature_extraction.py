@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from stutter_classification.data.feature_extraction import (
+    FEATURE_GROUPS,
+    FeaturePipeline,
+    StreamingFeatures,
+    extract_mfccs,
+    feature_columns,
+    feature_layout,
+)
+
+SAMPLE_RATE = 16000
+WINDOW = 8000
+
+
+def noise(seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal(int(seconds * SAMPLE_RATE)) * 0.1).astype(np.float32)
+
+
+# librosa warns that a 0.05 s clip is shorter than one FFT
+@pytest.mark.filterwarnings("ignore:n_fft")
+@pytest.mark.parametrize("seconds", [0.05, 0.5, 3.0])
+def test_mfcc_mean_matches_extract_mfccs(seconds):
+    audio = noise(seconds)
+    pipeline = FeaturePipeline(20, ("mfcc_mean",))
+    np.testing.assert_allclose(
+        pipeline.extract(audio, SAMPLE_RATE),
+        extract_mfccs(audio, SAMPLE_RATE, n_mfccs=20),
+        rtol=1e-4,
+        atol=1e-3,
+    )
+
+
+def test_fewer_mfccs_are_a_prefix_of_the_stored_columns():
+    audio = noise(1.0)
+    store = FeaturePipeline(40)
+    stored = store.extract(audio, SAMPLE_RATE)
+    groups = ("mfcc_mean", "mfcc_std", "pitch")
+    columns = feature_columns(store.layout, 13, groups)
+    np.testing.assert_allclose(
+        stored[columns],
+        FeaturePipeline(13, groups).extract(audio, SAMPLE_RATE),
+        rtol=1e-5,
+        atol=1e-5,
+    )
+
+
+def test_layout_covers_every_group():
+    layout = feature_layout(13)
+    assert list(layout) == list(FEATURE_GROUPS)
+    assert layout["mfcc_mean"] == (0, 13)
+    assert layout["pitch"][1] == FeaturePipeline(13).n_features == 4 * 13 + 2 + 3 + 3
+
+
+def test_short_and_silent_audio_give_finite_features():
+    pipeline = FeaturePipeline(13)
+    for audio in (np.zeros(100, np.float32), np.zeros(SAMPLE_RATE, np.float32)):
+        features = pipeline.extract(audio, SAMPLE_RATE)
+        assert features.shape == (pipeline.n_features,)
+        assert np.isfinite(features).all()
+
+
+def test_pitch_of_a_tone():
+    t = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+    audio = (0.5 * np.sin(2 * np.pi * 200 * t)).astype(np.float32)
+    pipeline = FeaturePipeline(13, ("pitch",))
+    mean, std, voiced = pipeline.extract(audio, SAMPLE_RATE)
+    assert mean == pytest.approx(200, rel=0.02)
+    assert voiced > 0.9
+
+
+@pytest.mark.parametrize("groups", [("mfcc_mean",), tuple(FEATURE_GROUPS)])
+@pytest.mark.parametrize("hop", [4096, 4000, 8000, 12288])
+def test_streaming_features_match_extract(groups, hop):
+    pipeline = FeaturePipeline(13, groups)
+    stream = StreamingFeatures(pipeline, SAMPLE_RATE)
+    audio = noise(3.0)
+    for start in range(0, len(audio) - WINDOW + 1, hop):
+        window = audio[start : start + WINDOW]
+        np.testing.assert_allclose(
+            stream.update_window(start, window),
+            pipeline.extract(window, SAMPLE_RATE),
+            rtol=1e-5,
+            atol=1e-5,
+        )
+
+
+def test_streaming_features_only_transform_new_frames(monkeypatch):
+    pipeline = FeaturePipeline(13, ("mfcc_mean",))
+    stream = StreamingFeatures(pipeline, SAMPLE_RATE)
+    transformed = []
+    power = pipeline.power
+
+    def counting(frames):
+        transformed.append(len(frames))
+        return power(frames)
+
+    monkeypatch.setattr(pipeline, "power", counting)
+    audio = noise(2.0)
+    for start in (0, 4096, 8192):
+        stream.update_window(start, audio[start : start + WINDOW])
+
+    n_frames = len(pipeline.frames(audio[:WINDOW]))
+    first, stop = stream.interior(WINDOW)
+    reused = stop - first - 4096 // pipeline.hop_length
+    assert transformed == [n_frames, n_frames - reused, n_frames - reused]
+
+    # a gap in the stream starts over
+    stream.update_window(8192 + 100, audio[8292 : 8292 + WINDOW])
+    assert transformed[-1] == n_frames
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from stutter_classification.data.feature_store import (
+    STORE_VERSION,
+    FeatureStore,
+    compact_labels,
+)
+
+PARAMS = {"n_mfccs": 40}
+
+
+def labels(n):
+    return pd.DataFrame(
+        {
+            "Name": [f"show_{i}" for i in range(n)],
+            "Show": ["show"] * n,
+            "Block": np.arange(n) % 3,
+        }
+    )
+
+
+def features(n, n_features=4):
+    return np.arange(n * n_features, dtype=np.float32).reshape(n, n_features)
+
+
+def test_write_then_load_round_trip(tmp_path):
+    store = FeatureStore(tmp_path / "store")
+    store.write(labels(10), features(10), PARAMS)
+
+    loaded_labels, loaded_features = store.load()
+    assert isinstance(loaded_features, np.memmap)
+    np.testing.assert_array_equal(loaded_features, features(10))
+    assert loaded_labels.Name.tolist() == labels(10).Name.tolist()
+    assert loaded_labels.Block.tolist() == labels(10).Block.tolist()
+
+    meta = store.read_meta()
+    assert meta["version"] == STORE_VERSION
+    assert (meta["n_rows"], meta["n_features"]) == (10, 4)
+
+
+def test_validity_follows_params(tmp_path):
+    store = FeatureStore(tmp_path / "store")
+    assert not store.is_valid(PARAMS)
+    store.write(labels(3), features(3), PARAMS)
+    assert store.is_valid(PARAMS)
+    assert not store.is_valid({"n_mfccs": 13})
+
+
+def test_open_store_is_incomplete_until_committed(tmp_path):
+    store = FeatureStore(tmp_path / "store")
+    store.write(labels(3), features(3), PARAMS)
+
+    out = store.open_features(5, 4)
+    assert not store.is_valid(PARAMS)
+    out[:] = features(5)
+    store.commit(labels(5), out, PARAMS)
+    assert store.is_valid(PARAMS)
+    assert store.load()[1].shape == (5, 4)
+
+
+def test_commit_rejects_mismatched_rows(tmp_path):
+    store = FeatureStore(tmp_path / "store")
+    out = store.open_features(5, 4)
+    with pytest.raises(ValueError):
+        store.commit(labels(4), out, PARAMS)
+
+
+def test_replace_moves_a_built_store(tmp_path):
+    store = FeatureStore(tmp_path / "store")
+    store.write(labels(3), features(3), PARAMS)
+    manifest = pd.DataFrame({"Name": ["a"], "Size": [1], "MTime": [2]})
+    build = FeatureStore(tmp_path / "store-build")
+    out = build.open_features(6, 4)
+    out[:] = features(6)
+    build.commit(labels(6), out, PARAMS, fingerprint={"labels": "x"}, manifest=manifest)
+    del out
+
+    store.replace(build)
+    assert not build.path.exists()
+    assert store.read_meta()["fingerprint"] == {"labels": "x"}
+    assert store.read_manifest().Name.tolist() == ["a"]
+    np.testing.assert_array_equal(store.load()[1], features(6))
+
+
+def test_compact_labels_shrinks_dtypes():
+    compact = compact_labels(labels(100))
+    assert compact.Block.dtype == np.int8
+    assert compact.Show.dtype == "category"
+    # the key column is left as it is
+    assert compact.Name.dtype != "category"
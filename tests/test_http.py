@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from stutter_classification.server.http import (
+    MAX_BODY_BYTES,
+    HttpError,
+    encode_request,
+    read_message,
+)
+
+
+def read(data: bytes):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_message(reader)
+
+    return asyncio.run(run())
+
+
+def test_request_round_trip():
+    message = read(encode_request("POST", "/sessions", b'{"a": 1}', "application/json"))
+    assert message.start_line == ["POST", "/sessions", "HTTP/1.1"]
+    assert message.json() == {"a": 1}
+    assert message.keep_alive()
+
+
+@pytest.mark.parametrize(
+    "length, status",
+    [(b"abc", 400), (b"-5", 400), (str(MAX_BODY_BYTES + 1).encode(), 413)],
+)
+def test_bad_content_length_is_an_http_error(length, status):
+    with pytest.raises(HttpError) as error:
+        read(b"POST /sessions HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n")
+    assert error.value.status == status
+
+
+def test_closed_connection_reads_none():
+    assert read(b"") is None
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pandas as pd
+import soundfile
+
+from stutter_classification.data.manifest import (
+    EMPTY_CLIP_SIZE,
+    clip_names,
+    empty_clip_mask,
+    read_wav_header,
+    scan_clips,
+)
+
+
+def write_clip(path, seconds=0.5, sample_rate=16000):
+    os.makedirs(path.parent, exist_ok=True)
+    soundfile.write(path, np.zeros(int(seconds * sample_rate)), sample_rate, "PCM_16")
+
+
+def test_scan_reads_headers_and_finds_nested_clips(tmp_path):
+    write_clip(tmp_path / "show" / "0" / "show_0_1.wav")
+    write_clip(tmp_path / "show" / "1" / "show_1_2.wav", seconds=1.0, sample_rate=8000)
+    (tmp_path / "show" / "1" / "show_1_3.wav").write_bytes(b"\0" * EMPTY_CLIP_SIZE)
+
+    manifest = scan_clips(tmp_path).set_index("Name")
+    assert sorted(manifest.index) == ["show_0_1", "show_1_2", "show_1_3"]
+    assert manifest.loc["show_1_2", "SampleRate"] == 8000
+    assert manifest.loc["show_1_2", "Duration"] == 1.0
+    assert manifest.loc["show_0_1", "Channels"] == 1
+    assert manifest.loc["show_1_3", "SampleRate"] == 0
+    empty = manifest.index[empty_clip_mask(manifest)]
+    assert empty.tolist() == ["show_1_3"]
+
+
+def test_rescan_only_reads_changed_headers(tmp_path, monkeypatch):
+    write_clip(tmp_path / "a.wav")
+    write_clip(tmp_path / "b.wav")
+    previous = scan_clips(tmp_path)
+
+    write_clip(tmp_path / "b.wav", seconds=2.0)
+    os.utime(tmp_path / "b.wav", ns=(1, 1))
+    read = []
+    original = read_wav_header
+
+    def counting(path):
+        read.append(os.path.basename(path))
+        return original(path)
+
+    monkeypatch.setattr(
+        "stutter_classification.data.manifest.read_wav_header", counting
+    )
+    manifest = scan_clips(tmp_path, previous=previous).set_index("Name")
+    assert read == ["b.wav"]
+    assert manifest.loc["b", "Duration"] == 2.0
+
+
+def test_unreadable_header_is_zeros(tmp_path):
+    path = tmp_path / "broken.wav"
+    path.write_bytes(b"not a wav file")
+    assert read_wav_header(path) == (0, 0, 0, 0)
+
+
+def test_clip_names_join_like_rows():
+    labels = pd.DataFrame(
+        {"Show": ["a", "b", None], "EpId": [1, 2, 3], "ClipId": [10, 20, 30]}
+    )
+    expected = ["_".join(row.dropna().astype(str)) for _, row in labels.iterrows()]
+    assert clip_names(labels, ["Show", "EpId", "ClipId"]).tolist() == expected
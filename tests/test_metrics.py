@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from stutter_classification.telemetry.metrics import (
+    BUCKET_EDGES,
+    BUCKET_GROWTH,
+    Histogram,
+    InMemorySink,
+    Metrics,
+)
+
+
+def test_histogram_percentiles_within_one_bucket():
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(np.log(2e-3), 0.5, 10_000)
+    histogram = Histogram()
+    for value in values:
+        histogram.record(value)
+
+    for q in (50, 95, 99):
+        exact = np.percentile(values, q)
+        # the upper edge of the bucket holding the percentile
+        assert exact <= histogram.percentile(q) <= exact * BUCKET_GROWTH
+    assert histogram.count == len(values)
+    assert histogram.max == values.max()
+
+
+def test_histogram_overflow_returns_max():
+    histogram = Histogram()
+    histogram.record(BUCKET_EDGES[-1] * 10)
+    assert histogram.percentile(99) == BUCKET_EDGES[-1] * 10
+
+
+def test_empty_histogram():
+    assert Histogram().percentile(50) == 0.0
+    assert Histogram().snapshot()["mean_ms"] == 0.0
+
+
+def test_metrics_snapshots_reach_sink():
+    sink = InMemorySink()
+    metrics = Metrics(sink, flush_interval=0.0)
+    for seconds in (0.001, 0.002, 0.003, 0.004):
+        metrics.record("predict", seconds)
+    metrics.increment("windows", 4)
+    metrics.set_gauge("queue_depth", 2)
+    metrics.maybe_flush()
+
+    snapshot = sink.snapshots[-1]
+    stage = snapshot["stages"]["predict"]
+    assert stage["count"] == 4
+    assert stage["mean_ms"] == pytest.approx(2.5)
+    assert 2.0 <= stage["p50_ms"] <= 2.0 * BUCKET_GROWTH
+    assert stage["max_ms"] == pytest.approx(4.0)
+    assert snapshot["counters"] == {"windows": 4}
+    assert snapshot["gauges"] == {"queue_depth": 2}
+
+
+def test_metrics_only_flush_every_interval():
+    sink = InMemorySink()
+    metrics = Metrics(sink, flush_interval=3600)
+    metrics.record("mfcc", 0.001)
+    metrics.maybe_flush()
+    assert len(sink.snapshots) == 0
+
+    metrics.close()
+    assert len(sink.snapshots) == 1
+
+
+def test_in_memory_sink_keeps_newest():
+    sink = InMemorySink(max_snapshots=3)
+    for i in range(5):
+        sink.emit({"i": i})
+    assert [s["i"] for s in sink.snapshots] == [2, 3, 4]
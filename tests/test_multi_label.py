@@ -0,0 +1,56 @@
+import numpy as np
+from joblib import parallel_config
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.tree import DecisionTreeClassifier
+
+import stutter_classification.models.base.cross_validation as cross_validation
+from stutter_classification.models import MultiLabelModel
+from stutter_classification.models.base.cross_validation import serial_estimator
+from stutter_classification.models.options import TYPE_LABELS
+
+
+def test_labels_are_fitted_in_parallel_by_default(corpus):
+    model = MultiLabelModel(DecisionTreeClassifier)
+    assert model.model.n_jobs == -1
+    model.train_all()
+
+    # every label from one feature vector
+    X, y = model.get_xy()
+    assert y.shape == (len(X), len(TYPE_LABELS))
+    np.testing.assert_array_equal(model.predict_batch(X), model.model.predict(X))
+    assert model.predict_proba(X[:20]).shape == (20, len(TYPE_LABELS))
+
+
+def test_parallel_folds_fit_serial_estimators(corpus, monkeypatch):
+    fitted_n_jobs = []
+    fit_and_score = cross_validation._fit_and_score
+
+    def recording(score_estimator, estimator, *args):
+        fitted_n_jobs.append(estimator.n_jobs)
+        return fit_and_score(score_estimator, estimator, *args)
+
+    monkeypatch.setattr(cross_validation, "_fit_and_score", recording)
+    model = MultiLabelModel(GaussianNB)
+    model.cross_validate(n_jobs=1)
+    # serial folds keep the estimator's own parallelism
+    assert fitted_n_jobs == [-1] * model.CV_FOLDS
+    assert model.model.n_jobs == -1
+
+    # parallel folds fit serial copies, run on threads to see them here
+    fitted_n_jobs.clear()
+    with parallel_config(backend="threading"):
+        model.cross_validate(n_jobs=2)
+    assert fitted_n_jobs == [1] * model.CV_FOLDS
+    assert model.model.n_jobs == -1
+
+
+def test_serial_estimator():
+    assert serial_estimator(RandomForestClassifier(n_jobs=-1)).n_jobs == 1
+    assert serial_estimator(GaussianNB()).get_params() == GaussianNB().get_params()
+
+
+def test_n_jobs_does_not_change_the_artifact_key():
+    parallel = MultiLabelModel(GaussianNB)
+    serial = MultiLabelModel(GaussianNB, n_jobs=1)
+    assert parallel.artifact_key() == serial.artifact_key()
@@ -0,0 +1,110 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from stutter_classification.data.parallel_extraction import (
+    clear_checkpoints,
+    extract_features_parallel,
+    iter_checkpoints,
+    save_checkpoint,
+)
+
+N_FEATURES = 3
+
+extracted = []  # stems extracted in this process, by the serial path
+
+
+def features_of(path):
+    # stand-in for the feature pipeline, derived from the clip name alone
+    return np.full(N_FEATURES, int(Path(path).stem), dtype=np.float32)
+
+
+def record_and_extract(path):
+    extracted.append(Path(path).stem)
+    return features_of(path)
+
+
+def fail_at_7(path):
+    if Path(path).stem == "7":
+        raise RuntimeError("interrupted")
+    return record_and_extract(path)
+
+
+def paths(n):
+    return [Path(f"clips/{i}.wav") for i in range(n)]
+
+
+def expected(n):
+    return np.repeat(np.arange(n, dtype=np.float32)[:, None], N_FEATURES, axis=1)
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_rows_follow_file_order(n_workers):
+    out = np.zeros((20, N_FEATURES), dtype=np.float32)
+    extract_features_parallel(
+        paths(20), features_of, out, n_workers=n_workers, chunk_size=3
+    )
+    np.testing.assert_array_equal(out, expected(20))
+
+
+def test_interrupted_run_resumes_from_checkpoints(tmp_path):
+    checkpoint_dir = tmp_path / "checkpoints"
+    out = np.zeros((10, N_FEATURES), dtype=np.float32)
+    extracted.clear()
+    with pytest.raises(RuntimeError):
+        extract_features_parallel(
+            paths(10),
+            fail_at_7,
+            out,
+            n_workers=1,
+            chunk_size=2,
+            checkpoint_dir=checkpoint_dir,
+        )
+    # the chunks finished before the failure were checkpointed
+    saved = sorted(
+        name for names, _ in iter_checkpoints(checkpoint_dir) for name in names
+    )
+    assert saved == [str(i) for i in range(6)]
+
+    extracted.clear()
+    out = np.zeros((10, N_FEATURES), dtype=np.float32)
+    extract_features_parallel(
+        paths(10),
+        record_and_extract,
+        out,
+        n_workers=1,
+        chunk_size=2,
+        checkpoint_dir=checkpoint_dir,
+    )
+    assert extracted == [str(i) for i in range(6, 10)]
+    np.testing.assert_array_equal(out, expected(10))
+
+    clear_checkpoints(checkpoint_dir)
+    assert not checkpoint_dir.exists()
+
+
+def test_checkpoints_of_other_clips_are_ignored(tmp_path):
+    save_checkpoint(tmp_path, ["1", "99"], [features_of("1"), features_of("99")])
+    extracted.clear()
+    out = np.zeros((3, N_FEATURES), dtype=np.float32)
+    extract_features_parallel(
+        paths(3), record_and_extract, out, n_workers=1, checkpoint_dir=tmp_path
+    )
+    assert extracted == ["0", "2"]
+    np.testing.assert_array_equal(out, expected(3))
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_rows_go_to_out_rows(n_workers):
+    out = np.full((8, N_FEATURES), -1, dtype=np.float32)
+    extract_features_parallel(
+        paths(3),
+        features_of,
+        out,
+        n_workers=n_workers,
+        chunk_size=1,
+        out_rows=np.array([6, 1, 3]),
+    )
+    np.testing.assert_array_equal(out[[6, 1, 3]], expected(3))
+    assert (out[[0, 2, 4, 5, 7]] == -1).all()
@@ -0,0 +1,65 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import soundfile
+
+import stutter_classification.data.sep28k_data as sep28k_data
+from stutter_classification.benchmark import reset_caches
+
+
+def load():
+    reset_caches()
+    labels, features = sep28k_data._load_sep28k_features(n_workers=1)
+    return labels, np.array(features), sep28k_data.get_dataset_fingerprint()
+
+
+def count_extractions(monkeypatch):
+    extracted = []
+    extract_file = sep28k_data.STORE_PIPELINE.extract_file
+
+    def counting(path):
+        extracted.append(os.path.basename(path))
+        return extract_file(path)
+
+    monkeypatch.setattr(sep28k_data.STORE_PIPELINE, "extract_file", counting)
+    return extracted
+
+
+def test_unchanged_corpus_reuses_the_store(corpus, monkeypatch):
+    extracted = count_extractions(monkeypatch)
+    fingerprint = sep28k_data.get_dataset_fingerprint()
+    _, _, reloaded = load()
+    assert extracted == []
+    assert reloaded == fingerprint
+
+
+def test_only_changed_clips_are_extracted_again(corpus, monkeypatch):
+    labels, features, fingerprint = load()
+    clip = next((corpus / "clips").rglob(f"{labels.Name[0]}.wav"))
+    audio, rate = soundfile.read(clip)
+    soundfile.write(clip, audio[::-1], rate, subtype="PCM_16")
+    os.utime(clip, ns=(0, os.stat(clip).st_mtime_ns + 10**9))
+
+    # a label change alone changes the fingerprint, not the features
+    labels_path = corpus / "SEP-28k_labels.csv"
+    table = pd.read_csv(labels_path)
+    table.loc[1, "Block"] = 3 - table.loc[1, "Block"]
+    table.drop(index=2).to_csv(labels_path, index=False)
+
+    monkeypatch.setattr(sep28k_data, "COPY_BLOCK_ROWS", 7)
+    extracted = count_extractions(monkeypatch)
+    updated_labels, updated, updated_fingerprint = load()
+    assert extracted == [clip.name]
+    assert updated_fingerprint != fingerprint
+    assert len(updated_labels) == len(labels) - 1
+
+    # the same features as extracting every clip from scratch
+    shutil.rmtree(corpus / "store")
+    extracted.clear()
+    _, rebuilt, rebuilt_fingerprint = load()
+    assert len(extracted) == len(updated_labels)
+    np.testing.assert_array_equal(updated, rebuilt)
+    assert rebuilt_fingerprint == updated_fingerprint
+    assert not np.array_equal(updated, np.delete(features, 2, axis=0))
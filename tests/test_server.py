@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from stutter_classification.data.sep28k_data import MAX_N_MFCCS
+from stutter_classification.models.options import SINGLE_LABEL_MODEL
+from stutter_classification.server.http import HttpError
+from stutter_classification.server.inference_server import InferenceServer, Session
+from stutter_classification.server.model_pool import ModelConfig
+
+
+def test_default_config():
+    assert ModelConfig.from_json(None) == ModelConfig()
+
+
+def test_label_is_dropped_for_other_model_types():
+    config = ModelConfig.from_json({"model_type": "Multi Label Model"})
+    assert config.label is None
+    assert ModelConfig().model_type == SINGLE_LABEL_MODEL
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"n_mfccs": True},
+        {"n_mfccs": 0},
+        {"n_mfccs": MAX_N_MFCCS + 1},
+        {"n_mfccs": 13.0},
+        {"underlying_model": ["GaussianNB"]},
+        {"features": {}},
+        {"label": "Nothing"},
+        {"colour": "red"},
+    ],
+)
+def test_invalid_config_is_rejected(options):
+    with pytest.raises(ValueError):
+        ModelConfig.from_json(options)
+
+
+def test_n_mfccs_range_is_inclusive():
+    assert ModelConfig.from_json({"n_mfccs": 1}).n_mfccs == 1
+    assert ModelConfig.from_json({"n_mfccs": MAX_N_MFCCS}).n_mfccs == MAX_N_MFCCS
+
+
+@pytest.mark.parametrize(
+    "encoding, sample_rate",
+    [(["float32"], 16000), ("mp3", 16000), ("float32", True), ("float32", 0)],
+)
+def test_invalid_session_options_are_rejected(encoding, sample_rate):
+    # checked before the pooled model is touched
+    with pytest.raises(ValueError):
+        Session("id", None, encoding, sample_rate)
+
+
+@pytest.mark.parametrize("body", [[1], "GaussianNB", 13, {"n_mfccs": False}])
+def test_bad_session_bodies_are_client_errors(body):
+    with pytest.raises(HttpError) as error:
+        asyncio.run(InferenceServer().create_session(body))
+    assert error.value.status == 400
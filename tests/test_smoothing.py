@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from stutter_classification.models.smoothing import (
+    EVENT_END,
+    EVENT_START,
+    SMOOTHING_OPTIONS,
+    MedianSmoother,
+    StutterEventTracker,
+    hysteresis,
+)
+
+LABELS = ["Block", "Prolongation", "SoundRep"]
+N_WINDOWS = 2000
+
+
+def stream(n=N_WINDOWS, seed=0):
+    # blocks of stutter with noise on top, windows of 0.5s every 0.25s
+    rng = np.random.default_rng(seed)
+    base = (rng.random((n // 20, len(LABELS))) > 0.7).repeat(20, axis=0)
+    probabilities = np.clip(base * 0.8 + rng.normal(0, 0.25, base.shape) + 0.1, 0, 1)
+    starts = np.arange(n) * 0.25
+    return starts, starts + 0.5, probabilities
+
+
+def run_chunked(tracker, starts, ends, probabilities, bounds):
+    events = []
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        events += tracker.update(starts[a:b], ends[a:b], probabilities[a:b])
+    return events + tracker.flush()
+
+
+def sort_events(events):
+    return sorted(events, key=lambda e: (e.label, e.kind, e.start))
+
+
+@pytest.mark.parametrize("smoothing", SMOOTHING_OPTIONS)
+def test_tracker_events_do_not_depend_on_chunking(smoothing):
+    starts, ends, probabilities = stream()
+    tracker = StutterEventTracker(LABELS, smoothing)
+    whole = tracker.update(starts, ends, probabilities) + tracker.flush()
+    assert any(e.kind == EVENT_START for e in whole)
+
+    rng = np.random.default_rng(1)
+    for _ in range(3):
+        cuts = rng.choice(np.arange(1, N_WINDOWS), rng.integers(1, 400), replace=False)
+        bounds = np.concatenate(([0], np.sort(cuts), [N_WINDOWS]))
+        chunked = run_chunked(tracker, starts, ends, probabilities, bounds)
+        assert sort_events(chunked) == sort_events(whole)
+
+    # one window at a time, as the live recorder feeds it
+    single = run_chunked(tracker, starts, ends, probabilities, np.arange(N_WINDOWS + 1))
+    assert sort_events(single) == sort_events(whole)
+
+
+def test_every_start_is_ended():
+    starts, ends, probabilities = stream()
+    tracker = StutterEventTracker(LABELS)
+    events = tracker.update(starts, ends, probabilities) + tracker.flush()
+    opened = {(e.label, e.start) for e in events if e.kind == EVENT_START}
+    closed = {(e.label, e.start) for e in events if e.kind == EVENT_END}
+    assert opened == closed
+    assert all(e.end - e.start >= tracker.min_duration for e in events if e.end)
+
+
+def test_short_events_are_dropped():
+    starts = np.arange(12) * 0.25
+    flags = np.array([[0, 1, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0]], dtype=float).T
+    tracker = StutterEventTracker(["Block"], "none", min_duration=0.75)
+    events = tracker.update(starts, starts + 0.5, flags) + tracker.flush()
+    assert [(e.kind, e.start, e.end) for e in events] == [
+        (EVENT_START, 1.5, None),
+        (EVENT_END, 1.5, 2.5),
+    ]
+
+
+def test_median_smoother_is_centered_and_edge_padded():
+    x = np.random.default_rng(2).random((50, 2))
+    smoother = MedianSmoother(5)
+    smoothed = np.concatenate(
+        [smoother.process(x[:7]), smoother.process(x[7:8]), smoother.process(x[8:])]
+        + [smoother.flush()]
+    )
+    padded = np.concatenate([x[:1].repeat(2, 0), x, x[-1:].repeat(2, 0)])
+    expected = [np.median(padded[i : i + 5], axis=0) for i in range(len(x))]
+    np.testing.assert_allclose(smoothed, expected)
+
+
+def test_hysteresis_holds_state_between_thresholds():
+    probabilities = np.array([[0.5], [0.7], [0.5], [0.3], [0.5]])
+    active = hysteresis(probabilities, np.array([False]))
+    assert active[:, 0].tolist() == [False, True, True, False, False]
+
+
+def test_tracker_rejects_bad_shapes():
+    tracker = StutterEventTracker(LABELS)
+    with pytest.raises(ValueError):
+        tracker.update([0.0], [0.5], np.zeros((1, 2)))
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from stutter_classification.audio.stream import RingBuffer, SlidingWindowReader
+
+
+def test_ring_buffer_wraps_around():
+    ring = RingBuffer(10)
+    audio = np.arange(37, dtype=np.float32)
+    for start in range(0, len(audio), 3):
+        ring.write(audio[start : start + 3])
+
+    out = np.zeros(10, dtype=np.float32)
+    assert ring.written == 37
+    assert ring.oldest() == 27
+    np.testing.assert_array_equal(ring.read_into(out, 37), audio[27:])
+    np.testing.assert_array_equal(ring.read_into(out[:4], 33), audio[29:33])
+
+
+def test_ring_buffer_keeps_newest_of_oversized_block():
+    ring = RingBuffer(8)
+    ring.write(np.arange(3, dtype=np.float32))
+    ring.write(np.arange(3, 23, dtype=np.float32))
+
+    out = np.zeros(8, dtype=np.float32)
+    np.testing.assert_array_equal(ring.read_into(out, 23), np.arange(15, 23))
+
+
+def test_ring_buffer_rejects_overwritten_samples():
+    ring = RingBuffer(8)
+    ring.write(np.zeros(20, dtype=np.float32))
+    with pytest.raises(ValueError):
+        ring.read_into(np.zeros(4, dtype=np.float32), 14)
+    with pytest.raises(ValueError):
+        ring.read_into(np.zeros(4, dtype=np.float32), 21)
+
+
+def test_sliding_windows_across_wrap():
+    audio = np.arange(1000, dtype=np.float32)
+    ring = RingBuffer(64)
+    reader = SlidingWindowReader(ring, 32, 16)
+
+    windows = []
+    for start in range(0, len(audio), 7):
+        ring.write(audio[start : start + 7])
+        while (window := reader.next_window(timeout=0)) is not None:
+            windows.append((window[0], window[1].copy()))
+
+    assert [start for start, _ in windows] == list(range(0, len(audio) - 31, 16))
+    for start, window in windows:
+        np.testing.assert_array_equal(window, audio[start : start + 32])
+    assert reader.dropped_windows == 0
+
+
+def test_sliding_window_reader_skips_when_behind():
+    ring = RingBuffer(64)
+    reader = SlidingWindowReader(ring, 32, 16)
+    ring.write(np.arange(200, dtype=np.float32))
+
+    start, window = reader.next_window(timeout=0)
+    assert start >= ring.oldest()
+    assert reader.dropped_windows > 0
+    np.testing.assert_array_equal(window, np.arange(start, start + 32))
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from sklearn.model_selection import train_test_split
+from sklearn.naive_bayes import GaussianNB
+from sklearn.tree import DecisionTreeClassifier
+
+from stutter_classification.data.streaming import StreamingDataset
+from stutter_classification.models import SingleFeatureModel
+from stutter_classification.models.options import TYPE_LABELS
+
+
+def dataset(n=100, **kwargs):
+    features = np.arange(n * 4, dtype=np.float32).reshape(n, 4)
+    # every other store row, in reverse order
+    rows = np.arange(0, n, 2)[::-1]
+    return StreamingDataset(features, rows, rows % 3, **kwargs)
+
+
+@pytest.mark.parametrize("shuffle", [False, True])
+def test_batches_cover_every_row_once(shuffle):
+    streamed = dataset(batch_size=7, shuffle=shuffle, random_state=0)
+    batches = list(streamed)
+    assert len(batches) == streamed.n_batches == 8
+    assert max(len(X) for X, _ in batches) == 7
+
+    X = np.concatenate([X for X, _ in batches])
+    y = np.concatenate([y for _, y in batches])
+    rows = X[:, 0].astype(int) // 4
+    assert sorted(rows) == sorted(streamed.rows)
+    np.testing.assert_array_equal(y, rows % 3)
+
+
+def test_columns_are_selected():
+    X, _ = next(iter(dataset(columns=slice(1, 3))))
+    assert X.shape[1] == 2
+    np.testing.assert_array_equal(X[:, 1] - X[:, 0], 1)
+
+
+def test_split_matches_train_test_split():
+    streamed = dataset()
+    train, test = streamed.split(0.4, random_state=3)
+    expected_train, expected_test = train_test_split(
+        streamed.rows, test_size=0.4, random_state=3
+    )
+    np.testing.assert_array_equal(train.rows, expected_train)
+    np.testing.assert_array_equal(test.rows, expected_test)
+    assert not test.shuffle
+
+
+def make_model(estimator=GaussianNB):
+    return SingleFeatureModel(estimator, TYPE_LABELS[0])
+
+
+def test_stream_split_holds_out_the_rows_of_get_dataset(corpus):
+    model = make_model()
+    train, test = model.stream_split(batch_size=16)
+    X_test = np.concatenate([X for X, _ in test])
+    y_test = np.concatenate([y for _, y in test])
+    np.testing.assert_array_equal(X_test, model.get_dataset().X_test)
+    np.testing.assert_array_equal(y_test, model.get_dataset().y_test)
+    assert len(train) == len(model.get_dataset().X_train)
+
+
+def test_score_stream_matches_score(corpus):
+    model = make_model(DecisionTreeClassifier)
+    model.train()
+    assert model.score_stream() == pytest.approx(model.score())
+
+
+def test_incremental_training_fits_the_training_split(corpus):
+    model = make_model()
+    model.train_incremental()
+    incremental = model.score_stream()
+
+    # GaussianNB updates its statistics exactly, so batches give the same fit
+    model.train()
+    assert incremental == pytest.approx(model.score())
+
+    model.train_all()
+    with pytest.raises(ValueError):
+        model.score_stream()
+
+
+def test_incremental_training_needs_partial_fit(corpus):
+    with pytest.raises(ValueError):
+        make_model(DecisionTreeClassifier).train_incremental()
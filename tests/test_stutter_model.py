@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from sklearn.tree import DecisionTreeClassifier
+
+import stutter_classification.models.base.stutter_model as stutter_model
+from stutter_classification.models.base.stutter_model import TrainingCancelled
+from stutter_classification.models import SingleFeatureModel
+from stutter_classification.models.options import TYPE_LABELS
+
+
+def make_model(**kwargs):
+    return SingleFeatureModel(DecisionTreeClassifier, TYPE_LABELS[0], **kwargs)
+
+
+def test_saved_model_loads_without_training(corpus, tmp_path):
+    model = make_model()
+    model.train()
+    model.test_score = model.score()
+    path = model.save(tmp_path)
+    assert path.exists()
+
+    loaded = make_model()
+    assert loaded.load(tmp_path)
+    assert loaded.test_score == model.test_score
+    X, _ = model.get_xy()
+    np.testing.assert_array_equal(loaded.predict(X), model.predict(X))
+
+
+def test_load_needs_the_same_configuration(corpus, tmp_path):
+    model = make_model()
+    model.train()
+    model.save(tmp_path)
+
+    assert not make_model(n_mfccs=20).load(tmp_path)
+    assert not make_model(random_state=0).load(tmp_path)
+
+
+def test_load_rejects_a_model_of_other_data(corpus, tmp_path, monkeypatch):
+    model = make_model()
+    model.train()
+    model.save(tmp_path)
+
+    monkeypatch.setattr(stutter_model, "get_dataset_fingerprint", lambda: "changed")
+    assert not make_model().load(tmp_path)
+
+
+def test_load_or_train_trains_once(corpus, tmp_path, monkeypatch):
+    score = make_model().load_or_train(tmp_path)
+    assert 0.0 <= score <= 1.0
+
+    def fail():
+        raise AssertionError("the saved model should have been loaded")
+
+    model = make_model()
+    monkeypatch.setattr(model, "train_all", fail)
+    assert model.load_or_train(tmp_path) == score
+
+
+def test_cancelled_training_stops_between_folds(corpus, tmp_path):
+    checks = []
+
+    def cancel_after_two_folds():
+        checks.append(len(checks))
+        return len(checks) > 2
+
+    model = make_model()
+    with pytest.raises(TrainingCancelled):
+        model.load_or_train(tmp_path, cancelled=cancel_after_two_folds)
+    # checked before the folds started and after the first two finished
+    assert len(checks) == 3
+    assert not model.artifact_path(tmp_path).exists()
+
+
+def test_uncancelled_training_completes(corpus, tmp_path):
+    model = make_model()
+    score = model.load_or_train(tmp_path, cancelled=lambda: False)
+    assert model.artifact_path(tmp_path).exists()
+    assert score == make_model().load_or_train(tmp_path)
@@ -0,0 +1,64 @@
+from stutter_classification.models.options import SINGLE_LABEL_MODEL
+from stutter_classification.sweep import ACCURACY_METRICS, leaderboard, sweep_grid
+
+
+def result(model_type, label, accuracy, latency=1.0):
+    return {
+        "estimator": "GaussianNB",
+        "model_type": model_type,
+        "label": label,
+        "accuracy": accuracy,
+        "predict_p50_ms": latency,
+    }
+
+
+def test_leaderboard_ranks_each_model_type_and_label_apart():
+    board = leaderboard(
+        [
+            result("Multi Label Model", None, 0.9),
+            result(SINGLE_LABEL_MODEL, "Block", 0.6),
+            result(SINGLE_LABEL_MODEL, "Block", 0.7, latency=2.0),
+            result(SINGLE_LABEL_MODEL, "Block", 0.7, latency=1.0),
+            result(SINGLE_LABEL_MODEL, "WordRep", 0.8),
+            result("Multi Label Model", None, 0.5),
+        ]
+    )
+    rows = list(
+        zip(board.model_type, board.label.fillna("-"), board["rank"], board.accuracy)
+    )
+    assert rows == [
+        ("Multi Label Model", "-", 1, 0.9),
+        ("Multi Label Model", "-", 2, 0.5),
+        (SINGLE_LABEL_MODEL, "Block", 1, 0.7),
+        (SINGLE_LABEL_MODEL, "Block", 2, 0.7),
+        (SINGLE_LABEL_MODEL, "Block", 3, 0.6),
+        (SINGLE_LABEL_MODEL, "WordRep", 1, 0.8),
+    ]
+    # ties go to the faster model
+    assert board.predict_p50_ms[2] == 1.0
+    assert set(board.metric) == {
+        ACCURACY_METRICS["Multi Label Model"],
+        ACCURACY_METRICS[SINGLE_LABEL_MODEL],
+    }
+
+
+def test_empty_leaderboard():
+    assert leaderboard([]).empty
+
+
+def test_labels_only_vary_for_single_label_models():
+    cells = list(
+        sweep_grid(
+            ["GaussianNB"],
+            [SINGLE_LABEL_MODEL, "Multi Label Model"],
+            ["Block", "WordRep"],
+            [13],
+            [42],
+            ["MFCC Mean"],
+        )
+    )
+    assert [(cell[1], cell[2]) for cell in cells] == [
+        (SINGLE_LABEL_MODEL, "Block"),
+        (SINGLE_LABEL_MODEL, "WordRep"),
+        ("Multi Label Model", None),
+    ]
@@ -0,0 +1,39 @@
+import numpy as np
+
+from stutter_classification.audio.vad import CALIBRATION_SECONDS, VoiceActivityDetector
+
+SAMPLE_RATE = 16000
+WINDOW = 8000
+HOP = 4096
+
+
+def tone(seconds, amplitude=0.3, frequency=150.0):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def test_empty_audio_is_not_speech():
+    assert not VoiceActivityDetector(SAMPLE_RATE).is_speech(np.zeros(0, np.float32))
+
+
+def test_speech_during_calibration_is_classified():
+    vad = VoiceActivityDetector(SAMPLE_RATE)
+    speech = [vad.is_speech(tone(WINDOW / SAMPLE_RATE), HOP) for _ in range(3)]
+    assert all(speech)
+    assert vad.noise_floor is None
+
+
+def test_silence_after_calibration():
+    vad = VoiceActivityDetector(SAMPLE_RATE)
+    quiet = np.full(WINDOW, 1e-4, dtype=np.float32)
+    n_calibration = int(np.ceil(CALIBRATION_SECONDS * SAMPLE_RATE / HOP))
+    assert not any(vad.is_speech(quiet, HOP) for _ in range(n_calibration))
+    assert vad.noise_floor is not None
+
+    assert vad.is_speech(tone(WINDOW / SAMPLE_RATE, amplitude=0.05), HOP)
+
+
+def test_white_noise_is_not_speech():
+    vad = VoiceActivityDetector(SAMPLE_RATE)
+    noise = np.random.default_rng(0).normal(0, 0.3, WINDOW).astype(np.float32)
+    assert not vad.is_speech(noise)